@@ -14,13 +14,16 @@ if os.path.exists(libdir):
     sys.path.append(libdir)
 
 try:
-    from waveshare_epd import epd2in13_V4
+    from TP_lib import epd2in13_V4
+    from TP_lib import power
+    from TP_lib import scene
 except ImportError:
-    print("Waveshare library not found. Make sure you've installed the Touch_e-Paper_HAT library.")
+    print("TP_lib not found. Make sure you've copied the lib directory from Touch_e-Paper_HAT.")
     sys.exit(1)
 
 # Configuration
 REFRESH_INTERVAL = 300  # 5 minutes in seconds
+IDLE_TIMEOUT = 10  # deep sleep this long after the last refresh, woken for the next one
 FONT_SIZE = 12
 TITLE_FONT_SIZE = 15
 REQUEST_TIMEOUT = 10
@@ -94,17 +97,18 @@ LOCAL_HAIKU = [
 
 class HaikuDisplay:
     def __init__(self):
-        self.epd = epd2in13_V4.EPD()
+        self.epd = power.PowerManager(epd2in13_V4.EPD(), idle_timeout=IDLE_TIMEOUT)
         self.width = 122
         self.height = 250
         self.api_failures = 0
         self.max_api_failures = 3
+        self.scene = None
         
     def init_display(self):
         """Initialize the e-paper display"""
         try:
             logger.info("Initializing display...")
-            self.epd.init()
+            self.epd.init(self.epd.FULL_UPDATE)
             self.epd.Clear(0xFF)
             logger.info("Display initialized successfully")
             return True
@@ -190,97 +194,105 @@ class HaikuDisplay:
             return ""
         return ' '.join(text.split())
     
-    def create_haiku_image(self, haiku_data):
-        """Create an image with the haiku text"""
-        # Create a new image with white background
-        image = Image.new('1', (self.width, self.height), 255)
-        draw = ImageDraw.Draw(image)
-        
+    def create_scene(self):
+        """Create the retained haiku layout; the text is filled in per haiku"""
         try:
             # Try to load nice fonts, fall back to default if not available
-            title_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', TITLE_FONT_SIZE)
-            text_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', FONT_SIZE)
-            small_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', FONT_SIZE-2)
+            self.title_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf', TITLE_FONT_SIZE)
+            self.text_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', FONT_SIZE)
+            self.small_font = ImageFont.truetype('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', FONT_SIZE-2)
         except:
             # Fallback to default font
-            title_font = ImageFont.load_default()
-            text_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
+            self.title_font = ImageFont.load_default()
+            self.text_font = ImageFont.load_default()
+            self.small_font = ImageFont.load_default()
         
-        # Draw elegant border
-        draw.rectangle([3, 3, self.width-4, self.height-4], outline=0, width=2)
-        draw.rectangle([6, 6, self.width-7, self.height-7], outline=0, width=1)
+        # measures text the way the old per-frame ImageDraw did
+        self.measure = ImageDraw.Draw(Image.new('1', (1, 1)))
+        layout = scene.Scene((self.width, self.height))
         
-        y_position = 20
+        # Elegant border
+        layout.add(scene.Rect(bbox=(3, 3, self.width-4, self.height-4), outline=0, width=2))
+        layout.add(scene.Rect(bbox=(6, 6, self.width-7, self.height-7), outline=0, width=1))
         
-        # Draw "HAIKU" header
+        # "HAIKU" header and a decorative dot under it
         header = "HAIKU"
-        header_bbox = draw.textbbox((0, 0), header, font=title_font)
-        header_width = header_bbox[2] - header_bbox[0]
-        header_x = (self.width - header_width) // 2
-        draw.text((header_x, y_position), header, font=title_font, fill=0)
-        y_position += 25
+        layout.add(scene.Text(xy=(self.centered_x(header, self.title_font), 20), text=header, font=self.title_font))
+        center_x = self.width // 2
+        layout.add(scene.Ellipse(bbox=(center_x-2, 45, center_x+2, 49), fill=0))
         
-        # Draw decorative elements
+        self.line_widgets = []
+        self.dot_widgets = []
+        for i in range(3):
+            self.line_widgets.append(layout.add(scene.Text(xy=(0, 0), text='', font=self.text_font)))
+        self.author_widget = layout.add(scene.Text(xy=(0, 0), text='', font=self.small_font))
+        self.source_widget = layout.add(scene.Text(xy=(0, 0), text='', font=self.small_font))
+        self.timestamp_widget = layout.add(scene.Text(xy=(0, 0), text='', font=self.small_font))
+        return layout
+    
+    def centered_x(self, text, font):
+        """x that centers text on the screen"""
+        bbox = self.measure.textbbox((0, 0), text, font=font)
+        return (self.width - (bbox[2] - bbox[0])) // 2
+    
+    def create_haiku_image(self, haiku_data):
+        """Create an image with the haiku text"""
+        # Only the widgets whose text or place changed are re-rasterized
+        if self.scene is None:
+            self.scene = self.create_scene()
+        layout = self.scene
         center_x = self.width // 2
-        draw.ellipse([center_x-2, y_position, center_x+2, y_position+4], fill=0)
-        y_position += 15
+        y_position = 60
         
-        # Draw the three haiku lines with proper spacing
+        # The three haiku lines with proper spacing
         lines = haiku_data.get("lines", ["Error", "Loading", "Haiku"])
         line_spacing = 20
         
+        # A text widget per line and a subtle spacing dot between each two
+        while len(self.line_widgets) < len(lines):
+            self.line_widgets.append(layout.add(scene.Text(xy=(0, 0), text='', font=self.text_font)))
+        while len(self.line_widgets) > len(lines):
+            layout.remove(self.line_widgets.pop())
+        dots = max(len(lines) - 1, 0)
+        while len(self.dot_widgets) < dots:
+            dot_y = y_position + (len(self.dot_widgets) + 1) * line_spacing
+            self.dot_widgets.append(layout.add(scene.Ellipse(bbox=(center_x-1, dot_y-8, center_x+1, dot_y-6), fill=0)))
+        while len(self.dot_widgets) > dots:
+            layout.remove(self.dot_widgets.pop())
+        
         for i, line in enumerate(lines):
             # Clean and center each line
             clean_line = self.clean_text(line)
             if len(clean_line) > 18:  # Wrap long lines
                 clean_line = clean_line[:18] + "..."
-                
-            line_bbox = draw.textbbox((0, 0), clean_line, font=text_font)
-            line_width = line_bbox[2] - line_bbox[0]
-            line_x = (self.width - line_width) // 2
-            draw.text((line_x, y_position), clean_line, font=text_font, fill=0)
+            self.line_widgets[i].set(xy=(self.centered_x(clean_line, self.text_font), y_position), text=clean_line)
             y_position += line_spacing
-            
-            # Add subtle spacing dots between lines
-            if i < len(lines) - 1:
-                draw.ellipse([center_x-1, y_position-8, center_x+1, y_position-6], fill=0)
         
         y_position += 15
         
-        # Draw author info
+        # Author info
         author = haiku_data.get("author", "Unknown")
         if len(author) > 15:
             author = author[:15] + "..."
         author_info = f"— {author}"
-        
-        author_bbox = draw.textbbox((0, 0), author_info, font=small_font)
-        author_width = author_bbox[2] - author_bbox[0]
-        author_x = (self.width - author_width) // 2
-        draw.text((author_x, y_position), author_info, font=small_font, fill=0)
+        self.author_widget.set(xy=(self.centered_x(author_info, self.small_font), y_position), text=author_info)
         y_position += 15
         
-        # Draw source indicator
+        # Source indicator
         source = haiku_data.get("source", "Unknown")
         theme = haiku_data.get("theme", "")
         if theme and theme != "Classic":
             source_info = f"~ {theme} ~"
         else:
             source_info = f"~ {source} ~"
-            
-        source_bbox = draw.textbbox((0, 0), source_info, font=small_font)
-        source_width = source_bbox[2] - source_bbox[0]
-        source_x = (self.width - source_width) // 2
-        draw.text((source_x, y_position), source_info, font=small_font, fill=0)
+        self.source_widget.set(xy=(self.centered_x(source_info, self.small_font), y_position), text=source_info)
         
-        # Add timestamp at bottom
+        # Timestamp at bottom
         timestamp = time.strftime("%H:%M")
-        timestamp_bbox = draw.textbbox((0, 0), timestamp, font=small_font)
-        timestamp_width = timestamp_bbox[2] - timestamp_bbox[0]
-        timestamp_x = (self.width - timestamp_width) // 2
-        draw.text((timestamp_x, self.height - 18), timestamp, font=small_font, fill=0)
+        self.timestamp_widget.set(xy=(self.centered_x(timestamp, self.small_font), self.height - 18), text=timestamp)
         
-        return image
+        layout.render()
+        return layout.image
     
     def display_image(self, image):
         """Display the image on the e-paper display"""
@@ -368,7 +380,8 @@ class HaikuDisplay:
         
         # Clean up
         try:
-            self.epd.sleep()
+            self.epd.close()
+            logger.info(f"Power: {self.epd.stats()}")
         except:
             pass
 
@@ -0,0 +1,1389 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the TP_lib drivers.
+
+Usage:
+    python3 benchmark.py            # run every benchmark
+    python3 benchmark.py getbuffer  # run only the named benchmarks
+"""
+
+import io
+import sys
+import os
+import time
+import random
+import threading
+import struct
+
+# Run against the in-process simulator unless told otherwise
+os.environ.setdefault('EPD_BACKEND', 'sim')
+os.environ.setdefault('EPD_SIM_TIME_SCALE', '0')
+
+# Add the lib directory to the path
+libdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'lib')
+if os.path.exists(libdir):
+    sys.path.insert(0, libdir)
+
+from PIL import Image, ImageDraw
+
+
+def timeit(func, repeat=20):
+    """Return the best wall time of func() over repeat runs, in ms"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000.0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def sample_image(width, height, seed=0):
+    """A reproducible test frame with text, shapes and noise"""
+    rnd = random.Random(seed)
+    image = Image.new('1', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, width - 1, height // 6), fill=0)
+    draw.text((4, height // 4), '12:34:56', fill=0)
+    draw.ellipse((width // 4, height // 3, width * 3 // 4, height * 2 // 3), outline=0)
+    for _ in range(width * height // 20):
+        image.putpixel((rnd.randrange(width), rnd.randrange(height)), rnd.choice((0, 255)))
+    return image
+
+
+def getbuffer_reference(epd, image):
+    """The original per-pixel EPD_2IN9_V2.getbuffer, kept as the golden model"""
+    buf = [0xFF] * (int(epd.width/8) * epd.height)
+    image_monocolor = image.convert('1')
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    if(imwidth == epd.width and imheight == epd.height):
+        for y in range(imheight):
+            for x in range(imwidth):
+                if pixels[x, y] == 0:
+                    buf[int((x + y * epd.width) / 8)] &= ~(0x80 >> (x % 8))
+    elif(imwidth == epd.height and imheight == epd.width):
+        for y in range(imheight):
+            for x in range(imwidth):
+                newx = y
+                newy = epd.height - x - 1
+                if pixels[x, y] == 0:
+                    buf[int((newx + newy*epd.width) / 8)] &= ~(0x80 >> (y % 8))
+    return buf
+
+
+def bench_getbuffer():
+    from TP_lib import epd2in9_V2
+    epd = epd2in9_V2.EPD_2IN9_V2()
+
+    for name, size in (('vertical', (epd.width, epd.height)),
+                       ('horizontal', (epd.height, epd.width))):
+        image = sample_image(*size)
+        if bytes(epd.getbuffer(image)) != bytes(getbuffer_reference(epd, image)):
+            raise AssertionError("getbuffer %s output differs from reference" % name)
+        old = timeit(lambda: getbuffer_reference(epd, image), repeat=3)
+        new = timeit(lambda: epd.getbuffer(image))
+        print("getbuffer %-10s  loop: %8.2f ms  numpy: %6.3f ms  (x%.0f)"
+              % (name, old, new, old / new))
+
+
+def getbuffer_4Gray_reference(epd, image):
+    """The original per-pixel EPD_2IN9_V2.getbuffer_4Gray"""
+    buf = [0xFF] * (int(epd.width / 4) * epd.height)
+    image_monocolor = image.convert('L')
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    i = 0
+    if(imwidth == epd.width and imheight == epd.height):
+        for y in range(imheight):
+            for x in range(imwidth):
+                if(pixels[x, y] == 0xC0):
+                    pixels[x, y] = 0x80
+                elif (pixels[x, y] == 0x80):
+                    pixels[x, y] = 0x40
+                i = i + 1
+                if(i % 4 == 0):
+                    buf[int((x + (y * epd.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
+    elif(imwidth == epd.height and imheight == epd.width):
+        for x in range(imwidth):
+            for y in range(imheight):
+                newx = y
+                newy = epd.height - x - 1
+                if(pixels[x, y] == 0xC0):
+                    pixels[x, y] = 0x80
+                elif (pixels[x, y] == 0x80):
+                    pixels[x, y] = 0x40
+                i = i + 1
+                if(i % 4 == 0):
+                    buf[int((newx + (newy * epd.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
+    return buf
+
+
+def gray4_planes_reference(image):
+    """The bit twiddling of the original EPD_2IN9_V2.display_4Gray"""
+    # (0x24 bit, 0x26 bit) for each top-two-bit pixel value
+    bits = {0xC0: (0, 0), 0x00: (1, 1), 0x80: (1, 0), 0x40: (0, 1)}
+    planes = ([], [])
+    for i in range(0, len(image) // 2):
+        for plane in (0, 1):
+            temp3 = 0
+            for j in range(0, 2):
+                temp1 = image[i*2+j]
+                for k in range(0, 4):
+                    temp3 = (temp3 << 1) | bits[temp1 & 0xC0][plane]
+                    temp1 <<= 2
+            planes[plane].append(temp3)
+    return bytes(planes[0]), bytes(planes[1])
+
+
+def sample_image_4gray(width, height, seed=0):
+    """A reproducible 'L' frame using the four gray fills plus stray values"""
+    rnd = random.Random(seed)
+    image = Image.new('L', (width, height), 0xFF)
+    draw = ImageDraw.Draw(image)
+    for n, fill in enumerate((0x00, 0x80, 0xC0, 0xFF)):
+        draw.rectangle((0, n * height // 4, width - 1, (n + 1) * height // 4), fill=fill)
+    for _ in range(width * height // 10):
+        image.putpixel((rnd.randrange(width), rnd.randrange(height)), rnd.randrange(256))
+    return image
+
+
+def bench_gray4():
+    from TP_lib import epd2in9_V2
+    epd = epd2in9_V2.EPD_2IN9_V2()
+
+    for name, size in (('vertical', (epd.width, epd.height)),
+                       ('horizontal', (epd.height, epd.width))):
+        image = sample_image_4gray(*size)
+        ref_buf = getbuffer_4Gray_reference(epd, image)
+        if bytes(epd.getbuffer_4Gray(image)) != bytes(ref_buf):
+            raise AssertionError("getbuffer_4Gray %s output differs from reference" % name)
+        ref_planes = gray4_planes_reference(ref_buf)
+        if epd.getbuffer_4Gray_planes(image) != ref_planes:
+            raise AssertionError("getbuffer_4Gray_planes %s output differs from reference" % name)
+
+        old = timeit(lambda: gray4_planes_reference(getbuffer_4Gray_reference(epd, image)), repeat=3)
+        new = timeit(lambda: epd.getbuffer_4Gray_planes(image))
+        print("4-gray    %-10s  loop: %8.2f ms  numpy: %6.3f ms  (x%.0f)"
+              % (name, old, new, old / new))
+
+
+class CountingTransport:
+    """Stands in for the SPI and GPIO calls of epdconfig and counts them.
+
+    writebytes2 is counted the way spidev issues it: one ioctl per 4096-byte
+    chunk. The BUSY pin always reads idle.
+    """
+    SPI_BUFSIZ = 4096
+
+    def __init__(self):
+        self.ioctls = 0
+        self.spi_bytes = 0
+        self.gpio_writes = 0
+
+    def spi_writebyte(self, data):
+        self.ioctls += 1
+        self.spi_bytes += len(data)
+
+    def spi_writebyte2(self, data):
+        self.ioctls += max(1, -(-len(data) // self.SPI_BUFSIZ))
+        self.spi_bytes += len(data)
+
+    def digital_write(self, pin, value):
+        self.gpio_writes += 1
+
+    def pin_handle(self, pin):
+        from TP_lib import epdconfig
+        return epdconfig.PinHandle(pin, lambda value: self.digital_write(pin, value))
+
+    def digital_read(self, pin):
+        return 0
+
+    def delay_ms(self, delaytime):
+        pass
+
+    FUNCTIONS = ('spi_writebyte', 'spi_writebyte2', 'digital_write', 'pin_handle', 'digital_read', 'delay_ms')
+
+    def install(self, module):
+        for name in self.FUNCTIONS:
+            setattr(module, name, getattr(self, name))
+
+
+def clear_reference(epd, color):
+    """The original byte-at-a-time Clear"""
+    epd.send_command(0x24)
+    for j in range(0, epd.height):
+        for i in range(0, (epd.width + 7) // 8):
+            epd.send_data(color)
+    epd.TurnOnDisplay()
+
+
+def base_image_reference(epd, image):
+    """The original byte-at-a-time displayPartBaseImage"""
+    for command in (0x24, 0x26):
+        epd.send_command(command)
+        for data in image:
+            epd.send_data(data)
+    epd.TurnOnDisplay()
+
+
+def bench_clear():
+    from TP_lib import epdconfig, epd2in9_V2, epd2in13_V2, epd2in13_V3, epd2in13_V4
+
+    saved = dict((name, getattr(epdconfig, name)) for name in CountingTransport.FUNCTIONS)
+    try:
+        for name, epd in (('2in9_V2', epd2in9_V2.EPD_2IN9_V2()), ('2in13_V2', epd2in13_V2.EPD_2IN13_V2()),
+                          ('2in13_V3', epd2in13_V3.EPD()), ('2in13_V4', epd2in13_V4.EPD())):
+            old = CountingTransport()
+            old.install(epdconfig)
+            clear_reference(epd, 0xFF)
+
+            new = CountingTransport()
+            new.install(epdconfig)
+            epd.Clear(0xFF)
+            print("Clear     %-10s  ioctls: %5d -> %d   gpio writes: %5d -> %d"
+                  % (name, old.ioctls, new.ioctls, old.gpio_writes, new.gpio_writes))
+            if new.spi_bytes != old.spi_bytes:
+                raise AssertionError("Clear %s sent %d bytes, expected %d" % (name, new.spi_bytes, old.spi_bytes))
+
+            if hasattr(epd, 'displayPartBaseImage'):
+                image = bytes([0xAA]) * (((epd.width + 7) // 8) * epd.height)
+                old = CountingTransport()
+                old.install(epdconfig)
+                base_image_reference(epd, image)
+
+                new = CountingTransport()
+                new.install(epdconfig)
+                epd.displayPartBaseImage(image)
+                print("BaseImage %-10s  ioctls: %5d -> %d   gpio writes: %5d -> %d"
+                      % (name, old.ioctls, new.ioctls, old.gpio_writes, new.gpio_writes))
+    finally:
+        for name, func in saved.items():
+            setattr(epdconfig, name, func)
+
+
+def set_window_reference(epd, x_start, y_start, x_end, y_end):
+    """SetWindow + SetCursor as the drivers sent them, one byte per write"""
+    epd.send_command(0x44)
+    epd.send_data((x_start>>3) & 0xFF)
+    epd.send_data((x_end>>3) & 0xFF)
+    epd.send_command(0x45)
+    epd.send_data(y_start & 0xFF)
+    epd.send_data((y_start >> 8) & 0xFF)
+    epd.send_data(y_end & 0xFF)
+    epd.send_data((y_end >> 8) & 0xFF)
+    epd.send_command(0x4E)
+    epd.send_data(x_start >> 3)
+    epd.send_command(0x4F)
+    epd.send_data(y_start & 0xFF)
+    epd.send_data((y_start >> 8) & 0xFF)
+
+
+def bench_transaction():
+    from TP_lib import epdconfig, epd2in13_V4
+
+    saved = dict((name, getattr(epdconfig, name)) for name in CountingTransport.FUNCTIONS)
+    try:
+        epd = epd2in13_V4.EPD()
+        old = CountingTransport()
+        old.install(epdconfig)
+        set_window_reference(epd, 16, 40, 79, 120)
+
+        new = CountingTransport()
+        new.install(epdconfig)
+        epd.SetWindow(16, 40, 79, 120)
+        epd.SetCursor(2, 40)
+        print("Window    2in13_V4    ioctls: %5d -> %d   gpio writes: %5d -> %d"
+              % (old.ioctls, new.ioctls, old.gpio_writes, new.gpio_writes))
+
+        # A long write is split at the spidev buffer size
+        new = CountingTransport()
+        new.install(epdconfig)
+        with epd.transaction() as tx:
+            tx.command(0x24, bytes(10000))
+        if new.ioctls != 1 + 3 or new.spi_bytes != 10001:
+            raise AssertionError("10000-byte write took %d ioctls" % new.ioctls)
+    finally:
+        for name, func in saved.items():
+            setattr(epdconfig, name, func)
+
+
+class FakeGpioChip:
+    """The ioctls of a /dev/gpiochip device, in memory. Line handles are
+    real file descriptors on /dev/null so they can be closed as usual.
+    """
+
+    def __init__(self):
+        self.values = {}        # line handle fd -> last value written
+        self.writes = 0
+
+    def ioctl(self, fd, request, arg, mutate_flag=True):
+        from TP_lib import gpiochip
+        if request == gpiochip.GPIO_GET_LINEHANDLE_IOCTL:
+            handle = os.open(os.devnull, os.O_RDWR)
+            struct.pack_into('i', arg, gpiochip.HANDLE_REQUEST_FD, handle)
+            self.values[handle] = arg[gpiochip.HANDLE_REQUEST_DEFAULTS]
+        elif request == gpiochip.GPIOHANDLE_SET_LINE_VALUES_IOCTL:
+            self.values[fd] = arg[0]
+            self.writes += 1
+        elif request == gpiochip.GPIOHANDLE_GET_LINE_VALUES_IOCTL:
+            arg[0] = self.values[fd]
+        else:
+            raise OSError(25, "unsupported ioctl %#x" % request)
+        return 0
+
+
+def toggles_per_second(write, count=100000):
+    start = time.perf_counter()
+    for _ in range(count // 2):
+        write(1)
+        write(0)
+    return count / (time.perf_counter() - start)
+
+
+def digital_write_reference(leds):
+    """The original if/elif RaspberryPi.digital_write over gpiozero LEDs"""
+    from TP_lib import epdconfig
+    rst, dc, trst = leds
+
+    def digital_write(pin, value):
+        if pin == epdconfig.EPD_RST_PIN:
+            if value:
+                rst.on()
+            else:
+                rst.off()
+        elif pin == epdconfig.EPD_DC_PIN:
+            if value:
+                dc.on()
+            else:
+                dc.off()
+        elif pin == epdconfig.TRST:
+            if value:
+                trst.on()
+            else:
+                trst.off()
+    return digital_write
+
+
+def bench_gpio():
+    from TP_lib import epdconfig, gpiochip
+
+    fake = FakeGpioChip()
+    chip = gpiochip.GpioChip(os.devnull, ioctl=fake.ioctl)
+    try:
+        dc = chip.output(epdconfig.EPD_DC_PIN)
+        dc.write(1)
+        if dc.read() != 1 or fake.writes != 1:
+            raise AssertionError("fake chip line did not follow write()")
+        handles = {epdconfig.EPD_DC_PIN: epdconfig.PinHandle(epdconfig.EPD_DC_PIN, dc.write)}
+
+        def digital_write(pin, value):
+            handle = handles.get(pin)
+            if handle is not None:
+                handle.write(value)
+
+        rate = toggles_per_second(dc.write)
+        print("GPIO      cdev handle         %9.0f toggles/s" % rate)
+        rate = toggles_per_second(lambda value: digital_write(epdconfig.EPD_DC_PIN, value))
+        print("GPIO      cdev digital_write  %9.0f toggles/s" % rate)
+    finally:
+        chip.close()
+
+    try:
+        from gpiozero import Device, LED
+        from gpiozero.pins.mock import MockFactory
+    except ImportError:
+        print("GPIO      gpiozero            not installed, skipped")
+        return
+    Device.pin_factory = MockFactory()
+    leds = [LED(pin) for pin in (epdconfig.EPD_RST_PIN, epdconfig.EPD_DC_PIN, epdconfig.TRST)]
+    try:
+        digital_write = digital_write_reference(leds)
+        rate = toggles_per_second(lambda value: digital_write(epdconfig.EPD_DC_PIN, value), 20000)
+        print("GPIO      gpiozero (mock pin) %9.0f toggles/s" % rate)
+    finally:
+        for led in leds:
+            led.close()
+
+
+def bench_spi():
+    import numpy as np
+    from TP_lib import epdconfig
+
+    frame = np.arange(296 * 16, dtype=np.uint8)
+    for name, data in (('bytes', frame.tobytes()), ('bytearray', bytearray(frame.tobytes())),
+                       ('memoryview', memoryview(frame.tobytes())), ('numpy', frame),
+                       ('numpy 2-D', frame.reshape(296, 16)), ('list', frame.tolist())):
+        chunks = []
+        saved = epdconfig.spi_writebyte2
+        epdconfig.spi_writebyte2 = chunks.append
+        try:
+            epdconfig.spi_write(data)
+        finally:
+            epdconfig.spi_writebyte2 = saved
+        if b''.join(bytes(chunk) for chunk in chunks) != frame.tobytes():
+            raise AssertionError("spi_write(%s) sent different bytes" % name)
+        # the chunks are memoryview slices; only a list needs converting first
+        copied = isinstance(epdconfig.as_buffer(data), bytes) and not isinstance(data, bytes)
+        print("SPI       %-10s  %d chunks  %s" % (name, len(chunks), 'copied' if copied else 'zero-copy'))
+
+    epdconfig.spi_transfers.clear()
+    from TP_lib import epd2in9_V2
+    epd = epd2in9_V2.EPD_2IN9_V2()
+    epd.init()
+    epd.display(epd.getbuffer(sample_image(epd.width, epd.height)))
+    stats = epdconfig.spi_stats()
+    print("SPI       2in9_V2 init+display: %d transfers, %d bytes, max %.3f ms, %.1f MB/s"
+          % (stats['transfers'], stats['bytes'], stats['max_ms'], stats['bytes_per_second'] / 1e6))
+
+
+# Import cost of the drivers, in ms, measured in a fresh interpreter
+IMPORT_BUDGET_MS = 150
+
+IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+from TP_lib import epd2in9_V2, epd2in13_V2, epd2in13_V3, epd2in13_V4, gt1151, icnt86, epdconfig
+elapsed = (time.perf_counter() - start) * 1000
+hardware = [name for name in ('gpiozero', 'spidev', 'smbus', 'smbus2') if name in sys.modules]
+print(elapsed, epdconfig.is_open(), ','.join(hardware))
+"""
+
+
+def bench_startup():
+    import subprocess
+    env = dict(os.environ)
+    env.pop('EPD_BACKEND', None)        # the default, real hardware
+    env['PYTHONPATH'] = libdir
+    best = None
+    for _ in range(5):
+        out = subprocess.check_output([sys.executable, '-c', IMPORT_PROBE], env=env, universal_newlines=True)
+        elapsed, opened, hardware = (out.split() + [''])[:3]
+        if opened != 'False' or hardware:
+            raise AssertionError("importing the drivers opened the hardware (%s)" % (hardware or 'backend'))
+        best = float(elapsed) if best is None else min(best, float(elapsed))
+    print("Startup   driver imports: %.1f ms (budget %d ms), no hardware opened" % (best, IMPORT_BUDGET_MS))
+    if best > IMPORT_BUDGET_MS:
+        raise AssertionError("driver imports took %.1f ms" % best)
+
+
+def bench_sleep():
+    from TP_lib import epdconfig, display
+
+    for name in display.PANELS:
+        with display.Display(name, backend='sim') as d:
+            sim = epdconfig.implementation
+            buf = d.getbuffer(Image.new('1', (d.width, d.height), 255))
+            d.display(buf, wait=False)
+            start = time.perf_counter()
+            done = d.sleep()
+            returned = (time.perf_counter() - start) * 1000
+            done.result()
+            if not sim.sleeping:
+                raise AssertionError("%s did not enter deep sleep" % name)
+            start = time.perf_counter()
+            d.display(buf)
+            woke = (time.perf_counter() - start) * 1000
+            if sim.sleeping or sim.render(width=d.width).tobytes() != Image.frombytes('1', (d.width, d.height), bytes(buf)).tobytes():
+                raise AssertionError("%s did not wake up for display()" % name)
+        if not sim.sleeping or epdconfig.is_open():
+            raise AssertionError("%s session left the panel awake or the hardware open" % name)
+        print("Sleep     %-10s  sleep() returned in %.3f ms, wake + display %.1f ms"
+              % (name, returned, woke))
+
+    # A session woken for display_4Gray re-runs Init_4Gray, not init
+    with display.Display('2in9_V2', backend='sim') as d:
+        inits = []
+        for name in ('init', 'Init_4Gray'):
+            method = getattr(d.epd, name)
+            setattr(d.epd, name, lambda method=method, name=name: inits.append(name) or method())
+        d.Init_4Gray()
+        buf = d.getbuffer_4Gray(Image.new('L', (d.width, d.height), 255))
+        d.sleep(wait=True)
+        d.display_4Gray(buf)
+        if inits != ['Init_4Gray', 'Init_4Gray']:
+            raise AssertionError("4-gray session woke up with %s" % inits[1:])
+
+
+def clock_frames(width, height, count=5):
+    """Frames of a clock screen where only the seconds change"""
+    frames = []
+    for second in range(count):
+        image = sample_image(width, height)
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((4, height - 20, 80, height - 4), fill=255)
+        draw.text((4, height - 18), '12:34:%02d' % second, fill=0)
+        frames.append(image)
+    return frames
+
+
+def panels():
+    """One driver per supported panel, all on the same backend"""
+    from TP_lib import epd2in9_V2, epd2in13_V2, epd2in13_V3, epd2in13_V4
+    return [epd2in9_V2.EPD_2IN9_V2(), epd2in13_V2.EPD_2IN13_V2(), epd2in13_V3.EPD(), epd2in13_V4.EPD()]
+
+
+def base_image(epd, frame):
+    """Full refresh of frame, leaving the panel ready for partial refreshes"""
+    if hasattr(epd, 'FULL_UPDATE'):
+        epd.init(epd.FULL_UPDATE)
+        epd.displayPartBaseImage(frame)
+        epd.init(epd.PART_UPDATE)
+    else:
+        epd.init()
+        epd.display_Base(frame)
+
+
+def shown(epd, sim):
+    """The frame the simulated panel last refreshed, in getbuffer order"""
+    rows = sim.frame.tobytes()[:epd.linewidth * epd.height]
+    if not epd.panel.entry_mode & 0x02:
+        # RAM lines were written bottom to top
+        lines = [rows[i:i + epd.linewidth] for i in range(0, len(rows), epd.linewidth)]
+        rows = b''.join(reversed(lines))
+    return rows
+
+
+def panel_frames(epd, count=5):
+    return [epd.getbuffer(image) for image in clock_frames(epd.height, epd.width, count)]
+
+
+def bench_region():
+    from TP_lib import epdconfig
+    sim = epdconfig.open()
+
+    for epd in panels():
+        frames = panel_frames(epd)
+        partial = getattr(epd, 'displayPartial', None) or epd.display_Partial
+        payload = {}
+        for method in (partial, epd.display_region):
+            base_image(epd, frames[0])
+            sim.reset_stats()
+            for frame in frames[1:]:
+                method(frame).result()
+            payload[method.__name__] = sim.spi_bytes // (len(frames) - 1)
+            if shown(epd, sim) != bytes(frames[-1]):
+                raise AssertionError("%s %s left the wrong frame on the panel" % (epd.panel.name, method.__name__))
+        print("Partial   %-10s  SPI bytes per update: %s %d -> display_region %d"
+              % (epd.panel.name, partial.__name__, payload[partial.__name__], payload['display_region']))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def bench_power():
+    from TP_lib import epdconfig, power
+    sim = epdconfig.open()
+
+    for epd in panels():
+        frames = panel_frames(epd, 3)
+        clock = FakeClock()
+        pm = power.PowerManager(epd, idle_timeout=60, timer=False, clock=clock)
+        if hasattr(epd, 'FULL_UPDATE'):
+            pm.init(epd.FULL_UPDATE)
+            pm.displayPartBaseImage(frames[0])
+            pm.init(epd.PART_UPDATE)
+        else:
+            pm.init()
+            pm.display_Base(frames[0])
+
+        wake_bytes = []
+        for frame in frames[1:]:
+            clock.now += 60
+            if not pm.check():
+                raise AssertionError("%s did not go to sleep when idle" % epd.panel.name)
+            epd.refresh.wait()
+            if not sim.sleeping:
+                raise AssertionError("%s is not in deep sleep" % epd.panel.name)
+            clock.now += 240
+            sim.reset_stats()
+            pm.display_region(frame).result()
+            wake_bytes.append(sim.spi_bytes)
+            if shown(epd, sim) != bytes(frame):
+                raise AssertionError("%s showed the wrong frame after waking" % epd.panel.name)
+        pm.close()
+        stats = pm.stats()
+        kind = 'partial' if stats['partial_wakes'] else 'full'
+        print("Power     %-10s  wakes %d (%s), sleeps %d, awake %.0f s of %.0f s, wake+draw %d SPI bytes"
+              % (epd.panel.name, stats['wakes'], kind, stats['sleeps'], stats['awake_seconds'],
+                 clock.now, wake_bytes[-1]))
+        if epd.retains_ram() != (stats['partial_wakes'] == stats['wakes']):
+            raise AssertionError("%s woke up the wrong way" % epd.panel.name)
+
+
+def spin_reference(read, seconds):
+    # The INT polling thread the examples used to run
+    flag = [1]
+    touch = [0]
+
+    def pthread_irq():
+        while flag[0] == 1:
+            if read() == 0:
+                touch[0] = 1
+            else:
+                touch[0] = 0
+    t = threading.Thread(target=pthread_irq, daemon=True)
+    t.start()
+    time.sleep(seconds)
+    flag[0] = 0
+    t.join()
+
+
+def idle_cpu(run, seconds=0.5):
+    start, cpu = time.perf_counter(), time.process_time()
+    run(seconds)
+    return (time.process_time() - cpu) / (time.perf_counter() - start) * 100
+
+
+def bench_touch():
+    from TP_lib import epdconfig, gt1151, icnt86, touch
+    sim = epdconfig.open()
+
+    for name, controller, report in (('GT1151', gt1151.GT1151(), gt_report),
+                                     ('ICNT86', icnt86.INCT86(), icnt_report)):
+        latencies = []
+        with touch.TouchService(controller) as service:
+            for i in range(200):
+                expected = (i % 120, i % 125, 20)
+                report(sim.registers, [expected])
+                start = time.perf_counter()
+                sim.set_pin(epdconfig.INT, 0)
+                event = service.get(timeout=1)
+                latencies.append(time.perf_counter() - start)
+                sim.set_pin(epdconfig.INT, 1)
+                if event is None or event.points[0] != expected:
+                    raise AssertionError("%s delivered %r for %r" % (name, event, expected))
+            cpu = idle_cpu(time.sleep)
+        stats = service.stats()
+        if stats['irqs'] != 200 or stats['delivered'] != 200:
+            raise AssertionError("%s lost touches: %r" % (name, stats))
+        latencies.sort()
+        print("Touch     %-8s  INT to event p50 %.3f ms, max %.3f ms; idle CPU %.1f%%"
+              % (name, latencies[len(latencies) // 2] * 1000, latencies[-1] * 1000, cpu))
+        if cpu > 5:
+            raise AssertionError("%s touch service is not idle: %.1f%% CPU" % (name, cpu))
+
+    polling = idle_cpu(lambda seconds: spin_reference(lambda: sim.digital_read(epdconfig.INT), seconds))
+    print("Touch     polling thread (reference)  idle CPU %.1f%%" % polling)
+
+
+class FakeI2cMsg:
+    """smbus2.i2c_msg stand-in"""
+    def __init__(self, addr, data, read):
+        self.addr = addr
+        self.buf = bytearray(data)
+        self.read_msg = read
+
+    @classmethod
+    def write(cls, addr, data):
+        return cls(addr, data, False)
+
+    @classmethod
+    def read(cls, addr, length):
+        return cls(addr, bytes(length), True)
+
+    def __bytes__(self):
+        return bytes(self.buf)
+
+
+class FakeSMBus:
+    """A touch controller on a counting I2C bus: 16-bit register pointer
+    with auto-increment. wire_bytes includes the address byte of every
+    message, which is what the bus time is made of.
+    """
+    def __init__(self, registers):
+        self.registers = registers
+        self.pointer = 0
+        self.transactions = 0
+        self.wire_bytes = 0
+
+    def _count(self, *sizes):
+        self.transactions += 1
+        self.wire_bytes += sum(1 + size for size in sizes)
+
+    def write_byte_data(self, addr, cmd, value):
+        self._count(2)
+        self.pointer = (cmd << 8) | value
+
+    def write_word_data(self, addr, cmd, word):
+        self._count(3)
+        self.registers[(cmd << 8) | (word & 0xFF)] = word >> 8
+
+    def read_byte(self, addr):
+        self._count(1)
+        value = self.registers[self.pointer]
+        self.pointer = (self.pointer + 1) & 0xFFFF
+        return value
+
+    def i2c_rdwr(self, *msgs):
+        self._count(*(len(msg.buf) for msg in msgs))
+        for msg in msgs:
+            if msg.read_msg:
+                msg.buf[:] = self.registers[self.pointer:self.pointer + len(msg.buf)]
+            else:
+                self.pointer = (msg.buf[0] << 8) | msg.buf[1]
+
+
+def gt_report(registers, points):
+    registers[0x814E] = 0x80 | len(points)
+    for i, (x, y, s) in enumerate(points):
+        registers[0x814F + 8 * i:0x8157 + 8 * i] = struct.pack('<BHHHB', i, x, y, s, 0)
+
+
+def icnt_report(registers, points):
+    registers[0x1001] = len(points)
+    for i, (x, y, p) in enumerate(points):
+        registers[0x1002 + 7 * i:0x1009 + 7 * i] = struct.pack('<BHHBB', i, 295 - x, 127 - y, p, 0)
+
+
+def gt_scan_reference(read, write, dev):
+    """The original GT_Scan transfers: status, then the points, then the ack"""
+    buf = read(0x814E, 1)
+    dev.TouchCount = buf[0] & 0x0F
+    buf = read(0x814F, dev.TouchCount * 8)
+    write(0x814E, 0)
+    for i in range(dev.TouchCount):
+        dev.X[i] = (buf[2 + 8*i] << 8) + buf[1 + 8*i]
+        dev.Y[i] = (buf[4 + 8*i] << 8) + buf[3 + 8*i]
+        dev.S[i] = (buf[6 + 8*i] << 8) + buf[5 + 8*i]
+
+
+def icnt_scan_reference(read, write, dev):
+    buf = read(0x1001, 1)
+    dev.TouchCount = buf[0]
+    buf = read(0x1002, dev.TouchCount * 7)
+    write(0x1001, 0)
+    for i in range(dev.TouchCount):
+        dev.X[i] = 295 - ((buf[2 + 7*i] << 8) + buf[1 + 7*i])
+        dev.Y[i] = 127 - ((buf[4 + 7*i] << 8) + buf[3 + 7*i])
+        dev.P[i] = buf[5 + 7*i]
+
+
+def bench_i2c():
+    from TP_lib import epdconfig, gt1151, icnt86
+
+    sim = epdconfig.open()
+    controllers = (('GT1151', gt1151.GT1151().GT_Scan, gt1151.GT_Development, gt_report, gt_scan_reference, 'S'),
+                   ('ICNT86', icnt86.INCT86().ICNT_Scan, icnt86.ICNT_Development, icnt_report, icnt_scan_reference, 'P'))
+    try:
+        for name, scan, development, report, reference, size in controllers:
+            for count in (1, 5):
+                points = [(10 + 20 * i, 10 + 20 * i, 5 + i) for i in range(count)]
+                results = []
+                for label, i2c_msg in (('smbus2', FakeI2cMsg), ('smbus', None)):
+                    # A RaspberryPi backend on the fake bus, without the GPIO and SPI parts
+                    rpi = epdconfig.RaspberryPi.__new__(epdconfig.RaspberryPi)
+                    rpi.bus = FakeSMBus(bytearray(0x10000))
+                    rpi.i2c_msg = i2c_msg
+                    report(rpi.bus.registers, points)
+                    old = development()
+                    reference(rpi.i2c_readbyte, rpi.i2c_writebyte, old)
+                    old_cost = (rpi.bus.transactions, rpi.bus.wire_bytes)
+
+                    report(rpi.bus.registers, points)
+                    rpi.bus.transactions = rpi.bus.wire_bytes = 0
+                    epdconfig.use_backend(rpi)
+                    dev = development()
+                    dev.Touch = 1
+                    scan(dev, development())
+                    new_cost = (rpi.bus.transactions, rpi.bus.wire_bytes)
+                    got = [(dev.X[i], dev.Y[i], getattr(dev, size)[i]) for i in range(dev.TouchCount)]
+                    want = [(old.X[i], old.Y[i], getattr(old, size)[i]) for i in range(old.TouchCount)]
+                    if got != points or want != points:
+                        raise AssertionError("%s %s decoded %r, reference %r, expected %r" % (name, label, got, want, points))
+                    results.append("%s %d -> %d (%d -> %d bytes)" % (label, old_cost[0], new_cost[0], old_cost[1], new_cost[1]))
+                    if label == 'smbus2' and new_cost[0] != (2 if count == 1 else 3):
+                        raise AssertionError("%s %d-point report took %d transactions" % (name, count, new_cost[0]))
+                print("I2C       %s %d point%s  transactions: %s" % (name, count, 's' if count > 1 else ' ', ', '.join(results)))
+    finally:
+        epdconfig.use_backend(sim)
+
+
+class ListDevelopment:
+    """The original GT_Development / ICNT_Development: plain lists"""
+    def __init__(self):
+        self.TouchCount = 0
+        self.Touchkeytrackid = [0, 1, 2, 3, 4]
+        self.TouchEvenid = [0, 1, 2, 3, 4]
+        self.X = [0, 1, 2, 3, 4]
+        self.Y = [0, 1, 2, 3, 4]
+        self.S = [0, 1, 2, 3, 4]
+        self.P = [0, 1, 2, 3, 4]
+
+
+def gt_decode_reference(dev, buf):
+    """The original GT_Scan decode of a status + points report"""
+    buf = buf[1:]
+    for i in range(0, dev.TouchCount, 1):
+        dev.Touchkeytrackid[i] = buf[0 + 8*i]
+        dev.X[i] = (buf[2 + 8*i] << 8) + buf[1 + 8*i]
+        dev.Y[i] = (buf[4 + 8*i] << 8) + buf[3 + 8*i]
+        dev.S[i] = (buf[6 + 8*i] << 8) + buf[5 + 8*i]
+
+
+def icnt_decode_reference(dev, buf):
+    buf = buf[1:]
+    for i in range(0, dev.TouchCount, 1):
+        dev.TouchEvenid[i] = buf[6 + 7*i]
+        dev.X[i] = 295 - ((buf[2 + 7*i] << 8) + buf[1 + 7*i])
+        dev.Y[i] = 127 - ((buf[4 + 7*i] << 8) + buf[3 + 7*i])
+        dev.P[i] = buf[5 + 7*i]
+
+
+def bench_decode():
+    from TP_lib import gt1151, icnt86
+
+    points = [(10 + 20 * i, 300 + 40 * i, 5 + i) for i in range(5)]
+    registers = bytearray(0x10000)
+    gt_report(registers, points)
+    gt_buf = bytes(registers[0x814E:0x814E + 41])
+    icnt_points = [(10 + 20 * i, 10 + 20 * i, 5 + i) for i in range(5)]
+    icnt_report(registers, icnt_points)
+    icnt_buf = bytes(registers[0x1001:0x1001 + 36])
+
+    for name, decode, reference, development, buf, expected, size in (
+            ('GT1151', gt1151.GT1151().GT_Decode, gt_decode_reference, gt1151.GT_Development, gt_buf, points, 'S'),
+            ('ICNT86', icnt86.INCT86().ICNT_Decode, icnt_decode_reference, icnt86.ICNT_Development, icnt_buf, icnt_points, 'P')):
+        old, new = ListDevelopment(), development()
+        old.TouchCount = new.TouchCount = 5
+        reference(old, buf)
+        decode(new, buf, 1, 0, 5)
+        for dev in (old, new):
+            if [(dev.X[i], dev.Y[i], getattr(dev, size)[i]) for i in range(5)] != expected:
+                raise AssertionError("%s decode differs from the report" % name)
+        if [(p.x, p.y) for p in new.Points] != [(x, y) for x, y, s in expected]:
+            raise AssertionError("%s points differ from the X/Y lists" % name)
+
+        # Steady state: the same point slots are reused, nothing is retained
+        for _ in range(100):
+            decode(new, buf, 1, 0, 5)
+        blocks = sys.getallocatedblocks()
+        for _ in range(10000):
+            decode(new, buf, 1, 0, 5)
+        grown = sys.getallocatedblocks() - blocks
+        if grown > 10:
+            raise AssertionError("%s decode retained %d blocks" % (name, grown))
+
+        loops = 1000
+        ref_us = timeit(lambda: [reference(old, buf) for _ in range(loops)], repeat=5) * 1000 / loops
+        new_us = timeit(lambda: [decode(new, buf, 1, 0, 5) for _ in range(loops)], repeat=5) * 1000 / loops
+        print("Decode    %s 5 points  shift/add: %5.2f us  struct: %5.2f us  (x%.1f), %+d blocks over 10000"
+              % (name, ref_us, new_us, ref_us / new_us, grown))
+
+
+def drag(track_id, t, x0, y0, x1, y1, duration, steps=10):
+    """Samples of one finger moving in a straight line, then lifting"""
+    samples = [(t + duration * i / steps,
+                [(track_id, x0 + (x1 - x0) * i // steps, y0 + (y1 - y0) * i // steps)])
+               for i in range(steps + 1)]
+    return samples + [(t + duration + 0.02, [])]
+
+
+def pinch(t, distance0, distance1, duration, steps=10):
+    samples = []
+    for i in range(steps + 1):
+        half = (distance0 + (distance1 - distance0) * i // steps) // 2
+        samples.append((t + duration * i / steps, [(0, 60 - half, 120), (1, 60 + half, 120)]))
+    return samples + [(t + duration + 0.02, [(1, 60 + half, 120)]), (t + duration + 0.04, [])]
+
+
+# (name, trace, expected gesture kinds)
+GESTURE_TRACES = (
+    ('tap', drag(0, 0.0, 50, 50, 52, 51, 0.08, 2), ['tap']),
+    ('double tap', drag(0, 0.0, 50, 50, 50, 50, 0.08, 2) + drag(1, 0.2, 55, 48, 55, 48, 0.08, 2),
+     ['tap', 'tap', 'double_tap']),
+    ('two taps', drag(0, 0.0, 20, 50, 20, 50, 0.08, 2) + drag(1, 0.2, 100, 200, 100, 200, 0.08, 2),
+     ['tap', 'tap']),
+    ('long press', [(0.0, [(0, 60, 60)]), (1.2, [])], ['long_press']),
+    ('swipe right', drag(0, 0.0, 10, 100, 110, 104, 0.2), ['swipe right']),
+    ('swipe up', drag(0, 0.0, 60, 220, 58, 40, 0.3), ['swipe up']),
+    ('slow drag', drag(0, 0.0, 10, 100, 90, 100, 1.6, 20), []),
+    ('pinch out', pinch(0.0, 40, 100, 0.3), ['pinch out']),
+    ('pinch in', pinch(0.0, 100, 30, 0.3), ['pinch in']),
+)
+
+
+def gesture_names(gestures):
+    names = []
+    for g in gestures:
+        if g.kind == 'swipe':
+            names.append('swipe ' + g.direction)
+        elif g.kind == 'pinch':
+            names.append('pinch out' if g.scale > 1 else 'pinch in')
+        else:
+            names.append(g.kind)
+    return names
+
+
+def bench_gesture():
+    from TP_lib import epdconfig, gt1151, gesture, touch
+
+    for name, trace, expected in GESTURE_TRACES:
+        got = gesture_names(gesture.replay(trace))
+        if got != expected:
+            raise AssertionError("gesture trace %r recognized as %r, expected %r" % (name, got, expected))
+
+    # The same tap through the touch service on the simulator, lift included
+    sim = epdconfig.open()
+    recognizer = gesture.GestureRecognizer()
+    gestures = []
+    with touch.TouchService(gt1151.GT1151(), releases=True) as service:
+        for points in ([(40, 80, 10)], [(41, 80, 10)], []):
+            gt_report(sim.registers, points)
+            sim.set_pin(epdconfig.INT, 0)
+            sim.set_pin(epdconfig.INT, 1)
+            gestures.extend(recognizer.feed_event(service.get(timeout=1)))
+    if gesture_names(gestures) != ['tap']:
+        raise AssertionError("touch service tap recognized as %r" % gesture_names(gestures))
+
+    # Cost per sample stays flat however long the stream runs
+    traces = [trace for name, trace, expected in GESTURE_TRACES]
+    for count in (100, 1000):
+        stream = []
+        t = 0.0
+        for i in range(count):
+            for sample_t, points in traces[i % len(traces)]:
+                stream.append((t + sample_t, points))
+            t = stream[-1][0] + 1.0
+        recognizer = gesture.GestureRecognizer()
+        feed, tick = recognizer.feed, recognizer.tick
+        start = time.perf_counter()
+        found = 0
+        for sample_t, points in stream:
+            found += len(feed(sample_t, points))
+            found += len(tick(sample_t + 0.001))
+        elapsed = time.perf_counter() - start
+        print("Gesture   %6d samples  %5.2f us/sample, %d gestures"
+              % (len(stream), elapsed / len(stream) * 1e6, found))
+
+
+def region_grid(count, width, height, size):
+    """count size x size buttons in rows over width x height; past the
+    bottom the rows start over on top of the first ones"""
+    boxes = []
+    step = size + 2
+    cols = width // step
+    for i in range(count):
+        x, y = (i % cols) * step, (i // cols) * step % height
+        boxes.append(('button%d' % i, (x, y, x + size, y + size)))
+    return boxes
+
+
+def bench_regions():
+    from TP_lib import regions
+
+    # Rotated frames: a landscape layout on the portrait 2in13 panel
+    for rotate in (0, 90, 180, 270):
+        frame = regions.Frame(250, 122, rotate)
+        width, height = (250, 122) if rotate in (0, 180) else (122, 250)
+        for x, y in ((0, 0), (249, 0), (0, 121), (249, 121), (100, 37)):
+            touch_x, touch_y = frame.to_touch(x, y)
+            if not (0 <= touch_x < width and 0 <= touch_y < height):
+                raise AssertionError("rotate %d maps %d,%d off the panel" % (rotate, x, y))
+            if frame.from_touch(touch_x, touch_y) != (x, y):
+                raise AssertionError("rotate %d does not map %d,%d back" % (rotate, x, y))
+        got = []
+        touch_map = regions.RegionMap(width, height, frame=frame)
+        touch_map.add('button', (100, 30, 140, 50), lambda region, x, y: got.append((x, y)))
+        for x, y in ((100, 30), (139, 49), (99, 30), (140, 49), (139, 50)):
+            touch_map.dispatch(*frame.to_touch(x, y))
+        if got != [(100, 30), (139, 49)]:
+            raise AssertionError("rotate %d dispatched %r" % (rotate, got))
+
+    # Lookup cost, grid buckets against a first-match scan of every region
+    width, height = 296, 128
+    points = [((i * 37) % width, (i * 91) % height) for i in range(5000)]
+    for count in (10, 100, 500):
+        boxes = region_grid(count, width, height, 10)
+        boxes.append(('background', (0, 0, width, height)))
+        touch_map = regions.RegionMap(width, height, boxes)
+
+        def scan(x, y):
+            for name, (x0, y0, x1, y1) in boxes:
+                if x0 <= x < x1 and y0 <= y < y1:
+                    return name
+            return None
+
+        for x, y in points:
+            if touch_map.name_at(x, y) != scan(x, y):
+                raise AssertionError("%d regions: %d,%d hit %r, not %r"
+                                     % (count, x, y, touch_map.name_at(x, y), scan(x, y)))
+        timings = []
+        for lookup in (touch_map.name_at, scan):
+            start = time.perf_counter()
+            for x, y in points:
+                lookup(x, y)
+            timings.append((time.perf_counter() - start) / len(points) * 1e6)
+        print("Regions   %4d regions  grid %5.2f us, scan %6.2f us per lookup" % (count + 1, timings[0], timings[1]))
+
+
+# Touch to refreshed panel through an example app on a log replayed at
+# its pace, in ms at p50 on the simulator (no panel times). Lockstep
+# replays queue touches faster than the app draws, so only their
+# results are checked.
+REPLAY_BUDGET_MS = 50
+
+# (time, points) of the recorded session: the top, middle and bottom of
+# the 2in13 screen and the bottom again, each press moved once and released
+REPLAY_SESSION = [
+    (0.0, [(60, 40, 20)]), (0.05, [(62, 42, 20)]), (0.1, []),
+    (0.5, [(60, 120, 20)]), (0.55, [(61, 121, 20)]), (0.6, []),
+    (1.0, [(60, 200, 20)]), (1.05, [(60, 202, 20)]), (1.1, []),
+    (1.5, [(30, 220, 20)]), (1.55, [(31, 221, 20)]), (1.6, []),
+]
+REPLAY_STATES = ['dancing', 'dancing', 'happy', 'happy', 'sleeping', 'surprised', 'sleeping', 'surprised']
+
+
+def load_example(name):
+    """Import an example program without running it"""
+    import logging
+    import importlib.util
+    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'examples', name + '.py')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    level = logging.getLogger().level
+    spec.loader.exec_module(module)
+    # the examples turn on debug logging
+    logging.getLogger().setLevel(level)
+    return module
+
+
+def record_session():
+    """Record REPLAY_SESSION on the simulator; returns the log bytes"""
+    from TP_lib import epdconfig, gt1151, touch, touchlog
+    sim = epdconfig.open('sim')
+    now = [0.0]
+    log = io.BytesIO()
+    recorder = touchlog.Recorder(sim, log, clock=lambda: now[0])
+    epdconfig.use_backend(recorder)
+    with touch.TouchService(gt1151.GT1151(), releases=True) as service:
+        for t, points in REPLAY_SESSION:
+            now[0] = t
+            gt_report(sim.registers, points)
+            sim.set_pin(epdconfig.INT, 0)
+            sim.set_pin(epdconfig.INT, 1)
+            service.get(timeout=1)
+    recorder.close()
+    epdconfig.use_backend(sim)
+    return log.getvalue()
+
+
+def replay_app(module, log, speed, time_scale=None):
+    """Run the snoopy app's touch -> render -> refresh path on a replayed
+    log. Returns the states, a digest of the frames and the latencies in ms.
+    """
+    import hashlib
+    from TP_lib import epdconfig, touchlog
+    replay = touchlog.Replay(io.BytesIO(log), speed=speed, time_scale=time_scale)
+    epdconfig.use_backend(replay)
+    app = module.SnoopyAnimationV2()
+    epd = app.epd
+    epd.init(epd.FULL_UPDATE)
+    app.gt.GT_Init()
+    image = Image.new('1', (app.width, app.height), 255)
+    draw = ImageDraw.Draw(image)
+    epd.displayPartBaseImage(epd.getbuffer(image))
+    epd.init(epd.PART_UPDATE)
+
+    states, latencies = [], []
+    digest = hashlib.sha1()
+    with app.touch:
+        for i in range(len(REPLAY_STATES)):
+            event = app.touch.get(timeout=2)
+            if event is None:
+                raise AssertionError("replay stopped after %d touches" % i)
+            app.handle_touch(event.x, event.y)
+            app.update_animation()
+            app.render(draw)
+            epd.displayPartial(epd.getbuffer(image)).result()
+            latencies.append((time.perf_counter() - event.time) * 1000)
+            states.append(app.current_state)
+            digest.update(image.tobytes())
+    if not replay.join(timeout=2):
+        raise AssertionError("replay did not finish")
+    epdconfig.use_backend('sim')
+    return states, digest.hexdigest(), latencies, replay
+
+
+def bench_replay():
+    from TP_lib import touchlog
+    log = record_session()
+    reports = touchlog.read_log(io.BytesIO(log))
+    times = [round(t, 6) for t, reg, data in reports]
+    if times != [t for t, points in REPLAY_SESSION]:
+        raise AssertionError("recorded times %r" % times)
+    sim_registers = bytearray(0x10000)
+    for (t, points), (rt, reg, data) in zip(REPLAY_SESSION, reports):
+        gt_report(sim_registers, points)
+        if data != bytes(sim_registers[reg:reg + len(data)]) or len(data) != 1 + 8 * max(len(points), 1):
+            raise AssertionError("recorded report at %.2f s is %r" % (t, data))
+    print("Replay    %d reports recorded in %d bytes" % (len(reports), len(log)))
+
+    module = load_example('snoopy_touch_animation_v2')
+    first = None
+    for label, speed in (('lockstep', None), ('lockstep', None), ('x10', 10.0)):
+        start = time.perf_counter()
+        states, digest, latencies, replay = replay_app(module, log, speed)
+        elapsed = time.perf_counter() - start
+        if states != REPLAY_STATES:
+            raise AssertionError("%s replay ended in states %r" % (label, states))
+        if first is None:
+            first = digest
+        elif digest != first:
+            raise AssertionError("%s replay drew different frames" % label)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        print("Replay    snoopy v2 %-8s  %d touches in %6.1f ms, touch to refresh p50 %.1f ms, max %.1f ms, late %.1f ms"
+              % (label, len(states), elapsed * 1000, p50, latencies[-1], replay.lateness * 1000))
+        if speed and p50 > REPLAY_BUDGET_MS:
+            raise AssertionError("touch to refresh took %.1f ms (budget %d ms)" % (p50, REPLAY_BUDGET_MS))
+
+
+# Share of the touch to pixel time the trace probes may cost, in percent
+TRACE_OVERHEAD_BUDGET = 1.0
+
+
+def probe_cost(count=100000):
+    """Seconds per span probe and per traced call, tracing as it is set now"""
+    from TP_lib import trace
+    call = trace.traced(trace.GETBUFFER)(lambda: None)
+    start = time.perf_counter()
+    for i in range(count):
+        with trace.span(trace.RENDER):
+            pass
+    spans = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(count):
+        call()
+    calls = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(count):
+        pass
+    empty = time.perf_counter() - start
+    return (spans - empty) / count, (calls - empty) / count
+
+
+def bench_trace():
+    import json
+    from TP_lib import trace
+    log = record_session()
+    module = load_example('snoopy_touch_animation_v2')
+
+    # Touch to pixel through the snoopy app with 1% of the panel times
+    trace.reset()
+    trace.enable()
+    try:
+        states, digest, latencies, replay = replay_app(module, log, 10.0, time_scale=0.01)
+    finally:
+        trace.disable()
+    table = trace.stats()
+    touches = len(REPLAY_STATES)
+    for stage in trace.STAGES:
+        if stage not in table:
+            raise AssertionError("no %s spans traced" % stage)
+    if table[trace.DISPATCH]['count'] != touches or table[trace.TOUCH_TO_PIXEL]['count'] != touches:
+        raise AssertionError("traced %d dispatches and %d touches on the panel for %d touches"
+                             % (table[trace.DISPATCH]['count'], table[trace.TOUCH_TO_PIXEL]['count'], touches))
+    app_p50 = trace.percentile(sorted(latencies), 50)
+    if abs(table[trace.TOUCH_TO_PIXEL]['p50'] - app_p50) > 1.0:
+        raise AssertionError("touch to pixel p50 %.1f ms, the app saw %.1f ms"
+                             % (table[trace.TOUCH_TO_PIXEL]['p50'], app_p50))
+    for line in trace.report().splitlines():
+        print("Trace     " + line)
+
+    chrome = json.loads(json.dumps(trace.chrome_trace()))
+    spans = [e for e in chrome['traceEvents'] if e['ph'] == 'X']
+    if len(spans) != len(trace.spans) or any(e['dur'] < 0 or e['ts'] < 0 for e in spans):
+        raise AssertionError("Chrome trace has %d spans for %d traced" % (len(spans), len(trace.spans)))
+    print("Trace     Chrome trace: %d events, %d threads"
+          % (len(chrome['traceEvents']), len(chrome['traceEvents']) - len(spans)))
+
+    # Probe cost against the touch to pixel time, off and on
+    per_touch = len(trace.spans) / touches
+    pixel = table[trace.TOUCH_TO_PIXEL]['p50'] / 1000.0
+    trace.reset()
+    off = probe_cost()
+    trace.enable()
+    on = probe_cost()
+    trace.disable()
+    trace.reset()
+    for label, (span_cost, call_cost) in (('off', off), ('on', on)):
+        share = per_touch * max(span_cost, call_cost) / pixel * 100
+        print("Trace     tracing %-3s  span %.2f us, traced call %.2f us; %.0f probes per touch = %.3f%% of touch to pixel"
+              % (label, span_cost * 1e6, call_cost * 1e6, per_touch, share))
+        if share > TRACE_OVERHEAD_BUDGET:
+            raise AssertionError("trace probes cost %.2f%% of touch to pixel with tracing %s" % (share, label))
+
+
+SCENE_TICKS = 60
+
+
+def scene_fonts():
+    from PIL import ImageFont
+    try:
+        path = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+        return [ImageFont.truetype(path, size) for size in (40, 24, 20, 16)]
+    except IOError:
+        return [ImageFont.load_default()] * 4
+
+
+def monitor_texts(tick):
+    """The lines of a status screen at tick seconds: the clock changes every
+    tick, the load every ten
+    """
+    return {'time': 'TIME: 12:%02d:%02d' % (34 + tick // 60, tick % 60),
+            'price': 'Bitcoin: $%d' % (43000 + tick // 30),
+            'cpu': 'CPU: %d%%' % (10 + tick // 10 % 7),
+            'updated': 'Updated: 12:34:00'}
+
+
+def monitor_scene(fonts):
+    from TP_lib import scene
+    font40, font24, font20, font16 = fonts
+    screen = scene.Scene((250, 122))
+    screen.add(scene.Rect(bbox=(0, 0, 249, 24), fill=0))
+    screen.add(scene.Text(xy=(6, 2), text='REAL-TIME MONITOR', font=font16, fill=255))
+    lines = {}
+    for name, xy, font in (('time', (6, 28), font24), ('price', (6, 58), font20),
+                           ('cpu', (6, 82), font16), ('updated', (6, 102), font16)):
+        lines[name] = screen.add(scene.Text(xy=xy, text='', font=font))
+    return screen, lines
+
+
+def bench_scene():
+    from TP_lib import scene
+    fonts = scene_fonts()
+    screen, lines = monitor_scene(fonts)
+
+    def full(tick):
+        # what the apps did before: draw every widget on a new image
+        image = Image.new('1', screen.size, 255)
+        draw = ImageDraw.Draw(image)
+        for name, text in monitor_texts(tick).items():
+            lines[name].set(text=text)
+        for widget in screen.widgets:
+            widget.paint(image, draw, 0, 0)
+        return image
+
+    incremental = full_time = 0.0
+    redrawn = area = 0
+    for tick in range(SCENE_TICKS):
+        start = time.perf_counter()
+        for name, text in monitor_texts(tick).items():
+            lines[name].set(text=text)
+        before = screen.redrawn
+        boxes = screen.render()
+        if tick:
+            incremental += time.perf_counter() - start
+            redrawn += screen.redrawn - before
+            area += sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in boxes)
+        start = time.perf_counter()
+        reference = full(tick)
+        full_time += time.perf_counter() - start
+        if screen.image.tobytes() != reference.tobytes():
+            raise AssertionError("scene differs from a full redraw at tick %d" % tick)
+        if screen.render():
+            raise AssertionError("an unchanged scene rendered something at tick %d" % tick)
+
+    ticks = SCENE_TICKS - 1
+    share = area / float(ticks * screen.size[0] * screen.size[1]) * 100
+    print("Scene     %d ticks: full redraw %.3f ms, retained %.3f ms per tick; %.1f of %d widgets redrawn, %.1f%% of the screen"
+          % (ticks, full_time / SCENE_TICKS * 1000, incremental / ticks * 1000,
+             redrawn / float(ticks), len(screen.widgets), share))
+    if redrawn >= ticks * len(screen.widgets):
+        raise AssertionError("the retained scene redrew every widget")
+
+
+def bench_panels():
+    from TP_lib import epdconfig
+    sim = epdconfig.open()
+
+    for epd in panels():
+        frames = panel_frames(epd, 10)
+        partial = getattr(epd, 'displayPartial', None) or epd.display_Partial
+        steps = (('base', lambda: base_image(epd, frames[0])),
+                 ('clear', lambda: epd.Clear(0xFF)),
+                 ('display', lambda: epd.display(frames[0])),
+                 ('partial', lambda: [partial(frame).result() for frame in frames[1:]]),
+                 ('region', lambda: [epd.display_region(frame).result() for frame in frames]))
+        results = []
+        for label, step in steps:
+            sim.reset_stats()
+            start = time.perf_counter()
+            step()
+            elapsed = (time.perf_counter() - start) * 1000
+            results.append("%s %d/%d %.2f ms" % (label, sim.spi_calls, sim.spi_bytes, elapsed))
+        if shown(epd, sim) != bytes(frames[-1]):
+            raise AssertionError("%s left the wrong frame on the panel" % epd.panel.name)
+        print("Panel     %-10s  transfers/bytes: %s" % (epd.panel.name, ', '.join(results)))
+
+
+def bench_modes():
+    from TP_lib import epdconfig, sequence
+    sim = epdconfig.open()
+
+    def switches(epd):
+        frame = panel_frames(epd, 1)[0]
+        if not hasattr(epd, 'FULL_UPDATE'):
+            return (('init', epd.init), ('init_Fast', epd.init_Fast), ('Init_4Gray', epd.Init_4Gray),
+                    ('init', epd.init), ('display_Partial', lambda: epd.display_Partial(frame).result()),
+                    ('display_Partial', lambda: epd.display_Partial(frame).result()))
+        partial = lambda: epd.displayPartial(frame).result()
+        return (('init FULL', lambda: epd.init(epd.FULL_UPDATE)), ('init PART', lambda: epd.init(epd.PART_UPDATE)),
+                ('displayPartial', partial), ('displayPartial', partial))
+
+    sequence.timings.clear()
+    for epd in panels():
+        counts = []
+        for label, switch in switches(epd):
+            sim.reset_stats()
+            switch()
+            counts.append("%s %d" % (label, sim.spi_calls))
+        print("Modes     %-10s  SPI transfers: %s" % (epd.panel.name, ', '.join(counts)))
+    for name, stats in sorted(sequence.summary().items()):
+        print("Sequence  %-28s  x%-3d mean %6.3f ms  max %6.3f ms"
+              % (name, stats['count'], stats['mean_ms'], stats['max_ms']))
+
+
+BENCHMARKS = {
+    'getbuffer': bench_getbuffer,
+    'gray4': bench_gray4,
+    'clear': bench_clear,
+    'region': bench_region,
+    'panels': bench_panels,
+    'modes': bench_modes,
+    'transaction': bench_transaction,
+    'gpio': bench_gpio,
+    'spi': bench_spi,
+    'startup': bench_startup,
+    'sleep': bench_sleep,
+    'power': bench_power,
+    'touch': bench_touch,
+    'i2c': bench_i2c,
+    'decode': bench_decode,
+    'gesture': bench_gesture,
+    'regions': bench_regions,
+    'replay': bench_replay,
+    'trace': bench_trace,
+    'scene': bench_scene,
+}
+
+
+def main(argv):
+    names = argv or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print("Unknown benchmark: %s (choose from %s)" % (name, ', '.join(BENCHMARKS)))
+            return 1
+        BENCHMARKS[name]()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -9,28 +9,19 @@ if os.path.exists(libdir):
     sys.path.append(libdir)
     
 from TP_lib import icnt86
+from TP_lib import touch
 from TP_lib import epd2in9_V2
 from TP_lib import weather_2in9_V2
+from TP_lib import regions
+from TP_lib import frames
 
 import time 
 import logging
 from PIL import Image, ImageDraw, ImageFont
 import traceback
-import threading
 
 logging.basicConfig(level=logging.DEBUG)
-flag_t = 1
 
-def pthread_irq() :
-    print("pthread irq running")
-    while flag_t == 1 :
-        if(tp.digital_read(tp.INT) == 0) :
-            ICNT_Dev.Touch = 1
-        else :
-            ICNT_Dev.Touch = 0
-        time.sleep(0.01)
-    print("thread irq: exit")
-    
 def Show_Photo_Small(image, small):
     for t in range(1, 7):
         if(small*3+t > 9):
@@ -66,13 +57,14 @@ try:
     logging.info("epd2in9_V2 Touch Demo")
     
     epd = epd2in9_V2.EPD_2IN9_V2()
+    # weather error screens go through this driver, not a second one
+    weather_2in9_V2.epd = epd
 
     
 
     tp = icnt86.INCT86()
     
     ICNT_Dev = icnt86.ICNT_Development()
-    ICNT_Old = icnt86.ICNT_Development()
     
     '''
         Because the touch display requires a relatively fast refresh speed, the default 
@@ -89,9 +81,9 @@ try:
     tp.ICNT_Init()
     epd.Clear(0xFF)
 
-    t1 = threading.Thread(target = pthread_irq)
-    t1.setDaemon(True)
-    t1.start()
+    # Touch reports are read when INT goes low, not by polling it
+    touch_service = touch.TouchService(tp)
+    touch_service.start()
     
     # Drawing on the image
     font15 = ImageFont.truetype(os.path.join(fontdir, 'Font.ttc'), 15)
@@ -102,9 +94,12 @@ try:
     
     Draw_Time(DrawImage, 209, 40, font24, font15)
     
-    epd.display_Base(epd.getbuffer(image))
+    # Partial refreshes, and a base refresh once 50 of them have left
+    # their ghosting behind
+    scheduler = frames.RefreshScheduler(epd, max_partials=50)
+    scheduler.show(epd.getbuffer(image))
     
-    i = j = k = ReFlag = SelfFlag = Page = Photo_L = Photo_S = 0
+    i = k = ReFlag = SelfFlag = Page = Photo_L = Photo_S = 0
     PhotoPath_S = [ "Photo_1_0.bmp",
                     "Photo_1_1.bmp", "Photo_1_2.bmp", "Photo_1_3.bmp", "Photo_1_4.bmp",
                     "Photo_1_5.bmp", "Photo_1_6.bmp", "Photo_1_7.bmp", "Photo_1_8.bmp",
@@ -116,9 +111,35 @@ try:
                     "Photo_2_9.bmp",
                     ]
     PagePath = ["Menu.bmp", "screen_output.png", "Photo_1.bmp", "Photo_2.bmp"]
+    # Buttons of each page in the landscape touch coordinates,
+    # (x0, y0, x1, y1) with x0 <= X < x1 and y0 <= Y < y1
+    PageRegions = [
+        regions.RegionMap(epd.height, epd.width, [      #main menu
+            ('photo', (120, 32, 152, 96)),
+            ('weather', (40, 32, 80, 96)),
+        ]),
+        regions.RegionMap(epd.height, epd.width, [      #weather
+            ('home', (137, 102, 159, 124)),
+            ('refresh', (6, 102, 27, 124)),
+        ]),
+        regions.RegionMap(epd.height, epd.width, [      #photo menu
+            ('home', (136, 102, 160, 124)),
+            ('next', (204, 102, 224, 124)),
+            ('last', (72, 102, 92, 124)),
+            ('refresh', (6, 102, 27, 124)),
+            ('select', (3, 3, 293, 96)),
+        ]),
+        regions.RegionMap(epd.height, epd.width, [      #view the photo
+            ('menu', (269, 102, 289, 124)),
+            ('next', (204, 102, 224, 124)),
+            ('home', (136, 102, 160, 124)),
+            ('last', (72, 102, 92, 124)),
+            ('refresh', (6, 102, 27, 124)),
+        ]),
+    ]
     
     while(1):
-        if(i > 20 or ReFlag == 1):
+        if(i > 20 or ReFlag == 1 or SelfFlag):
             if(Page == 0):
                 DrawImage.rectangle((209, 40, 290, 120), fill = 0)
                 Draw_Time(DrawImage, 209, 40, font24, font15)
@@ -128,141 +149,142 @@ try:
                 weather_2in9_V2.get_weather_png()
                 Read_BMP(PagePath[Page], 0, 0)
         
-            epd.display_Partial_Wait(epd.getbuffer(image))
-            print("*** Touch Refresh ***\r\n")
+            if(SelfFlag):
+                SelfFlag = 0
+                scheduler.show_base(epd.getbuffer(image))
+                print("--- Self Refresh ---\r\n")
+            else:
+                refreshed = scheduler.show(epd.getbuffer(image))
+                if(refreshed is not None):
+                    refreshed.result()
+                print("*** Touch Refresh ***\r\n")
             i = 0
             k = 0
-            j += 1
             ReFlag = 0
-        elif(k>50000 and i>0 and Page == 1):
-            epd.display_Partial_Wait(epd.getbuffer(image))
+        elif(k>50 and i>0 and Page == 1):
+            refreshed = scheduler.show(epd.getbuffer(image))
+            if(refreshed is not None):
+                refreshed.result()
             i = 0
             k = 0
-            j += 1
             print("*** Overtime Refresh ***\r\n")
-        elif(j > 50 or SelfFlag):
-            SelfFlag = 0
-            j = 0
-            epd.init()
-            epd.display_Base(epd.getbuffer(image))
-            print("--- Self Refresh ---\r\n")
         else:
             k += 1
 
-        if(Page==0 and k>5000000):
+        if(Page==0 and k>6000):     # a minute without touches: update the clock
             ReFlag = 1
 
-        tp.ICNT_Scan(ICNT_Dev, ICNT_Old)
-        if(ICNT_Old.X[0] == ICNT_Dev.X[0] and ICNT_Old.Y[0] == ICNT_Dev.Y[0]):
+        # Wait up to 10 ms for the next touch report; k counts the idle waits
+        event = touch_service.get(timeout=0.01)
+        if(event is None):
             continue
+        ICNT_Dev.X[0], ICNT_Dev.Y[0], ICNT_Dev.P[0] = event.x, event.y, event.s
         
-        if(ICNT_Dev.TouchCount):
-            ICNT_Dev.TouchCount = 0
-            i += 1
-            if(Page == 0  and ReFlag == 0):     #main menu
-                if(ICNT_Dev.X[0] > 119 and ICNT_Dev.X[0] < 152 and ICNT_Dev.Y[0] > 31 and ICNT_Dev.Y[0] < 96):
-                    print("Photo ...\r\n")
-                    Page = 2
-                    Read_BMP(PagePath[Page], 0, 0)
-                    Show_Photo_Small(image, Photo_S)
-                    ReFlag = 1
-                elif(ICNT_Dev.X[0] > 39 and ICNT_Dev.X[0] < 80 and ICNT_Dev.Y[0] > 31 and ICNT_Dev.Y[0] < 96): 
-                    print("Weather ...\r\n")
-                    Page = 1
-                    Read_BMP(PagePath[Page], 0, 0)
-                    ReFlag = 1
-                
+        i += 1
+        hit = PageRegions[Page].name_at(ICNT_Dev.X[0], ICNT_Dev.Y[0])
+        if(Page == 0  and ReFlag == 0):     #main menu
+            if(hit == 'photo'):
+                print("Photo ...\r\n")
+                Page = 2
+                Read_BMP(PagePath[Page], 0, 0)
+                Show_Photo_Small(image, Photo_S)
+                ReFlag = 1
+            elif(hit == 'weather'):
+                print("Weather ...\r\n")
+                Page = 1
+                Read_BMP(PagePath[Page], 0, 0)
+                ReFlag = 1
             
-            if(Page == 1 and ReFlag == 0):   #weather
-                if(ICNT_Dev.X[0] > 136 and ICNT_Dev.X[0] < 159 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Home ...\r\n")
-                    Page = 0
-                    Read_BMP(PagePath[Page], 0, 0)
-                    ReFlag = 1
-                elif(ICNT_Dev.X[0] > 5 and ICNT_Dev.X[0] < 27 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Refresh ...\r\n")
-                    SelfFlag = 1
-                    ReFlag = 1
-                
+        
+        if(Page == 1 and ReFlag == 0):   #weather
+            if(hit == 'home'):
+                print("Home ...\r\n")
+                Page = 0
+                Read_BMP(PagePath[Page], 0, 0)
+                ReFlag = 1
+            elif(hit == 'refresh'):
+                print("Refresh ...\r\n")
+                SelfFlag = 1
+                ReFlag = 1
             
-            if(Page == 2  and ReFlag == 0):  #photo menu
-                if(ICNT_Dev.X[0] > 135 and ICNT_Dev.X[0] < 160 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Home ...\r\n")
-                    Page = 0
-                    Read_BMP(PagePath[Page], 0, 0)
-                    ReFlag = 1
-                elif(ICNT_Dev.X[0] > 203 and ICNT_Dev.X[0] < 224 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Next page ...\r\n")
-                    Photo_S += 1
-                    if(Photo_S > 2): # 9 photos is a maximum of three pages
-                        Photo_S=0
+        
+        if(Page == 2  and ReFlag == 0):  #photo menu
+            if(hit == 'home'):
+                print("Home ...\r\n")
+                Page = 0
+                Read_BMP(PagePath[Page], 0, 0)
+                ReFlag = 1
+            elif(hit == 'next'):
+                print("Next page ...\r\n")
+                Photo_S += 1
+                if(Photo_S > 2): # 9 photos is a maximum of three pages
+                    Photo_S=0
+                ReFlag = 2
+            elif(hit == 'last'):
+                print("Last page ...\r\n")
+                if(Photo_S == 0):
+                    print("Top page ...\r\n")
+                else:
+                    Photo_S -= 1
                     ReFlag = 2
-                elif(ICNT_Dev.X[0] > 71 and ICNT_Dev.X[0] < 92 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Last page ...\r\n")
-                    if(Photo_S == 0):
-                        print("Top page ...\r\n")
-                    else:
-                        Photo_S -= 1
-                        ReFlag = 2
-                elif(ICNT_Dev.X[0] > 5 and ICNT_Dev.X[0] < 27 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Refresh ...\r\n")
-                    SelfFlag = 1
-                    ReFlag = 1
-                elif(ICNT_Dev.X[0] > 2 and ICNT_Dev.X[0] < 293 and ICNT_Dev.Y[0] > 2 and ICNT_Dev.Y[0] < 96 and ReFlag == 0):
-                    print("Select photo ...\r\n")
-                    Page = 3
-                    Read_BMP(PagePath[Page], 0, 0)
-                    Photo_L = ICNT_Dev.X[0]//96 + ICNT_Dev.Y[0]//48*3 + Photo_S*3 + 1
-                    Show_Photo_Large(image, Photo_L)
-                    ReFlag = 1
-                if(ReFlag == 2):  # Refresh small photo
-                    ReFlag = 1
-                    Read_BMP(PagePath[Page], 0, 0)
-                    Show_Photo_Small(image, Photo_S)   # show small photo
-                
+            elif(hit == 'refresh'):
+                print("Refresh ...\r\n")
+                SelfFlag = 1
+                ReFlag = 1
+            elif(hit == 'select'):
+                print("Select photo ...\r\n")
+                Page = 3
+                Read_BMP(PagePath[Page], 0, 0)
+                Photo_L = ICNT_Dev.X[0]//96 + ICNT_Dev.Y[0]//48*3 + Photo_S*3 + 1
+                Show_Photo_Large(image, Photo_L)
+                ReFlag = 1
+            if(ReFlag == 2):  # Refresh small photo
+                ReFlag = 1
+                Read_BMP(PagePath[Page], 0, 0)
+                Show_Photo_Small(image, Photo_S)   # show small photo
             
-            if(Page == 3  and ReFlag == 0):     #view the photo
-                if(ICNT_Dev.X[0] > 268 and ICNT_Dev.X[0] < 289 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Photo menu ...\r\n")
-                    Page = 2
-                    Read_BMP(PagePath[Page], 0, 0)
-                    Show_Photo_Small(image, Photo_S)
-                    ReFlag = 1
-                elif(ICNT_Dev.X[0] > 203 and ICNT_Dev.X[0] < 224 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Next photo ...\r\n")
-                    Photo_L += 1
-                    if(Photo_L > 9):
-                        Photo_L = 1
+        
+        if(Page == 3  and ReFlag == 0):     #view the photo
+            if(hit == 'menu'):
+                print("Photo menu ...\r\n")
+                Page = 2
+                Read_BMP(PagePath[Page], 0, 0)
+                Show_Photo_Small(image, Photo_S)
+                ReFlag = 1
+            elif(hit == 'next'):
+                print("Next photo ...\r\n")
+                Photo_L += 1
+                if(Photo_L > 9):
+                    Photo_L = 1
+                ReFlag = 2
+            elif(hit == 'home'):
+                print("Home ...\r\n")
+                Page = 0
+                Read_BMP(PagePath[Page], 0, 0)
+                ReFlag = 1
+            elif(hit == 'last'):
+                print("Last page ...\r\n")
+                if(Photo_L == 1):
+                    print("Top photo ...\r\n")
+                else:
+                    Photo_L -= 1
                     ReFlag = 2
-                elif(ICNT_Dev.X[0] > 135 and ICNT_Dev.X[0] < 160 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Home ...\r\n")
-                    Page = 0
-                    Read_BMP(PagePath[Page], 0, 0)
-                    ReFlag = 1
-                elif(ICNT_Dev.X[0] > 71 and ICNT_Dev.X[0] < 92 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Last page ...\r\n")
-                    if(Photo_L == 1):
-                        print("Top photo ...\r\n")
-                    else:
-                        Photo_L -= 1
-                        ReFlag = 2
-                elif(ICNT_Dev.X[0] > 5 and ICNT_Dev.X[0] < 27 and ICNT_Dev.Y[0] > 101 and ICNT_Dev.Y[0] < 124): 
-                    print("Refresh photo ...\r\n")
-                    SelfFlag = 1
-                    ReFlag = 1
-                if(ReFlag == 2):    # Refresh large photo
-                    ReFlag = 1
-                    Show_Photo_Large(image, Photo_L)
-                
-                
+            elif(hit == 'refresh'):
+                print("Refresh photo ...\r\n")
+                SelfFlag = 1
+                ReFlag = 1
+            if(ReFlag == 2):    # Refresh large photo
+                ReFlag = 1
+                Show_Photo_Large(image, Photo_L)
+            
+            
 except IOError as e:
     logging.info(e)
     
 except KeyboardInterrupt:    
     logging.info("ctrl + c:")
-    flag_t = 0
+    touch_service.stop()
     epd.sleep()
     time.sleep(2)
-    t1.join()
     epd.Dev_exit()
     exit()
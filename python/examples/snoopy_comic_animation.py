@@ -14,7 +14,6 @@ import sys
 import os
 import time
 import logging
-import threading
 import math
 from PIL import Image, ImageDraw, ImageFont
 import traceback
@@ -28,7 +27,10 @@ if os.path.exists(libdir):
     sys.path.append(libdir)
 
 from TP_lib import gt1151
+from TP_lib import touch
+from TP_lib import regions
 from TP_lib import epd2in13_V4
+from TP_lib import frames
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -36,13 +38,19 @@ class SnoopyComicAnimation:
     def __init__(self):
         self.epd = epd2in13_V4.EPD()
         self.gt = gt1151.GT1151()
-        self.GT_Dev = gt1151.GT_Development()
-        self.GT_Old = gt1151.GT_Development()
+        self.touch = touch.TouchService(self.gt)
         
         # Display dimensions for 2.13" V4
         self.width = 122
         self.height = 250
         
+        # Touch areas (simplified for 2.13" display)
+        self.touch_areas = regions.RegionMap(self.width, self.height, [
+            ('top', (0, 0, self.width, self.height//3)),
+            ('middle', (0, self.height//3, self.width, 2*self.height//3)),
+            ('bottom', (0, 2*self.height//3, self.width, self.height)),
+        ])
+        
         # Animation state
         self.current_state = 'idle'
         self.frame_index = 0
@@ -55,10 +63,6 @@ class SnoopyComicAnimation:
         self.dance_offset = 0
         self.sleep_bubble_size = 0
         
-        # Threading
-        self.flag_t = 1
-        self.touch_thread = None
-        
     def init_display(self):
         """Initialize the e-paper display and touch controller"""
         logging.info("Initializing Snoopy Comic Animation")
@@ -68,31 +72,14 @@ class SnoopyComicAnimation:
         self.gt.GT_Init()
         self.epd.Clear(0xFF)  # Clear with white background
         
-        # Start touch detection thread
-        self.touch_thread = threading.Thread(target=self.touch_irq_handler)
-        self.touch_thread.setDaemon(True)
-        self.touch_thread.start()
+        # Read touch reports on INT edges
+        self.touch.start()
         
         logging.info("Display initialized successfully")
         
-    def touch_irq_handler(self):
-        """Handle touch interrupt in separate thread"""
-        logging.info("Touch detection thread started")
-        while self.flag_t == 1:
-            if self.gt.digital_read(self.gt.INT) == 0:
-                self.GT_Dev.Touch = 1
-            else:
-                self.GT_Dev.Touch = 0
-        logging.info("Touch detection thread stopped")
-        
     def get_touch_area(self, x, y):
         """Determine which area was touched"""
-        if y < self.height // 3:
-            return 'top'
-        elif y < 2 * self.height // 3:
-            return 'middle'
-        else:
-            return 'bottom'
+        return self.touch_areas.name_at(x, y)
             
     def handle_touch(self, x, y):
         """Handle touch input and change animation state"""
@@ -353,9 +340,10 @@ class SnoopyComicAnimation:
             image = Image.new('1', (self.width, self.height), 255)
             draw = ImageDraw.Draw(image)
             
-            # Initial display
-            self.epd.displayPartBaseImage(self.epd.getbuffer(image))
-            self.epd.init(self.epd.PART_UPDATE)
+            # Initial display; the scheduler also puts a fresh base image
+            # back whenever partial refreshes have left too much ghosting
+            scheduler = frames.RefreshScheduler(self.epd)
+            scheduler.show(self.epd.getbuffer(image))
             
             refresh_counter = 0
             
@@ -374,29 +362,19 @@ class SnoopyComicAnimation:
                 # Draw UI elements
                 self.draw_ui_elements(draw)
                 
-                # Check for touch input
-                self.gt.GT_Scan(self.GT_Dev, self.GT_Old)
-                
-                # Detect new touch
-                if (self.GT_Old.X[0] != self.GT_Dev.X[0] or 
-                    self.GT_Old.Y[0] != self.GT_Dev.Y[0] or 
-                    self.GT_Old.S[0] != self.GT_Dev.S[0]):
+                # Handle the touches reported since the last frame
+                for event in self.touch.events():
+                    touch_x, touch_y = event.x, event.y
                     
-                    if self.GT_Dev.TouchpointFlag:
-                        # Handle touch
-                        touch_x = self.GT_Dev.X[0]
-                        touch_y = self.GT_Dev.Y[0]
-                        
-                        # Only process if touch is within display bounds
-                        if 0 <= touch_x < self.width and 0 <= touch_y < self.height:
-                            self.handle_touch(touch_x, touch_y)
-                            
-                        self.GT_Dev.TouchpointFlag = 0
+                    # Only process if touch is within display bounds
+                    if 0 <= touch_x < self.width and 0 <= touch_y < self.height:
+                        self.handle_touch(touch_x, touch_y)
                 
-                # Update display periodically
+                # Update display periodically, skipping frames while the
+                # previous partial refresh is still running on the panel
                 refresh_counter += 1
-                if refresh_counter >= 12:  # Refresh every 12 loops
-                    self.epd.displayPartial(self.epd.getbuffer(image))
+                if refresh_counter >= 12 and not self.epd.refresh.busy():  # Refresh every 12 loops
+                    scheduler.show(self.epd.getbuffer(image))
                     refresh_counter = 0
                     
                 # Small delay to prevent excessive CPU usage
@@ -415,10 +393,7 @@ class SnoopyComicAnimation:
     def cleanup(self):
         """Clean up resources"""
         logging.info("Cleaning up...")
-        self.flag_t = 0
-        
-        if self.touch_thread and self.touch_thread.is_alive():
-            self.touch_thread.join(timeout=1)
+        self.touch.stop()
             
         try:
             self.epd.sleep()
@@ -15,7 +15,6 @@ import sys
 import os
 import time
 import logging
-import threading
 import requests
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 import traceback
@@ -30,6 +29,7 @@ if os.path.exists(libdir):
     sys.path.append(libdir)
 
 from TP_lib import gt1151
+from TP_lib import touch
 from TP_lib import epd2in13_V4
 
 logging.basicConfig(level=logging.DEBUG)
@@ -70,8 +70,7 @@ class SnoopyWebImages:
     def __init__(self):
         self.epd = epd2in13_V4.EPD()
         self.gt = gt1151.GT1151()
-        self.GT_Dev = gt1151.GT_Development()
-        self.GT_Old = gt1151.GT_Development()
+        self.touch = touch.TouchService(self.gt)
         
         # Display dimensions for 2.13" V4
         self.width = 122
@@ -82,10 +81,6 @@ class SnoopyWebImages:
         self.images = []
         self.image_cache = {}
         
-        # Threading
-        self.flag_t = 1
-        self.touch_thread = None
-        
     def init_display(self):
         """Initialize the e-paper display and touch controller"""
         logging.info("Initializing Snoopy Web Images Display")
@@ -95,23 +90,11 @@ class SnoopyWebImages:
         self.gt.GT_Init()
         self.epd.Clear(0xFF)  # Clear with white background
         
-        # Start touch detection thread
-        self.touch_thread = threading.Thread(target=self.touch_irq_handler)
-        self.touch_thread.setDaemon(True)
-        self.touch_thread.start()
+        # Read touch reports on INT edges
+        self.touch.start()
         
         logging.info("Display initialized successfully")
         
-    def touch_irq_handler(self):
-        """Handle touch interrupt in separate thread"""
-        logging.info("Touch detection thread started")
-        while self.flag_t == 1:
-            if self.gt.digital_read(self.gt.INT) == 0:
-                self.GT_Dev.Touch = 1
-            else:
-                self.GT_Dev.Touch = 0
-        logging.info("Touch detection thread stopped")
-        
     def download_image(self, url, timeout=10):
         """Download image from URL"""
         try:
@@ -311,24 +294,13 @@ class SnoopyWebImages:
             
             # Main loop for touch detection
             while True:
-                # Check for touch input
-                self.gt.GT_Scan(self.GT_Dev, self.GT_Old)
-                
-                # Detect new touch
-                if (self.GT_Old.X[0] != self.GT_Dev.X[0] or 
-                    self.GT_Old.Y[0] != self.GT_Dev.Y[0] or 
-                    self.GT_Old.S[0] != self.GT_Dev.S[0]):
+                # Handle the touches reported since the last frame
+                for event in self.touch.events():
+                    touch_x, touch_y = event.x, event.y
                     
-                    if self.GT_Dev.TouchpointFlag:
-                        # Handle touch
-                        touch_x = self.GT_Dev.X[0]
-                        touch_y = self.GT_Dev.Y[0]
-                        
-                        # Only process if touch is within display bounds
-                        if 0 <= touch_x < self.width and 0 <= touch_y < self.height:
-                            self.handle_touch(touch_x, touch_y)
-                            
-                        self.GT_Dev.TouchpointFlag = 0
+                    # Only process if touch is within display bounds
+                    if 0 <= touch_x < self.width and 0 <= touch_y < self.height:
+                        self.handle_touch(touch_x, touch_y)
                 
                 # Small delay to prevent excessive CPU usage
                 time.sleep(0.1)
@@ -346,10 +318,7 @@ class SnoopyWebImages:
     def cleanup(self):
         """Clean up resources"""
         logging.info("Cleaning up...")
-        self.flag_t = 0
-        
-        if self.touch_thread and self.touch_thread.is_alive():
-            self.touch_thread.join(timeout=1)
+        self.touch.stop()
             
         try:
             self.epd.sleep()
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+def dirty_rects(old, new, linewidth, bbox=None, merge_gap=8):
+    """Byte-aligned rectangles where the packed frame new differs from old.
+
+    old, new  : packed 1 bpp frames, linewidth bytes per RAM line
+    bbox      : optional (x0, y0, x1, y1) in RAM pixels, inclusive, that
+                limits the comparison to where the caller knows changes are
+    merge_gap : changed lines separated by at most this many unchanged lines
+                share one rectangle; a RAM window costs a few command bytes,
+                so tiny gaps are cheaper to resend than to split
+
+    Returns a list of (x0, y0, x1, y1) with x in bytes and y in lines, both
+    inclusive. A missing old frame marks the whole frame (or bbox) dirty.
+    """
+    new = np.frombuffer(bytes(new), dtype=np.uint8).reshape(-1, linewidth)
+    height = new.shape[0]
+    if bbox is None:
+        x0, y0, x1, y1 = 0, 0, linewidth - 1, height - 1
+    else:
+        x0, y0 = max(bbox[0] >> 3, 0), max(bbox[1], 0)
+        x1, y1 = min(bbox[2] >> 3, linewidth - 1), min(bbox[3], height - 1)
+        if x0 > x1 or y0 > y1:
+            return []
+    if old is None:
+        return [(x0, y0, x1, y1)]
+
+    old = np.frombuffer(bytes(old), dtype=np.uint8).reshape(-1, linewidth)
+    diff = old[y0:y1 + 1, x0:x1 + 1] != new[y0:y1 + 1, x0:x1 + 1]
+    rows = np.flatnonzero(diff.any(axis=1))
+    if rows.size == 0:
+        return []
+
+    rects = []
+    for band in np.split(rows, np.flatnonzero(np.diff(rows) > merge_gap + 1) + 1):
+        cols = np.flatnonzero(diff[band[0]:band[-1] + 1].any(axis=0))
+        rects.append((x0 + int(cols[0]), y0 + int(band[0]), x0 + int(cols[-1]), y0 + int(band[-1])))
+    return rects
+
+
+def region_bytes(frame, linewidth, rect):
+    """The bytes of rect (from dirty_rects) in RAM write order"""
+    x0, y0, x1, y1 = rect
+    rows = np.frombuffer(bytes(frame), dtype=np.uint8).reshape(-1, linewidth)
+    return rows[y0:y1 + 1, x0:x1 + 1].tobytes()
+
+
+def apply_rects(old, new, linewidth, rects):
+    """old with the rects (from dirty_rects) copied over from new.
+
+    This is what the controller RAM holds after writing only those rects.
+    Returns None when old is unknown and the rects do not cover the frame.
+    """
+    height = len(new) // linewidth
+    if old is None:
+        if rects == [(0, 0, linewidth - 1, height - 1)]:
+            return bytes(new)
+        return None
+    frame = np.frombuffer(bytes(old), dtype=np.uint8).reshape(-1, linewidth).copy()
+    src = np.frombuffer(bytes(new), dtype=np.uint8).reshape(-1, linewidth)
+    for x0, y0, x1, y1 in rects:
+        frame[y0:y1 + 1, x0:x1 + 1] = src[y0:y1 + 1, x0:x1 + 1]
+    return frame.tobytes()
@@ -0,0 +1,141 @@
+import logging
+from . import epdconfig
+from . import epd2in9_V2
+from . import epd2in13_V2
+from . import epd2in13_V3
+from . import epd2in13_V4
+
+logger = logging.getLogger(__name__)
+
+# Driver classes by panel name
+PANELS = {
+    '2in9_V2': epd2in9_V2.EPD_2IN9_V2,
+    '2in13_V2': epd2in13_V2.EPD_2IN13_V2,
+    '2in13_V3': epd2in13_V3.EPD,
+    '2in13_V4': epd2in13_V4.EPD,
+}
+
+
+# Driver methods that draw with a partial refresh; the other display*
+# methods and Clear need a full init
+PARTIAL_DRAWS = ('display_region', 'displayPartial', 'displayPartial_Wait',
+                 'display_Partial', 'display_Partial_Wait')
+
+
+class Display:
+    """One session with an e-Paper panel.
+
+        with Display('2in13_V4') as d:
+            d.display(d.getbuffer(image))
+            d.sleep()                       # returns at once
+            ...
+            d.displayPartial(buf)           # wakes the panel first
+
+    panel is a PANELS name, a driver class or a driver instance. open()
+    (or entering the with block) opens the hardware and initializes the
+    panel; close() puts it into deep sleep once the last refresh is done
+    and releases SPI, I2C and the GPIO lines.
+
+    Driver attributes are available on the session. init*() calls (init,
+    init_Fast, Init_4Gray, ...) are remembered, and the display* and Clear
+    methods wake a sleeping panel by re-running the last one. A partial
+    draw takes the shorter epd.wake_partial() path when the panel keeps
+    its RAM in deep sleep and the RAM content is known, so the partial
+    refresh still has its base image. sleep() and wake() are queued
+    behind the refresh in flight unless called with wait=True.
+    """
+
+    def __init__(self, panel, backend=None, sleep_on_close=True):
+        if isinstance(panel, str):
+            panel = PANELS[panel]
+        self.epd = panel() if isinstance(panel, type) else panel
+        self.backend = backend
+        self.sleep_on_close = sleep_on_close
+        if hasattr(self.epd, 'FULL_UPDATE'):
+            self._init = ('init', (self.epd.FULL_UPDATE,))
+        else:
+            self._init = ('init', ())
+        self.initialized = False    # an init*() ran since the session started
+        self.opened = False
+        self.sleeping = True        # not initialized yet, or sleep() called (possibly still queued)
+
+    def open(self):
+        epdconfig.open(self.backend)
+        self.opened = True
+        self._initialize(*self._init)
+        return self
+
+    def _initialize(self, name, args):
+        # epd.<name>(*args), remembered for wake()
+        self._init = (name, args)
+        self.initialized = True
+        result = getattr(self.epd, name)(*args)
+        self._woke('init')
+        return result
+
+    def init(self, *args):
+        """epd.init(*args), remembered for wake()"""
+        return self._initialize('init', args)
+
+    def _woke(self, how):
+        # the panel is initialized: how is 'init', 'full' or 'partial'
+        self.sleeping = False
+
+    def _draw(self, name, draw, args, kwargs):
+        self.wake(partial=name in PARTIAL_DRAWS)
+        return draw(*args, **kwargs)
+
+    def sleep(self, wait=False):
+        if self.sleeping:
+            return self.epd.refresh.completed()
+        self.sleeping = True
+        return self.epd.sleep(wait)
+
+    def wake(self, wait=True, partial=False):
+        """Re-initialize a sleeping panel. partial=True allows the
+        RAM-keeping path. Returns a Future.
+        """
+        if not (self.sleeping or self.epd.asleep):
+            return self.epd.refresh.completed()
+        if (partial and self.initialized and self.epd.retains_ram()
+                and self.epd.last_frame is not None):
+            how, step, args = 'partial', self.epd.wake_partial, ()
+        else:
+            name, args = self._init
+            how, step = 'full', getattr(self.epd, name)
+        self._woke(how)
+        logger.debug("panel awake (%s)" % how)
+        if not wait:
+            return self.epd.refresh.then(step, *args)
+        step(*args)
+        return self.epd.refresh.completed()
+
+    def close(self):
+        opened, self.opened = self.opened, False
+        try:
+            if self.sleep_on_close and not self.epd.asleep:
+                self.sleep(wait=True)
+            self.epd.refresh.wait()
+        finally:
+            if opened:
+                epdconfig.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __getattr__(self, name):
+        attr = getattr(self.epd, name)
+        if not callable(attr):
+            return attr
+        if name.lower().startswith('init'):
+            def init(*args):
+                return self._initialize(name, args)
+            return init
+        if name.startswith('display') or name == 'Clear':
+            def draw(*args, **kwargs):
+                return self._draw(name, attr, args, kwargs)
+            return draw
+        return attr
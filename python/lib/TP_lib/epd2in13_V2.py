@@ -30,21 +30,19 @@
 
 import logging
 from . import epdconfig
+from . import epdbase
+from . import sequence
+from . import trace
+from .sequence import BUSY
 import numpy as np
 
 # Display resolution
 EPD_WIDTH       = 122
 EPD_HEIGHT      = 250
 
-class EPD_2IN13_V2:
+class EPD_2IN13_V2(epdbase.EPDBase):
     def __init__(self):
-        self.reset_pin = epdconfig.EPD_RST_PIN
-        self.dc_pin = epdconfig.EPD_DC_PIN
-        self.busy_pin = epdconfig.EPD_BUSY_PIN
-        self.cs_pin = epdconfig.EPD_CS_PIN
-        self.width = EPD_WIDTH
-        self.height = EPD_HEIGHT
-        epdconfig.address = 0x14
+        epdbase.EPDBase.__init__(self)
         
     FULL_UPDATE = 0
     PART_UPDATE = 1
@@ -83,152 +81,75 @@ class EPD_2IN13_V2:
 
         0x15,0x41,0xA8,0x32,0x30,0x0A,
     ]
-        
-    # Hardware reset
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(5)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(200)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)    
 
-    def TurnOnDisplay(self):
-        self.send_command(0x22)
-        self.send_data(0xC7)
-        self.send_command(0x20)        
-        self.ReadBusy()
+    # RAM lines are written bottom to top (data entry mode 0x01)
+    PANEL = epdbase.Panel('2in13_V2', EPD_WIDTH, EPD_HEIGHT, address=0x14, entry_mode=0x01,
+        reset_ms=(200, 5, 200), sleep_mode=0x03,
+        update={'full': 0xC7, 'partial': 0x0c},
+        luts={'full': lut_full_update, 'partial': lut_partial_update},
+        sequences={
+            'init_full': sequence.Sequence('epd2in13_V2.init_full', [
+                (BUSY, b''),
+                (0x12, b''),                    # soft reset
+                (BUSY, b''),
+                (0x74, [0x54]),                 # set analog block control
+                (0x7E, [0x3B]),                 # set digital block control
+                (0x01, [0xF9, 0x00, 0x00]),     # Driver output control
+                (0x11, [0x01]),                 # data entry mode
+                (0x44, [0x00, 0x0F]),           # set Ram-X address start/end position, 0x0C-->(15+1)*8=128
+                (0x45, [0xF9, 0x00, 0x00, 0x00]),   # set Ram-Y address start/end position, 0xF9-->(249+1)=250
+                (0x3C, [0x03]),                 # BorderWavefrom
+                (0x2C, [0x55]),                 # VCOM Voltage
+                (0x03, lut_full_update[70:71]),
+                (0x04, lut_full_update[71:74]),
+                (0x3A, lut_full_update[74:75]), # Dummy Line
+                (0x3B, lut_full_update[75:76]), # Gate time
+                (0x32, lut_full_update[:70]),
+                (0x4E, [0x00]),                 # set RAM x address count to 0
+                (0x4F, [0xF9, 0x00]),           # set RAM y address count to 0X127
+                (BUSY, b''),
+            ]),
+            'init_part': sequence.Sequence('epd2in13_V2.init_part', [
+                (0x2C, [0x26]),                 # VCOM Voltage
+                (BUSY, b''),
+                (0x32, lut_partial_update[:70]),
+                (0x37, [0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00]),
+                (0x22, [0xC0]),
+                (0x20, b''),
+                (BUSY, b''),
+                (0x3C, [0x01]),                 # BorderWavefrom
+                # RAM addressing again, in case the reset pulse cleared it
+                (0x01, [0xF9, 0x00, 0x00]),     # Driver output control
+                (0x11, [0x01]),                 # data entry mode
+            ] + sequence.window(0, EPD_HEIGHT - 1, EPD_WIDTH - 1, 0) + sequence.cursor(0, EPD_HEIGHT - 1)),
+            'full_window': sequence.Sequence('epd2in13_V2.full_window',
+                sequence.window(0, EPD_HEIGHT - 1, EPD_WIDTH - 1, 0) + sequence.cursor(0, EPD_HEIGHT - 1)),
+        })
+
+    def TurnOnDisplay(self, wait=True):
+        return self.activate('full', wait)
         
     def TurnOnDisplayPart(self):
-        self.send_command(0x22)
-        self.send_data(0x0c)
-        self.send_command(0x20)        
-        # self.ReadBusy()
+        return self.activate('partial', wait=False)
         
     def TurnOnDisplayPart_Wait(self):
-        self.send_command(0x22)
-        self.send_data(0x0c)
-        self.send_command(0x20)        
-        self.ReadBusy()
+        self.activate('partial')
         
     def init(self, update):
-        if (epdconfig.module_init() != 0):
+        self.refresh.begin()
+        if (epdconfig.module_init(self.spi_speed) != 0):
             return -1
         # EPD hardware init start
         self.reset()
         if(update == self.FULL_UPDATE):
-            self.ReadBusy()
-            self.send_command(0x12) # soft reset
-            self.ReadBusy()
-
-            self.send_command(0x74) #set analog block control
-            self.send_data(0x54)
-            self.send_command(0x7E) #set digital block control
-            self.send_data(0x3B)
-
-            self.send_command(0x01) #Driver output control
-            self.send_data(0xF9)
-            self.send_data(0x00)
-            self.send_data(0x00)
-
-            self.send_command(0x11) #data entry mode
-            self.send_data(0x01)
-
-            self.send_command(0x44) #set Ram-X address start/end position
-            self.send_data(0x00)
-            self.send_data(0x0F)    #0x0C-->(15+1)*8=128
-
-            self.send_command(0x45) #set Ram-Y address start/end position
-            self.send_data(0xF9)   #0xF9-->(249+1)=250
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x03)
-
-            self.send_command(0x2C)     #VCOM Voltage
-            self.send_data(0x55)    #
-
-            self.send_command(0x03)
-            self.send_data(self.lut_full_update[70])
-
-            self.send_command(0x04) #
-            self.send_data(self.lut_full_update[71])
-            self.send_data(self.lut_full_update[72])
-            self.send_data(self.lut_full_update[73])
-
-            self.send_command(0x3A)     #Dummy Line
-            self.send_data(self.lut_full_update[74])
-            self.send_command(0x3B)     #Gate time
-            self.send_data(self.lut_full_update[75])
-
-            self.send_command(0x32)
-            for count in range(70):
-                self.send_data(self.lut_full_update[count])
-
-            self.send_command(0x4E)   # set RAM x address count to 0
-            self.send_data(0x00)
-            self.send_command(0x4F)   # set RAM y address count to 0X127
-            self.send_data(0xF9)
-            self.send_data(0x00)
-            self.ReadBusy()
+            self.send_sequence('init_full')
         else:
-            self.send_command(0x2C)     #VCOM Voltage
-            self.send_data(0x26)
-
-            self.ReadBusy()
-
-            self.send_command(0x32)
-            for count in range(70):
-                self.send_data(self.lut_partial_update[count])
-
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-
-            self.send_command(0x22)
-            self.send_data(0xC0)
-            self.send_command(0x20)
-            self.ReadBusy()
-
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x01)
+            self.send_sequence('init_part')
         return 0
 
+    @trace.traced(trace.GETBUFFER)
     def getbuffer(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-         
+        linewidth = self.linewidth
         buf = [0xFF] * (linewidth * self.height)
         image_monocolor = image.convert('1')
         imwidth, imheight = image_monocolor.size
@@ -253,87 +174,45 @@ class EPD_2IN13_V2:
         return buf   
         
         
-    def display(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+    def display(self, image, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        # for j in range(0, self.height):
-            # for i in range(0, linewidth):
-                # self.send_data(image[i + j * linewidth])   
         self.send_data2(image)
-        self.TurnOnDisplay()
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplay(wait)
         
     def displayPartial(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+        self.refresh.begin()
         self.send_command(0x24)
-        # for j in range(0, self.height):
-            # for i in range(0, linewidth):
-                # self.send_data(image[i + j * linewidth])   
         self.send_data2(image)
-        self.TurnOnDisplayPart()
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplayPart()
 
     def displayPartial_Wait(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+        self.refresh.begin()
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
+        self.send_data2(image)
+        self.last_frame = bytes(image)
 
         self.TurnOnDisplayPart_Wait()
         
-    def displayPartBaseImage(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+    def displayPartBaseImage(self, image, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
-                
+        self.send_data2(image)
                 
         self.send_command(0x26)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])  
-        self.TurnOnDisplay()
+        self.send_data2(image)
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplay(wait)
     
-    def Clear(self, color):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-        
+    def Clear(self, color, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(color)
+        self.send_data2(self._fill_buffer(color))
+        self.last_frame = self._fill_buffer(color)
                 
-        self.TurnOnDisplay()
-
-    def sleep(self):
-        # self.send_command(0x22) #POWER OFF
-        # self.send_data(0xC3)
-        # self.send_command(0x20)
-
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x03)
-        epdconfig.delay_ms(100)
-
-    def Dev_exit(self):
-        epdconfig.module_exit()
+        return self.TurnOnDisplay(wait)
 
 ### END OF FILE ###
 
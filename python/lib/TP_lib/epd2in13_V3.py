@@ -30,6 +30,10 @@
 
 import logging
 from . import epdconfig
+from . import epdbase
+from . import sequence
+from . import trace
+from .sequence import BUSY
 import numpy as np
 
 # Display resolution
@@ -38,15 +42,9 @@ EPD_HEIGHT      = 250
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(epdbase.EPDBase):
     def __init__(self):
-        self.reset_pin = epdconfig.EPD_RST_PIN
-        self.dc_pin = epdconfig.EPD_DC_PIN
-        self.busy_pin = epdconfig.EPD_BUSY_PIN
-        self.cs_pin = epdconfig.EPD_CS_PIN
-        self.width = EPD_WIDTH
-        self.height = EPD_HEIGHT
-        epdconfig.address = 0x14
+        epdbase.EPDBase.__init__(self)
     
     FULL_UPDATE = 0
     PART_UPDATE = 1
@@ -94,224 +92,91 @@ class EPD:
         0x22,0x22,0x22,0x22,0x22,0x22,0x0,0x0,0x0,
         0x22,0x17,0x41,0x0,0x32,0x36,
     ]
-        
-    '''
-    function :Hardware reset
-    parameter:
-    '''
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
 
-    '''
-    function :send command
-    parameter:
-     command : Command register
-    '''
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    '''
-    function :send data
-    parameter:
-     data : Write data
-    '''
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+    PANEL = epdbase.Panel('2in13_V3', EPD_WIDTH, EPD_HEIGHT, address=0x14,
+        update={'full': 0xC7, 'partial': 0x0c},     # partial: fast 0x0c, quality 0x0f, 0xcf
+        luts={'full': lut_full_update, 'partial': lut_partial_update},
+        sequences={
+            'init_full': sequence.Sequence('epd2in13_V3.init_full', [
+                (BUSY, b''),
+                (0x12, b''),                    # SWRESET
+                (BUSY, b''),
+                (0x01, [0xf9, 0x00, 0x00]),     # Driver output control
+                (0x11, [0x03]),                 # data entry mode
+            ] + sequence.window(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1) + sequence.cursor(0, 0) + [
+                (0x3c, [0x05]),
+                (0x21, [0x00, 0x80]),           # Display update control
+                (0x18, [0x80]),
+                (BUSY, b''),
+            ] + sequence.lut(lut_full_update)),
+            'init_part': sequence.Sequence('epd2in13_V3.init_part', sequence.lut(lut_partial_update) + [
+                # RAM addressing again, in case the reset pulse cleared it
+                (0x01, [0xf9, 0x00, 0x00]),     # Driver output control
+                (0x11, [0x03]),                 # data entry mode
+                (0x37, [0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00]),
+                (0x3C, [0x80]),                 # BorderWavefrom
+                (0x22, [0xC0]),
+                (0x20, b''),
+                (BUSY, b''),
+            ] + sequence.window(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1) + sequence.cursor(0, 0)),
+            'full_window': sequence.Sequence('epd2in13_V3.full_window',
+                sequence.window(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1) + sequence.cursor(0, 0)),
+        })
         
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-    
-    '''
-    function :Wait until the busy_pin goes LOW
-    parameter:
-    '''
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)  
-        logger.debug("e-Paper busy release")
-
     '''
     function : Turn On Display
     parameter:
     '''
-    def TurnOnDisplay(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xC7)
-        self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
+    def TurnOnDisplay(self, wait=True):
+        return self.activate('full', wait)
     
     '''
     function : Turn On Display Part
     parameter:
     '''
     def TurnOnDisplayPart(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0x0c)    # fast:0x0c, quality:0x0f, 0xcf
-        self.send_command(0x20) # Activate Display Update Sequence
-        # self.ReadBusy()
+        return self.activate('partial', wait=False)
         
     def TurnOnDisplayPart_Wait(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0x0c)    # fast:0x0c, quality:0x0f, 0xcf
-        self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
-    
-    '''
-    function : Set lut
-    parameter:
-        lut : lut data
-    '''    
-    def Lut(self, lut):
-        self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
-        self.ReadBusy()
-    
-    '''
-    function : Send lut data and configuration
-    parameter:
-        lut : lut data 
-    '''
-    def SetLut(self, lut):
-        self.Lut(lut)
-        self.send_command(0x3f)
-        self.send_data(lut[153])
-        self.send_command(0x03)     # gate voltage
-        self.send_data(lut[154])
-        self.send_command(0x04)     # source voltage
-        self.send_data(lut[155])    # VSH
-        self.send_data(lut[156])    # VSH2
-        self.send_data(lut[157])    # VSL
-        self.send_command(0x2c)     # VCOM
-        self.send_data(lut[158])
-    
-    '''
-    function : Setting the display window
-    parameter:
-        xstart : X-axis starting position
-        ystart : Y-axis starting position
-        xend : End position of X-axis
-        yend : End position of Y-axis
-    '''
-    def SetWindow(self, x_start, y_start, x_end, y_end):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data((x_start>>3) & 0xFF)
-        self.send_data((x_end>>3) & 0xFF)
-        
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
-
-    '''
-    function : Set Cursor
-    parameter:
-        x : X-axis starting position
-        y : Y-axis starting position
-    '''
-    def SetCursor(self, x, y):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data(x & 0xFF)
-        
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        self.activate('partial')
     
     '''
     function : Initialize the e-Paper register
     parameter:
     '''
     def init(self, update):
-        if (epdconfig.module_init() != 0):
+        self.refresh.begin()
+        if (epdconfig.module_init(self.spi_speed) != 0):
             return -1
         
         if update == self.FULL_UPDATE:
             # EPD hardware init start
             self.reset()
             
-            self.ReadBusy()
-            self.send_command(0x12)  #SWRESET
-            self.ReadBusy() 
-
-            self.send_command(0x01) #Driver output control      
-            self.send_data(0xf9)
-            self.send_data(0x00)
-            self.send_data(0x00)
-        
-            self.send_command(0x11) #data entry mode       
-            self.send_data(0x03)
-
-            self.SetWindow(0, 0, self.width-1, self.height-1)
-            self.SetCursor(0, 0)
-            
-            self.send_command(0x3c)
-            self.send_data(0x05)
-
-            self.send_command(0x21) #  Display update control
-            self.send_data(0x00)
-            self.send_data(0x80)
-        
-            self.send_command(0x18)
-            self.send_data(0x80)
-            
-            self.ReadBusy()
-            
-            self.SetLut(self.lut_full_update)
-        
+            self.send_sequence('init_full')
         else:
             epdconfig.digital_write(self.reset_pin, 0)
             epdconfig.delay_ms(1)
             epdconfig.digital_write(self.reset_pin, 1)  
             
-            self.SetLut(self.lut_partial_update)
-            self.send_command(0x37)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x40)
-            self.send_data(0x00)
-            self.send_data(0x00)
-            self.send_data(0x00)  
-            self.send_data(0x00)
-
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x80)
-
-            self.send_command(0x22) 
-            self.send_data(0xC0)
-            self.send_command(0x20)
-            self.ReadBusy()
-
-            self.SetWindow(0, 0, self.width - 1, self.height - 1)
-            self.SetCursor(0, 0)
+            self.send_sequence('init_part')
         
         return 0
 
+    '''
+    function : Leave deep sleep for partial refreshes, keeping the RAM
+    parameter:
+    '''
+    def wake_partial(self):
+        self.init(self.PART_UPDATE)
+        self.asleep = False
+
     '''
     function : Display images
     parameter:
         image : Image data
     '''
+    @trace.traced(trace.GETBUFFER)
     def getbuffer(self, image):
         img = image
         imwidth, imheight = img.size
@@ -332,105 +197,64 @@ class EPD:
     function : Sends the image buffer in RAM to e-Paper and displays
     parameter:
         image : Image data
+        wait : False returns a Future that resolves when the refresh is done
     '''
-    def display(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+    def display(self, image, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        # for j in range(0, self.height):
-            # for i in range(0, linewidth):
-                # self.send_data(image[i + j * linewidth])  
 
         self.send_data2(image)
-        self.TurnOnDisplay()
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplay(wait)
     
     '''
-    function : Sends the image buffer in RAM to e-Paper and partial refresh
+    function : Sends the image buffer in RAM to e-Paper and partial refresh,
+               returns a Future that resolves when the refresh is done
     parameter:
         image : Image data
     '''
     def displayPartial(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+        self.refresh.begin()
         self.send_command(0x24) # WRITE_RAM
-        # for j in range(0, self.height):
-            # for i in range(0, linewidth):
-                # self.send_data(image[i + j * linewidth]) 
         self.send_data2(image)                
-        self.TurnOnDisplayPart()
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplayPart()
         
     def displayPartial_Wait(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-        
+        self.refresh.begin()
         self.send_command(0x24) # WRITE_RAM
-        # for j in range(0, self.height):
-            # for i in range(0, linewidth):
-                # self.send_data(image[i + j * linewidth])
 
         self.send_data2(image)
+        self.last_frame = bytes(image)
         self.TurnOnDisplayPart_Wait()
 
     '''
     function : Refresh a base image
     parameter:
         image : Image data
+        wait : False returns a Future that resolves when the refresh is done
     '''
-    def displayPartBaseImage(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+    def displayPartBaseImage(self, image, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
+        self.send_data2(image)
                 
         self.send_command(0x26)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])  
-        self.TurnOnDisplay()
+        self.send_data2(image)
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplay(wait)
     
     '''
     function : Clear screen
     parameter:
     '''
-    def Clear(self, color):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-        # logger.debug(linewidth)
-        
+    def Clear(self, color, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(color)
+        self.send_data2(self._fill_buffer(color))
+        self.last_frame = self._fill_buffer(color)
                 
-        self.TurnOnDisplay()
-
-    '''
-    function : Enter sleep mode
-    parameter:
-    '''
-    def sleep(self):
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x01)
-        
-        epdconfig.delay_ms(2000)
-
-    def Dev_exit(self):
-        epdconfig.module_exit()
+        return self.TurnOnDisplay(wait)
 
 ### END OF FILE ###
 
@@ -30,6 +30,10 @@
 
 import logging
 from . import epdconfig
+from . import epdbase
+from . import sequence
+from . import trace
+from .sequence import BUSY
 import numpy as np
 
 # Display resolution
@@ -38,195 +42,88 @@ EPD_HEIGHT      = 250
 
 logger = logging.getLogger(__name__)
 
-class EPD:
+class EPD(epdbase.EPDBase):
     def __init__(self):
-        self.reset_pin = epdconfig.EPD_RST_PIN
-        self.dc_pin = epdconfig.EPD_DC_PIN
-        self.busy_pin = epdconfig.EPD_BUSY_PIN
-        self.cs_pin = epdconfig.EPD_CS_PIN
-        self.width = EPD_WIDTH
-        self.height = EPD_HEIGHT
-        epdconfig.address = 0x14
+        epdbase.EPDBase.__init__(self)
     
     FULL_UPDATE = 0
     PART_UPDATE = 1
-        
-    '''
-    function :Hardware reset
-    parameter:
-    '''
-    def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
 
-    '''
-    function :send command
-    parameter:
-     command : Command register
-    '''
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    '''
-    function :send data
-    parameter:
-     data : Write data
-    '''
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
+    PANEL = epdbase.Panel('2in13_V4', EPD_WIDTH, EPD_HEIGHT, address=0x14,
+        update={'full': 0xF7, 'partial': 0xFF},     # partial: fast 0x0c, quality 0x0f, 0xcf
+        sequences={
+            'init_full': sequence.Sequence('epd2in13_V4.init_full', [
+                (BUSY, b''),
+                (0x12, b''),                    # SWRESET
+                (BUSY, b''),
+                (0x01, [0xf9, 0x00, 0x00]),     # Driver output control
+                (0x11, [0x03]),                 # data entry mode
+            ] + sequence.window(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1) + sequence.cursor(0, 0) + [
+                (0x3c, [0x05]),
+                (0x21, [0x00, 0x80]),           # Display update control
+                (0x18, [0x80]),
+                (BUSY, b''),
+            ]),
+            'partial': sequence.Sequence('epd2in13_V4.partial', [
+                (0x01, [0xf9, 0x00, 0x00]),     # Driver output control
+                (0x3C, [0x80]),                 # BorderWavefrom
+                (0x11, [0x03]),                 # data entry mode
+            ]),
+            'full_window': sequence.Sequence('epd2in13_V4.full_window',
+                sequence.window(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1) + sequence.cursor(0, 0)),
+        })
         
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-    
-    '''
-    function :Wait until the busy_pin goes LOW
-    parameter:
-    '''
-    def ReadBusy(self):
-        logger.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            epdconfig.delay_ms(10)  
-        logger.debug("e-Paper busy release")
-
     '''
     function : Turn On Display
     parameter:
     '''
-    def TurnOnDisplay(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xF7)
-        self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
+    def TurnOnDisplay(self, wait=True):
+        return self.activate('full', wait)
     
     '''
     function : Turn On Display Part
     parameter:
     '''
     def TurnOnDisplayPart(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xFF)    # fast:0x0c, quality:0x0f, 0xcf
-        self.send_command(0x20) # Activate Display Update Sequence
-        # self.ReadBusy()
+        return self.activate('partial', wait=False)
         
     def TurnOnDisplayPart_Wait(self):
-        self.send_command(0x22) # Display Update Control
-        self.send_data(0xFF)    # fast:0x0c, quality:0x0f, 0xcf
-        self.send_command(0x20) # Activate Display Update Sequence
-        self.ReadBusy()
-
-    '''
-    function : Setting the display window
-    parameter:
-        xstart : X-axis starting position
-        ystart : Y-axis starting position
-        xend : End position of X-axis
-        yend : End position of Y-axis
-    '''
-    def SetWindow(self, x_start, y_start, x_end, y_end):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data((x_start>>3) & 0xFF)
-        self.send_data((x_end>>3) & 0xFF)
-        
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
+        self.activate('partial')
 
-    '''
-    function : Set Cursor
-    parameter:
-        x : X-axis starting position
-        y : Y-axis starting position
-    '''
-    def SetCursor(self, x, y):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data(x & 0xFF)
-        
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
-    
     '''
     function : Initialize the e-Paper register
     parameter:
     '''
     def init(self, update):
-        if (epdconfig.module_init() != 0):
+        self.refresh.begin()
+        if (epdconfig.module_init(self.spi_speed) != 0):
             return -1
         
         if update == self.FULL_UPDATE:
             # EPD hardware init start
             self.reset()
             
-            self.ReadBusy()
-            self.send_command(0x12)  #SWRESET
-            self.ReadBusy() 
-
-            self.send_command(0x01) #Driver output control      
-            self.send_data(0xf9)
-            self.send_data(0x00)
-            self.send_data(0x00)
-        
-            self.send_command(0x11) #data entry mode       
-            self.send_data(0x03)
-
-            self.SetWindow(0, 0, self.width-1, self.height-1)
-            self.SetCursor(0, 0)
-            
-            self.send_command(0x3c)
-            self.send_data(0x05)
-
-            self.send_command(0x21) #  Display update control
-            self.send_data(0x00)
-            self.send_data(0x80)
-        
-            self.send_command(0x18)
-            self.send_data(0x80)
-            
-            self.ReadBusy()
-        
+            self.send_sequence('init_full')
         else:
-            epdconfig.digital_write(self.reset_pin, 0)
-            epdconfig.delay_ms(1)
-            epdconfig.digital_write(self.reset_pin, 1)  
-
-            self.send_command(0x01) #Driver output control      
-            self.send_data(0xf9)
-            self.send_data(0x00)
-            self.send_data(0x00)
-
-            self.send_command(0x3C) #BorderWavefrom
-            self.send_data(0x80)
-
-            self.send_command(0x11) #data entry mode       
-            self.send_data(0x03)
-
-            self.SetWindow(0, 0, self.width - 1, self.height - 1)
-            self.SetCursor(0, 0)
+            self.PartialSetup()
+            self.send_sequence('full_window')
         
         return 0
 
+    '''
+    function : Leave deep sleep for partial refreshes, keeping the RAM
+    parameter:
+    '''
+    def wake_partial(self):
+        self.init(self.PART_UPDATE)
+        self.asleep = False
+
     '''
     function : Display images
     parameter:
         image : Image data
     '''
+    @trace.traced(trace.GETBUFFER)
     def getbuffer(self, image):
         img = image
         imwidth, imheight = img.size
@@ -247,124 +144,90 @@ class EPD:
     function : Sends the image buffer in RAM to e-Paper and displays
     parameter:
         image : Image data
+        wait : False returns a Future that resolves when the refresh is done
     '''
-    def display(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+    def display(self, image, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        # for j in range(0, self.height):
-            # for i in range(0, linewidth):
-                # self.send_data(image[i + j * linewidth])  
-
         self.send_data2(image)
-        self.TurnOnDisplay()
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplay(wait)
     
     '''
-    function : Sends the image buffer in RAM to e-Paper and partial refresh
+    function : Reset and reconfigure the controller for a partial refresh
     parameter:
-        image : Image data
     '''
-    def displayPartial(self, image):
+    def PartialSetup(self):
         epdconfig.digital_write(self.reset_pin, 0)
         epdconfig.delay_ms(1)
         epdconfig.digital_write(self.reset_pin, 1)  
 
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
-
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+        self.send_sequence('partial')
 
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+    '''
+    function : Sends the image buffer in RAM to e-Paper and partial refresh,
+               returns a Future that resolves when the refresh is done
+    parameter:
+        image : Image data
+    '''
+    def displayPartial(self, image):
+        self.refresh.begin()
+        self.PartialSetup()
+        self.send_sequence('full_window')
 
         self.send_command(0x24) # WRITE_RAM
-        self.send_data2(image)                
-        self.TurnOnDisplayPart()
+        self.send_data2(image)
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplayPart()
         
-    def displayPartial_Wait(self, image):
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(1)
-        epdconfig.digital_write(self.reset_pin, 1)  
-
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0xf9)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
-
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
+    '''
+    function : Hooks for display_region() (from EPDBase): partial setup
+               before the dirty rectangles are written, partial refresh after
+    parameter:
+    '''
+    def _partial_begin(self):
+        self.PartialSetup()
 
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+    def _partial_end(self):
+        return self.TurnOnDisplayPart()
+        
+    def displayPartial_Wait(self, image):
+        self.refresh.begin()
+        self.PartialSetup()
+        self.send_sequence('full_window')
         
         self.send_command(0x24) # WRITE_RAM
         self.send_data2(image)
+        self.last_frame = bytes(image)
         self.TurnOnDisplayPart_Wait()
 
     '''
     function : Refresh a base image
     parameter:
         image : Image data
+        wait : False returns a Future that resolves when the refresh is done
     '''
-    def displayPartBaseImage(self, image):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-
+    def displayPartBaseImage(self, image, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])   
+        self.send_data2(image)
                 
         self.send_command(0x26)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(image[i + j * linewidth])  
-        self.TurnOnDisplay()
+        self.send_data2(image)
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplay(wait)
     
     '''
     function : Clear screen
     parameter:
     '''
-    def Clear(self, color):
-        if self.width%8 == 0:
-            linewidth = int(self.width/8)
-        else:
-            linewidth = int(self.width/8) + 1
-        # logger.debug(linewidth)
-        
+    def Clear(self, color, wait=True):
+        self.refresh.begin()
         self.send_command(0x24)
-        for j in range(0, self.height):
-            for i in range(0, linewidth):
-                self.send_data(color)
+        self.send_data2(self._fill_buffer(color))
+        self.last_frame = self._fill_buffer(color)
                 
-        self.TurnOnDisplay()
-
-    '''
-    function : Enter sleep mode
-    parameter:
-    '''
-    def sleep(self):
-        self.send_command(0x10) #enter deep sleep
-        self.send_data(0x01)
-        
-        epdconfig.delay_ms(2000)
-
-    def Dev_exit(self):
-        epdconfig.module_exit()
+        return self.TurnOnDisplay(wait)
 
 ### END OF FILE ###
 
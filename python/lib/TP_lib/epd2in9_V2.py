@@ -29,21 +29,20 @@
 
 import logging
 from . import epdconfig
+from . import epdbase
+from . import sequence
+from . import trace
+from .sequence import BUSY
 import numpy as np
 
 # Display resolution
 EPD_WIDTH       = 128
 EPD_HEIGHT      = 296
 
-class EPD_2IN9_V2:
+class EPD_2IN9_V2(epdbase.EPDBase):
     def __init__(self):
-        self.reset_pin = epdconfig.EPD_RST_PIN
-        self.dc_pin = epdconfig.EPD_DC_PIN
-        self.busy_pin = epdconfig.EPD_BUSY_PIN
-        self.cs_pin = epdconfig.EPD_CS_PIN
-        self.width = EPD_WIDTH
-        self.height = EPD_HEIGHT
-        epdconfig.address = 0x48
+        epdbase.EPDBase.__init__(self)
+        self._partial_lut = None    # partial LUT loaded since the last reset/full refresh
      
     WF_PARTIAL_2IN9 = [
         0x0,0x40,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,0x0,
@@ -132,455 +131,266 @@ class EPD_2IN9_V2:
     0x24,	0x42,	0x22,	0x22,	0x23,	0x32,	0x00,	0x00,	0x00,		
     0x22,	0x17,	0x41,	0xAE,	0x32,	0x38]
 
+    _INIT_HEAD = [
+        (BUSY, b''),
+        (0x12, b''),                    # SWRESET
+        (BUSY, b''),
+        (0x01, [0x27, 0x01, 0x00]),     # Driver output control
+        (0x11, [0x03]),                 # data entry mode
+    ]
+    _PARTIAL_OPTIONS = [
+        (0x37, [0x00, 0x00, 0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x00]),
+        (0x3C, [0x80]),                 # BorderWavefrom
+    ]
+
+    PANEL = epdbase.Panel('2in9_V2', EPD_WIDTH, EPD_HEIGHT, address=0x48, busy_poll=0.1,
+        update={'full': 0xF7, 'partial': 0x0F, 'gray4': 0xC7},
+        luts={'full': WF_FULL, 'gray4': Gray4, 'partial': WF_PARTIAL_2IN9, 'partial_wait': WF_PARTIAL_2IN9_Wait},
+        sequences={
+            'init': sequence.Sequence('epd2in9_V2.init', _INIT_HEAD
+                + sequence.window(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1)
+                + [(0x21, [0x00, 0x80])]        # Display update control
+                + sequence.cursor(0, 0) + [(BUSY, b'')]),
+            'init_fast': sequence.Sequence('epd2in9_V2.init_Fast', _INIT_HEAD
+                + sequence.window(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1)
+                + [(0x3C, [0x05]), (0x21, [0x00, 0x80])]
+                + sequence.cursor(0, 0) + [(BUSY, b'')]
+                + sequence.lut(WF_FULL)),
+            'init_4gray': sequence.Sequence('epd2in9_V2.Init_4Gray', _INIT_HEAD
+                + sequence.window(8, 0, EPD_WIDTH, EPD_HEIGHT - 1)
+                + [(0x3C, [0x04])]
+                + sequence.cursor(1, 0) + [(BUSY, b'')]
+                + sequence.lut(Gray4)),
+            # partial LUT, VCOM/OTP options and border
+            'partial': sequence.Sequence('epd2in9_V2.partial_lut',
+                [(0x32, WF_PARTIAL_2IN9), (BUSY, b'')] + _PARTIAL_OPTIONS),
+            'partial_wait': sequence.Sequence('epd2in9_V2.partial_wait_lut',
+                [(0x32, WF_PARTIAL_2IN9_Wait), (BUSY, b'')] + _PARTIAL_OPTIONS),
+            'power_on': sequence.Sequence('epd2in9_V2.power_on', [(0x22, [0xC0]), (0x20, b''), (BUSY, b'')]),
+            'full_window': sequence.Sequence('epd2in9_V2.full_window',
+                sequence.window(0, 0, EPD_WIDTH - 1, EPD_HEIGHT - 1) + sequence.cursor(0, 0) + [(BUSY, b'')]),
+        })
+
     # Hardware reset
     def reset(self):
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20) 
-        epdconfig.digital_write(self.reset_pin, 0)
-        epdconfig.delay_ms(2)
-        epdconfig.digital_write(self.reset_pin, 1)
-        epdconfig.delay_ms(20)   
-
-    def send_command(self, command):
-        epdconfig.digital_write(self.dc_pin, 0)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([command])
-        epdconfig.digital_write(self.cs_pin, 1)
-
-    def send_data(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte([data])
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def send_data2(self, data):
-        epdconfig.digital_write(self.dc_pin, 1)
-        epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.spi_writebyte2(data)
-        epdconfig.digital_write(self.cs_pin, 1)
-        
-    def ReadBusy(self):
-        # logging.debug("e-Paper busy")
-        while(epdconfig.digital_read(self.busy_pin) == 1):      #  0: idle, 1: busy
-            epdconfig.delay_ms(0.1)
-        # logging.debug("e-Paper busy release")  
-
-    def TurnOnDisplay(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xF7)
-        self.send_command(0x20) # MASTER_ACTIVATION
-        self.ReadBusy()
+        epdbase.EPDBase.reset(self)
+        self._partial_lut = None
+
+    # wait=False returns a Future that resolves when the refresh is done
+    def TurnOnDisplay(self, wait=True):
+        self._partial_lut = None
+        return self.activate('full', wait)
 
     def TurnOnDisplay_Partial(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0x0F)
-        self.send_command(0x20) # MASTER_ACTIVATION
-        # self.ReadBusy()
+        return self.activate('partial', wait=False)
 
     def TurnOnDisplay_Partial_Wait(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0x0F)
-        self.send_command(0x20) # MASTER_ACTIVATION
-        self.ReadBusy()
+        self.activate('partial')
 
-    def TurnOnDisplay_4Gray(self):
-        self.send_command(0x22) # DISPLAY_UPDATE_CONTROL_2
-        self.send_data(0xC7)
-        self.send_command(0x20) # MASTER_ACTIVATION
-        self.ReadBusy()
+    def TurnOnDisplay_4Gray(self, wait=True):
+        self._partial_lut = None
+        return self.activate('gray4', wait)
 
     def SendLut(self, lut):
         self.send_command(0x32)
-        # for i in range(0, 153):
-            # self.send_data(self.WF_PARTIAL_2IN9[i])
         if(lut):
             self.send_data2(self.WF_PARTIAL_2IN9)
         else:
             self.send_data2(self.WF_PARTIAL_2IN9_Wait)
         self.ReadBusy()
 
-    def lut(self, lut):
-        self.send_command(0x32)
-        for i in range(0, 153):
-            self.send_data(lut[i])
-        self.ReadBusy()
-
-    def SetLut(self, lut):
-        self.lut(lut)
-        self.send_command(0x3f)
-        self.send_data(lut[153])
-        self.send_command(0x03);	# gate voltage
-        self.send_data(lut[154])
-        self.send_command(0x04);	# source voltage
-        self.send_data(lut[155])	# VSH
-        self.send_data(lut[156])	# VSH2
-        self.send_data(lut[157])	# VSL
-        self.send_command(0x2c);		# VCOM
-        self.send_data(lut[158])
-
-    def SetWindow(self, x_start, y_start, x_end, y_end):
-        self.send_command(0x44) # SET_RAM_X_ADDRESS_START_END_POSITION
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data((x_start>>3) & 0xFF)
-        self.send_data((x_end>>3) & 0xFF)
-        self.send_command(0x45) # SET_RAM_Y_ADDRESS_START_END_POSITION
-        self.send_data(y_start & 0xFF)
-        self.send_data((y_start >> 8) & 0xFF)
-        self.send_data(y_end & 0xFF)
-        self.send_data((y_end >> 8) & 0xFF)
-
     def SetCursor(self, x, y):
-        self.send_command(0x4E) # SET_RAM_X_ADDRESS_COUNTER
-        # x point must be the multiple of 8 or the last 3 bits will be ignored
-        self.send_data(x & 0xFF)
-        
-        self.send_command(0x4F) # SET_RAM_Y_ADDRESS_COUNTER
-        self.send_data(y & 0xFF)
-        self.send_data((y >> 8) & 0xFF)
+        epdbase.EPDBase.SetCursor(self, x, y)
         self.ReadBusy()
         
     def init(self):
-        if (epdconfig.module_init() != 0):
+        self.refresh.begin()
+        if (epdconfig.module_init(self.spi_speed) != 0):
             return -1
         # EPD hardware init start     
         self.reset()
 
-        self.ReadBusy()
-        self.send_command(0x12)  #SWRESET
-        self.ReadBusy()
-
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
-    
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
-
-        self.SetWindow(0, 0, self.width-1, self.height-1)
-
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
-    
-        self.SetCursor(0, 0)
-        self.ReadBusy()
+        self.send_sequence('init')
         # EPD hardware init end
         return 0
     
     def init_Fast(self):
-        if (epdconfig.module_init() != 0):
+        self.refresh.begin()
+        if (epdconfig.module_init(self.spi_speed) != 0):
             return -1
         # EPD hardware init start     
         self.reset()
 
-        self.ReadBusy()
-        self.send_command(0x12)  #SWRESET
-        self.ReadBusy() 
-
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
-    
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
-
-        self.SetWindow(0, 0, self.width-1, self.height-1)
-
-        self.send_command(0x3C)   
-        self.send_data(0x05)
-
-        self.send_command(0x21) #  Display update control
-        self.send_data(0x00)
-        self.send_data(0x80)
-    
-        self.SetCursor(0, 0)
-        self.ReadBusy()
-
-        self.SetLut(self.WF_FULL)
+        self.send_sequence('init_fast')
         # EPD hardware init end
         return 0
     
     def Init_4Gray(self):
-        if (epdconfig.module_init() != 0):
+        self.refresh.begin()
+        if (epdconfig.module_init(self.spi_speed) != 0):
             return -1
         self.reset()
         epdconfig.delay_ms(100)
 
-        self.ReadBusy()
-        self.send_command(0x12)  #SWRESET
-        self.ReadBusy() 
-
-        self.send_command(0x01) #Driver output control      
-        self.send_data(0x27)
-        self.send_data(0x01)
-        self.send_data(0x00)
-    
-        self.send_command(0x11) #data entry mode       
-        self.send_data(0x03)
-
-        self.SetWindow(8, 0, self.width, self.height-1)
-
-        self.send_command(0x3C)
-        self.send_data(0x04)
-    
-        self.SetCursor(1, 0)
-        self.ReadBusy()
-
-        self.SetLut(self.Gray4)
+        self.send_sequence('init_4gray')
         # EPD hardware init end
         return 0
 
+    @trace.traced(trace.GETBUFFER)
     def getbuffer(self, image):
-        # logging.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width/8) * self.height)
+        # Pack the '1' image with numpy.packbits: one bit per pixel, MSB first,
+        # 0 = black. A landscape image is rotated 90 degrees into RAM order.
         image_monocolor = image.convert('1')
         imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        # logging.debug("imwidth = %d, imheight = %d",imwidth,imheight)
         if(imwidth == self.width and imheight == self.height):
             # logging.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if pixels[x, y] == 0:
-                        buf[int((x + y * self.width) / 8)] &= ~(0x80 >> (x % 8))
+            pixels = np.asarray(image_monocolor, dtype=bool)
         elif(imwidth == self.height and imheight == self.width):
             # logging.debug("Horizontal")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    newx = y
-                    newy = self.height - x - 1
-                    if pixels[x, y] == 0:
-                        buf[int((newx + newy*self.width) / 8)] &= ~(0x80 >> (y % 8))
-        return buf
+            pixels = np.rot90(np.asarray(image_monocolor, dtype=bool))
+        else:
+            return bytearray([0xFF]) * (int(self.width/8) * self.height)
+        return bytearray(np.packbits(pixels, axis=None).tobytes())
     
-    def getbuffer_4Gray(self, image):
-        # logger.debug("bufsiz = ",int(self.width/8) * self.height)
-        buf = [0xFF] * (int(self.width / 4) * self.height)
-        image_monocolor = image.convert('L')
-        imwidth, imheight = image_monocolor.size
-        pixels = image_monocolor.load()
-        i=0
-        # logger.debug("imwidth = %d, imheight = %d",imwidth,imheight)
+    def _gray4_levels(self, image):
+        # 2-bit gray level of every pixel in RAM order: 0 black, 1 dark gray,
+        # 2 light gray, 3 white. 0xC0 and 0x80 are the two gray fill values;
+        # any other value falls into the level given by its top two bits.
+        image_gray = image.convert('L')
+        imwidth, imheight = image_gray.size
         if(imwidth == self.width and imheight == self.height):
-            # logger.debug("Vertical")
-            for y in range(imheight):
-                for x in range(imwidth):
-                    # Set the bits for the column of pixels at the current position.
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((x + (y * self.width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
-                        
+            pixels = np.asarray(image_gray)
         elif(imwidth == self.height and imheight == self.width):
-            # logger.debug("Horizontal")
-            for x in range(imwidth):
-                for y in range(imheight):
-                    newx = y
-                    newy = self.height - x - 1
-                    if(pixels[x, y] == 0xC0):
-                        pixels[x, y] = 0x80
-                    elif (pixels[x, y] == 0x80):
-                        pixels[x, y] = 0x40
-                    i= i+1
-                    if(i%4 == 0):
-                        buf[int((newx + (newy * self.width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6) 
-        return buf
-
-    def display(self, image):
+            pixels = np.rot90(np.asarray(image_gray))
+        else:
+            return np.full((self.height, self.width), 3, dtype=np.uint8)
+        levels = pixels >> 6
+        levels[pixels == 0xC0] = 2
+        levels[pixels == 0x80] = 1
+        return levels
+
+    def _gray4_planes(self, levels):
+        # Split gray levels into the two RAM planes:
+        # 0x24 bit is set for black and light gray, 0x26 bit for black and dark gray
+        plane24 = np.packbits((levels & 0x01) == 0, axis=None).tobytes()
+        plane26 = np.packbits(levels < 2, axis=None).tobytes()
+        return plane24, plane26
+
+    @trace.traced(trace.GETBUFFER)
+    def getbuffer_4Gray(self, image):
+        # 2 bits per pixel, 4 pixels per byte, first pixel in the top bits
+        levels = self._gray4_levels(image).reshape(-1, 4)
+        buf = (levels[:, 0] << 6) | (levels[:, 1] << 4) | (levels[:, 2] << 2) | levels[:, 3]
+        return bytearray(buf.astype(np.uint8).tobytes())
+
+    @trace.traced(trace.GETBUFFER)
+    def getbuffer_4Gray_planes(self, image):
+        # Quantize an image straight into the (0x24, 0x26) RAM planes
+        return self._gray4_planes(self._gray4_levels(image))
+
+    def display(self, image, wait=True):
         if (image == None):
-            return            
+            return
+        self.refresh.begin()
         self.send_command(0x24) # WRITE_RAM
-        # for j in range(0, self.height):
-            # for i in range(0, int(self.width / 8)):
-                # self.send_data(image[i + j * int(self.width / 8)])   
         self.send_data2(image)
-        self.TurnOnDisplay()
+        self.last_frame = bytes(image)
+        return self.TurnOnDisplay(wait)
 
-    def display_Base(self, image):
+    def display_Base(self, image, wait=True):
         if (image == None):
-            return   
-            
+            return
+        self.refresh.begin()
         self.send_command(0x24) # WRITE_RAM
-        # for j in range(0, self.height):
-            # for i in range(0, int(self.width / 8)):
-                # self.send_data(image[i + j * int(self.width / 8)])
         self.send_data2(image)
                 
         self.send_command(0x26) # WRITE_RAM
-        # for j in range(0, self.height):
-            # for i in range(0, int(self.width / 8)):
-                # self.send_data(image[i + j * int(self.width / 8)])   
         self.send_data2(image)
+        self.last_frame = bytes(image)
         
-        self.TurnOnDisplay()
+        return self.TurnOnDisplay(wait)
         
+    # Load the partial LUT and power up for a partial refresh
+    def PartialSetup(self, lut):
+        # The LUT and options survive partial refreshes, so they are only
+        # sent again after a reset, a full refresh or a different LUT
+        if self._partial_lut != lut:
+            self.send_sequence('partial' if lut else 'partial_wait')
+            self._partial_lut = lut
+        self.send_sequence('power_on')
+
     def display_Partial(self, image):
         if (image == None):
             return
+        self.refresh.begin()
             
         # epdconfig.digital_write(self.reset_pin, 0)
         # epdconfig.delay_ms(2)
         # epdconfig.digital_write(self.reset_pin, 1)
         # epdconfig.delay_ms(2)   
         
-        self.SendLut(1)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)	
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
-
-        self.send_command(0x22)
-        self.send_data(0xC0)
-        self.send_command(0x20)
-        self.ReadBusy()
-
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+        self.PartialSetup(1)
+        self.send_sequence('full_window')
         
         self.send_command(0x24) # WRITE_RAM
-        # for j in range(0, self.height):
-            # for i in range(0, int(self.width / 8)):
-                # self.send_data(image[i + j * int(self.width / 8)])   
         self.send_data2(image)
+        self.last_frame = bytes(image)
             
-        self.TurnOnDisplay_Partial()
+        return self.TurnOnDisplay_Partial()
+
+    # display_region() (from EPDBase) goes through the same partial setup
+    def _partial_begin(self):
+        self.PartialSetup(1)
+
+    def _partial_end(self):
+        return self.TurnOnDisplay_Partial()
 
     def display_Partial_Wait(self, image):
         if (image == None):
             return
+        self.refresh.begin()
             
         epdconfig.digital_write(self.reset_pin, 0)
         epdconfig.delay_ms(1)
         epdconfig.digital_write(self.reset_pin, 1)
         # epdconfig.delay_ms(2)   
+        self._partial_lut = None
         
-        self.SendLut(0)
-        self.send_command(0x37)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x40)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-        self.send_data(0x00)
-
-        self.send_command(0x3C) #BorderWavefrom
-        self.send_data(0x80)
-
-        self.send_command(0x22)
-        self.send_data(0xC0)
-        self.send_command(0x20)
-        self.ReadBusy()
-
-        self.SetWindow(0, 0, self.width - 1, self.height - 1)
-        self.SetCursor(0, 0)
+        self.PartialSetup(0)
+        self.send_sequence('full_window')
         
         self.send_command(0x24) # WRITE_RAM
-        # for j in range(0, self.height):
-            # for i in range(0, int(self.width / 8)):
-                # self.send_data(image[i + j * int(self.width / 8)])   
         self.send_data2(image)
+        self.last_frame = bytes(image)
         
         self.TurnOnDisplay_Partial_Wait()
 
-    def Clear(self, color):
+    def Clear(self, color=0xFF, wait=True):
+        self.refresh.begin()
         self.send_command(0x24) # WRITE_RAM
-        for j in range(0, self.height):
-            for i in range(0, int(self.width / 8)):
-                self.send_data(color)   
-        self.TurnOnDisplay()
+        self.send_data2(self._fill_buffer(color))
+        self.last_frame = self._fill_buffer(color)
+        return self.TurnOnDisplay(wait)
     
-    def display_4Gray(self, image):
+    def display_4Gray(self, image, wait=True):
+        # image is the 2 bits per pixel buffer from getbuffer_4Gray
+        buf = np.frombuffer(bytes(image), dtype=np.uint8)
+        levels = np.stack((buf >> 6, (buf >> 4) & 0x03, (buf >> 2) & 0x03, buf & 0x03), axis=1)
+        return self.display_4Gray_planes(self._gray4_planes(levels), wait)
+
+    def display_4Gray_planes(self, planes, wait=True):
+        # planes is the (0x24, 0x26) pair from getbuffer_4Gray_planes
+        self.refresh.begin()
         self.send_command(0x24)
-        for i in range(0, 4736):
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01  
-                    elif(temp2 == 0x80): 
-                        temp3 |= 0x01 
-                    else: #0x40
-                        temp3 |= 0x00 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x01
-                    else :   #0x40
-                        temp3 |= 0x00	
-                    if(j!=1 or k!=1):				
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-            
-        self.send_command(0x26)	       
-        for i in range(0, 4736):
-            temp3=0
-            for j in range(0, 2):
-                temp1 = image[i*2+j]
-                for k in range(0, 2):
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0):
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00):
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00
-                    else: #0x40
-                        temp3 |= 0x01 
-                    temp3 <<= 1	
-                    
-                    temp1 <<= 2
-                    temp2 = temp1&0xC0 
-                    if(temp2 == 0xC0): 
-                        temp3 |= 0x00
-                    elif(temp2 == 0x00): 
-                        temp3 |= 0x01
-                    elif(temp2 == 0x80):
-                        temp3 |= 0x00 
-                    else:    #0x40
-                        temp3 |= 0x01	
-                    if(j!=1 or k!=1):					
-                        temp3 <<= 1
-                    temp1 <<= 2
-            self.send_data(temp3)
-
-        self.TurnOnDisplay_4Gray()
-
-    def sleep(self):
-        self.send_command(0x10) # DEEP_SLEEP_MODE
-        self.send_data(0x01)
+        self.send_data2(planes[0])
+        self.send_command(0x26)
+        self.send_data2(planes[1])
+        self.last_frame = planes[0]
+        return self.TurnOnDisplay_4Gray(wait)
+
+    def _enter_sleep(self):
+        epdbase.EPDBase._enter_sleep(self)
+        self._partial_lut = None
         
-    def Dev_exit(self):
-        epdconfig.module_exit()
 ### END OF FILE ###
 
@@ -0,0 +1,221 @@
+import logging
+from . import epdconfig
+from . import refresh
+from . import dirty
+from . import sequence
+from . import trace
+
+logger = logging.getLogger(__name__)
+
+
+class Panel:
+    """Declarative description of one e-Paper panel.
+
+    name       : short name, also used in logs and benchmarks
+    width      : pixels per RAM line (the short side)
+    height     : RAM lines
+    address    : I2C address of the touch controller on the HAT
+    entry_mode : data entry mode (0x11) the init sequences program; bit 1
+                 set means RAM lines are written top to bottom
+    reset_ms   : (high, low, high) durations of the hardware reset pulse
+    busy_poll  : BUSY poll interval in ms when no edge wait is available
+    spi_speed  : SPI clock in Hz or an epdconfig.SPI_PROFILES name, None
+                 for epdconfig.SPI_SPEED_HZ
+    sleep_mode : Deep Sleep Mode (0x10) parameter, 0x01 keeps the RAM,
+                 0x03 does not
+    update     : Display Update Control 2 (0x22) values by name, at least
+                 'full' and 'partial'
+    luts       : waveform tables by name
+    sequences  : sequence.Sequence objects by name, at least 'full_window'
+                 (full-frame RAM window and cursor)
+    """
+
+    def __init__(self, name, width, height, address, entry_mode=0x03, reset_ms=(20, 2, 20),
+                 busy_poll=10, spi_speed=None, sleep_mode=0x01, update=None, luts=None, sequences=None):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.linewidth = (width + 7) // 8
+        self.address = address
+        self.entry_mode = entry_mode
+        self.reset_ms = reset_ms
+        self.busy_poll = busy_poll
+        self.spi_speed = spi_speed
+        self.sleep_mode = sleep_mode
+        self.update = update or {}
+        self.luts = luts or {}
+        self.sequences = sequences or {}
+
+    def __repr__(self):
+        return "Panel(%s, %dx%d)" % (self.name, self.width, self.height)
+
+
+class EPDBase:
+    """Transport, reset, BUSY handling and RAM addressing shared by the
+    drivers. A driver subclass sets PANEL and adds its own init and display
+    methods on top.
+    """
+    PANEL = None
+
+    def __init__(self, panel=None):
+        self.panel = panel or self.PANEL
+        self.reset_pin = epdconfig.EPD_RST_PIN
+        self.dc_pin = epdconfig.EPD_DC_PIN
+        self.busy_pin = epdconfig.EPD_BUSY_PIN
+        self.cs_pin = epdconfig.EPD_CS_PIN
+        self.width = self.panel.width
+        self.height = self.panel.height
+        self.linewidth = self.panel.linewidth
+        self.spi_speed = self.panel.spi_speed      # passed to module_init by init()
+        epdconfig.address = self.panel.address
+        self._fill_buffers = {}
+        self.refresh = refresh.RefreshTracker(self.busy_pin)
+        self.last_frame = None      # what the 0x24 RAM holds, if known
+        self.asleep = False
+
+    # Hardware reset
+    def reset(self):
+        high, low, settle = self.panel.reset_ms
+        epdconfig.digital_write(self.reset_pin, 1)
+        epdconfig.delay_ms(high)
+        epdconfig.digital_write(self.reset_pin, 0)
+        epdconfig.delay_ms(low)
+        epdconfig.digital_write(self.reset_pin, 1)
+        epdconfig.delay_ms(settle)
+        self.asleep = False         # the reset pulse is also what wakes the controller
+
+    def send_command(self, command):
+        epdconfig.digital_write(self.dc_pin, 0)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte([command])
+        epdconfig.digital_write(self.cs_pin, 1)
+
+    def send_data(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_writebyte([data])
+        epdconfig.digital_write(self.cs_pin, 1)
+
+    def send_data2(self, data):
+        epdconfig.digital_write(self.dc_pin, 1)
+        epdconfig.digital_write(self.cs_pin, 0)
+        with trace.span(trace.SPI):
+            epdconfig.spi_write(data)
+        epdconfig.digital_write(self.cs_pin, 1)
+
+    def ReadBusy(self):
+        epdconfig.wait_busy(self.busy_pin, poll_ms=self.panel.busy_poll)      # 0: idle, 1: busy
+
+    def send_sequence(self, name):
+        self.panel.sequences[name].send(self)
+
+    # A batch of commands for this panel, see epdconfig.Transaction
+    def transaction(self):
+        return epdconfig.Transaction(self.dc_pin)
+
+    def SetWindow(self, x_start, y_start, x_end, y_end):
+        with self.transaction() as tx:
+            for command, data in sequence.window(x_start, y_start, x_end, y_end):
+                tx.command(command, data)
+
+    def SetCursor(self, x, y):
+        with self.transaction() as tx:
+            for command, data in sequence.cursor(x, y):
+                tx.command(command, data)
+
+    # Run the update sequence named in panel.update. wait=False returns a
+    # Future that resolves when the refresh is done. Touches traced since
+    # the last refresh are shown by this one.
+    def activate(self, update, wait=True):
+        touches = trace.take_touches()
+        with self.transaction() as tx:
+            tx.command(0x22, [self.panel.update[update]])     # DISPLAY_UPDATE_CONTROL_2
+            tx.command(0x20)                                  # MASTER_ACTIVATION
+        if not wait:
+            future = self.refresh.start()
+            if touches:
+                future.add_done_callback(lambda future: trace.shown(touches))
+            return future
+        self.ReadBusy()
+        trace.shown(touches)
+
+    # Frame-sized buffer of one color, built once per color and reused
+    def _fill_buffer(self, color):
+        buf = self._fill_buffers.get(color)
+        if buf is None:
+            buf = bytes([color]) * (self.linewidth * self.height)
+            self._fill_buffers[color] = buf
+        return buf
+
+    # Steps for the RAM window and cursor of rect (x in bytes, y in frame
+    # lines, both inclusive). Panels that write lines bottom to top get the
+    # rows mirrored.
+    def _region_window(self, rect):
+        x0, y0, x1, y1 = rect
+        if not self.panel.entry_mode & 0x02:
+            y0, y1 = self.height - 1 - y0, self.height - 1 - y1
+        return sequence.window(x0 * 8, y0, x1 * 8, y1) + sequence.cursor(x0, y0)
+
+    # Hooks around display_region: prepare the controller for a partial
+    # refresh, and start it
+    def _partial_begin(self):
+        pass
+
+    def _partial_end(self):
+        return self.activate('partial', wait=False)
+
+    # Partial refresh that only writes the parts of the RAM that changed
+    # since the last frame. bbox (x0, y0, x1, y1) in RAM pixels optionally
+    # limits the diff. Returns a Future that resolves when the refresh is done.
+    def display_region(self, image, bbox=None):
+        if (image == None):
+            return
+        rects = dirty.dirty_rects(self.last_frame, image, self.linewidth, bbox)
+        if not rects:
+            return self.refresh.completed()
+
+        self.refresh.begin()
+        self._partial_begin()
+        # every window, cursor and RAM write in one batch
+        with self.transaction() as tx:
+            for rect in rects:
+                for command, data in self._region_window(rect):
+                    tx.command(command, data)
+                tx.command(0x24, dirty.region_bytes(image, self.linewidth, rect))   # WRITE_RAM
+        # leave the full-frame window behind for display() and friends
+        self.send_sequence('full_window')
+
+        self.last_frame = dirty.apply_rects(self.last_frame, image, self.linewidth, rects)
+        return self._partial_end()
+
+    # Deep sleep once the refresh in flight is done. With wait=False the
+    # sleep is queued behind the refresh instead of blocking the caller.
+    # Returns a Future that resolves once the panel is asleep; reset() (any
+    # init) wakes it.
+    def sleep(self, wait=True):
+        if not wait:
+            return self.refresh.then(self._enter_sleep)
+        self.refresh.begin()
+        self._enter_sleep()
+        return self.refresh.completed()
+
+    def _enter_sleep(self):
+        with self.transaction() as tx:
+            tx.command(0x10, [self.panel.sleep_mode])     # DEEP_SLEEP_MODE
+        self.asleep = True
+        if self.panel.sleep_mode & 0x03 == 0x03:
+            self.last_frame = None
+
+    # Whether the RAM survives deep sleep, so a partial refresh can follow
+    # a wake
+    def retains_ram(self):
+        return self.panel.sleep_mode & 0x03 != 0x03
+
+    # Leave deep sleep with the RAM kept, for the partial refresh path: the
+    # reset pulse ends deep sleep and the partial path sets up the rest
+    def wake_partial(self):
+        self.refresh.begin()
+        self.reset()
+
+    def Dev_exit(self):
+        epdconfig.module_exit()
@@ -27,12 +27,16 @@
 # THE SOFTWARE.
 #
 
-import gpiozero
+import io
+import os
+import sys
 import time
-from smbus import SMBus
-import spidev
 import ctypes
 import logging
+import collections
+from . import trace
+
+logger = logging.getLogger(__name__)
 
 # e-Paper
 EPD_RST_PIN     = 17
@@ -44,97 +48,723 @@ EPD_BUSY_PIN    = 24
 TRST    = 22
 INT     = 27
 
-spi     = spidev.SpiDev(0, 0)
 address = 0x0
 # address = 0x14
 # address = 0x48
-bus     = SMBus(1)
+
+# SPI clock. Panels pick a rate by number or by name from SPI_PROFILES;
+# EPD_SPI_SPEED overrides both. Long ribbon cables may need 'safe'.
+SPI_SPEED_HZ = 10000000
+SPI_PROFILES = {
+    'safe': 2000000,
+    'default': 10000000,
+    'fast': 20000000,       # SSD16xx write cycle limit
+}
+
+
+def spi_speed(speed=None):
+    """Clock rate in Hz for speed: a number, a SPI_PROFILES name or None"""
+    speed = os.environ.get('EPD_SPI_SPEED') or speed
+    if speed is None:
+        return SPI_SPEED_HZ
+    if speed in SPI_PROFILES:
+        return SPI_PROFILES[speed]
+    return int(speed)
 
 
-GPIO_RST_PIN    = gpiozero.LED(EPD_RST_PIN)
-GPIO_DC_PIN     = gpiozero.LED(EPD_DC_PIN)
-# GPIO_CS_PIN     = gpiozero.LED(EPD_CS_PIN)
-GPIO_TRST       = gpiozero.LED(TRST)
+class PinHandle:
+    """An output pin resolved once. write(value) drives it without going
+    through digital_write's pin lookup; keep the handle and call it on hot
+    paths.
+    """
+    __slots__ = ('pin', 'write')
 
-GPIO_BUSY_PIN   = gpiozero.Button(EPD_BUSY_PIN, pull_up = False)
-GPIO_INT        = gpiozero.Button(INT, pull_up = False)
+    def __init__(self, pin, write):
+        self.pin = pin
+        self.write = write
 
 
-def digital_write(pin, value):
-    if pin == EPD_RST_PIN:
+def _no_write(value):
+    pass
+
+
+def _led_writer(led):
+    on, off = led.on, led.off
+
+    def write(value):
         if value:
-            GPIO_RST_PIN.on()
+            on()
         else:
-            GPIO_RST_PIN.off()
-    elif pin == EPD_DC_PIN:
-        if value:
-            GPIO_DC_PIN.on()
+            off()
+    return write
+
+
+class RaspberryPi:
+    # Outputs driven by the library. CS belongs to the SPI driver.
+    OUTPUT_PINS = (EPD_RST_PIN, EPD_DC_PIN, TRST)
+
+    def __init__(self, gpio=None):
+        import gpiozero
+        import spidev
+        try:
+            # smbus2 can do a register read as one combined transaction
+            from smbus2 import SMBus, i2c_msg
+        except ImportError:
+            from smbus import SMBus
+            i2c_msg = None
+
+        self.spi    = spidev.SpiDev(0, 0)
+        self.bus    = SMBus(1)
+        self.i2c_msg = i2c_msg
+
+        # Outputs go through the GPIO character device when it is available
+        # (EPD_GPIO=cdev, the default) and through gpiozero otherwise
+        if gpio is None:
+            gpio = os.environ.get('EPD_GPIO', 'cdev')
+        self.chip = None
+        self.outputs = None
+        if gpio == 'cdev':
+            self.outputs = self._open_chip()
+        if self.outputs is None:
+            self.outputs = dict((pin, gpiozero.LED(pin)) for pin in self.OUTPUT_PINS)
+            self.handles = dict((pin, PinHandle(pin, _led_writer(led))) for pin, led in self.outputs.items())
         else:
-            GPIO_DC_PIN.off()
-    # elif pin == EPD_CS_PIN:
-    #     if value:
-    #         GPIO_CS_PIN.on()
-    #     else:
-    #         GPIO_CS_PIN.off()
-    elif pin == TRST:
-        if value:
-            GPIO_TRST.on()
+            self.handles = dict((pin, PinHandle(pin, line.write)) for pin, line in self.outputs.items())
+
+        self.GPIO_BUSY_PIN   = gpiozero.Button(EPD_BUSY_PIN, pull_up = False)
+        self.GPIO_INT        = gpiozero.Button(INT, pull_up = False)
+
+    def _open_chip(self):
+        from . import gpiochip
+        try:
+            self.chip = gpiochip.GpioChip()
+            return dict((pin, self.chip.output(pin)) for pin in self.OUTPUT_PINS)
+        except OSError as e:
+            logger.info("GPIO character device unavailable (%s), using gpiozero" % e)
+            if self.chip is not None:
+                self.chip.close()
+                self.chip = None
+            return None
+
+    def pin_handle(self, pin):
+        handle = self.handles.get(pin)
+        if handle is None:
+            handle = PinHandle(pin, _no_write)
+        return handle
+
+    def digital_write(self, pin, value):
+        handle = self.handles.get(pin)
+        if handle is not None:
+            handle.write(value)
+
+    def digital_read(self, pin):
+        if pin == EPD_BUSY_PIN:
+            return self.GPIO_BUSY_PIN.value
+        elif pin == INT:
+            return self.GPIO_INT.value
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def wait_for_low(self, pin, timeout):
+        # Block on the falling edge; the Buttons are active high, so low is "released"
+        if pin == EPD_BUSY_PIN:
+            return self.GPIO_BUSY_PIN.wait_for_release(timeout)
+        elif pin == INT:
+            return self.GPIO_INT.wait_for_release(timeout)
+        raise ValueError("pin %d is not an input" % pin)
+
+    def on_low(self, pin, callback):
+        # Call callback() on each falling edge (None removes it); it runs
+        # on gpiozero's event thread
+        if pin == EPD_BUSY_PIN:
+            self.GPIO_BUSY_PIN.when_released = callback
+        elif pin == INT:
+            self.GPIO_INT.when_released = callback
+        else:
+            raise ValueError("pin %d is not an input" % pin)
+
+    def spi_writebyte(self, data):
+        self.spi.writebytes(data)
+
+    def spi_writebyte2(self, data):
+        self.spi.writebytes2(data)
+
+    def i2c_writebyte(self, reg, value):
+        self.bus.write_word_data(address, (reg>>8) & 0xff, (reg & 0xff) | ((value & 0xff) << 8))
+
+    def i2c_write(self, reg):
+        self.bus.write_byte_data(address, (reg>>8) & 0xff, reg & 0xff)
+
+    def i2c_readbyte(self, reg, len):
+        self.i2c_write(reg)
+        rbuf = []
+        for i in range(len):
+            rbuf.append(int(self.bus.read_byte(address)))
+        return rbuf
+
+    def i2c_read_block(self, reg, len):
+        # Register address write and the read in a single I2C transaction
+        # (repeated start), instead of one transaction per byte
+        if self.i2c_msg is None:
+            return bytes(self.i2c_readbyte(reg, len))
+        write = self.i2c_msg.write(address, [(reg>>8) & 0xff, reg & 0xff])
+        read = self.i2c_msg.read(address, len)
+        self.bus.i2c_rdwr(write, read)
+        return bytes(read)
+
+    def module_init(self, speed=None):
+        global SPI_BUFSIZ
+        self.spi.max_speed_hz = spi_speed(speed)
+        self.spi.mode = 0b00
+        try:
+            with io.open('/sys/module/spidev/parameters/bufsiz') as f:
+                SPI_BUFSIZ = int(f.read())
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def module_exit(self):
+        logger.debug("spi end")
+        self.spi.close()
+        self.bus.close()
+
+        logger.debug("close 5V, Module enters 0 power consumption ...")
+        for output in self.outputs.values():
+            output.off()
+            output.close()
+        if self.chip is not None:
+            self.chip.close()
+
+        self.GPIO_BUSY_PIN.close()
+        self.GPIO_INT.close()
+
+
+class Simulator:
+    """In-process model of the HAT: an SSD16xx-class e-Paper controller on SPI
+    and a touch controller register file on I2C.
+
+    The SPI byte stream is decoded like the controller does it: RAM windows,
+    address counters and data entry mode drive writes into the 0x24 (B/W) and
+    0x26 (RED/old) RAM planes. MASTER_ACTIVATION (0x20) holds BUSY high for a
+    time that depends on the DISPLAY_UPDATE_CONTROL_2 (0x22) value and, when
+    the sequence includes a display update, renders the B/W plane into
+    ``frame`` as a PIL image.
+
+    All delays and BUSY times are multiplied by ``time_scale``
+    (EPD_SIM_TIME_SCALE, default 1.0); 0 runs the panel as fast as possible.
+    Rendered frames are also written as PNG files to EPD_SIM_FRAMES if set.
+    """
+
+    # RAM size of the SSD1680 (176 sources x 296 gates)
+    RAM_WIDTH = 176
+    RAM_HEIGHT = 296
+
+    # BUSY time in seconds of a MASTER_ACTIVATION, by update control value
+    UPDATE_TIME = {
+        0xF7: 2.0,    # full refresh
+        0xC7: 2.0,    # full refresh / 4-gray
+        0xFF: 0.5,    # partial refresh (display mode 2)
+        0xCF: 0.5,
+        0x0F: 0.5,
+        0x0C: 0.3,    # fast partial refresh
+        0xC0: 0.1,    # analog power on only
+    }
+    RESET_TIME = 0.01
+    SWRESET_TIME = 0.01
+
+    def __init__(self, time_scale=None):
+        if time_scale is None:
+            time_scale = float(os.environ.get('EPD_SIM_TIME_SCALE', '1.0'))
+        self.time_scale = time_scale
+        self.frame_dir = os.environ.get('EPD_SIM_FRAMES')
+
+        self.pins = {EPD_RST_PIN: 1, EPD_DC_PIN: 0, EPD_CS_PIN: 1, TRST: 1, INT: 1}
+        self.edge_callbacks = {}
+        self.busy_until = 0.0
+        self.ram = {
+            0x24: bytearray([0xFF]) * (self.RAM_WIDTH // 8 * self.RAM_HEIGHT),
+            0x26: bytearray([0xFF]) * (self.RAM_WIDTH // 8 * self.RAM_HEIGHT),
+        }
+        self.registers = bytearray(0x10000)
+        self.i2c_pointer = 0
+        self.frame = None
+        self.reset_stats()
+        self._reset_controller()
+
+    def reset_stats(self):
+        self.spi_calls = 0
+        self.spi_bytes = 0
+        self.gpio_writes = 0
+        self.i2c_transactions = 0
+        self.refreshes = 0
+
+    def _reset_controller(self):
+        self.sleeping = False
+        self.command = None
+        self.params = bytearray()
+        self.entry_mode = 0x03
+        self.gates = self.RAM_HEIGHT
+        self.window = [0, self.RAM_WIDTH // 8 - 1, 0, self.RAM_HEIGHT - 1]
+        self.x = 0
+        self.y = 0
+        self.update_control = 0xF7
+
+    def _busy_for(self, seconds):
+        self.busy_until = max(self.busy_until, time.monotonic() + seconds * self.time_scale)
+
+    def busy(self):
+        return time.monotonic() < self.busy_until
+
+    # ------------------------------------------------------------------ GPIO
+    def digital_write(self, pin, value):
+        self.gpio_writes += 1
+        value = 1 if value else 0
+        if pin == EPD_RST_PIN and value and not self.pins[EPD_RST_PIN]:
+            # rising edge on RST: hardware reset, RAM content is kept
+            self._reset_controller()
+            self._busy_for(self.RESET_TIME)
+        self.pins[pin] = value
+
+    def pin_handle(self, pin):
+        write = self.digital_write
+        return PinHandle(pin, lambda value: write(pin, value))
+
+    def digital_read(self, pin):
+        if pin == EPD_BUSY_PIN:
+            return 1 if self.busy() else 0
+        return self.pins.get(pin, 0)
+
+    def set_pin(self, pin, value):
+        # Drive an input line (e.g. INT) from the outside
+        value = 1 if value else 0
+        falling = self.pins.get(pin, 0) and not value
+        self.pins[pin] = value
+        callback = self.edge_callbacks.get(pin)
+        if falling and callback is not None:
+            callback()
+
+    def on_low(self, pin, callback):
+        if callback is None:
+            self.edge_callbacks.pop(pin, None)
+        else:
+            self.edge_callbacks[pin] = callback
+
+    def delay_ms(self, delaytime):
+        if self.time_scale:
+            time.sleep(delaytime * self.time_scale / 1000.0)
+
+    def wait_for_low(self, pin, timeout):
+        if pin != EPD_BUSY_PIN:
+            raise ValueError("pin %d has no edge wait in the simulator" % pin)
+        remaining = self.busy_until - time.monotonic()
+        if timeout is not None and remaining > timeout:
+            time.sleep(timeout)
+            return False
+        if remaining > 0:
+            time.sleep(remaining)
+        return True
+
+    # ------------------------------------------------------------------- SPI
+    def spi_writebyte(self, data):
+        self._spi_write(data)
+
+    def spi_writebyte2(self, data):
+        self._spi_write(data)
+
+    def _spi_write(self, data):
+        self.spi_calls += 1
+        data = bytes(data)
+        self.spi_bytes += len(data)
+        if self.sleeping:
+            return
+        if self.pins[EPD_DC_PIN]:
+            for byte in data:
+                self._data(byte)
+        else:
+            for byte in data:
+                self._command(byte)
+
+    def _command(self, command):
+        self.command = command
+        self.params = bytearray()
+        if command == 0x12:     # SWRESET
+            self._reset_controller()
+            self._busy_for(self.SWRESET_TIME)
+        elif command == 0x20:   # MASTER_ACTIVATION
+            self._activate()
+
+    def _data(self, byte):
+        command = self.command
+        if command in (0x24, 0x26):
+            self._write_ram(command, byte)
+            return
+        params = self.params
+        params.append(byte)
+        if command == 0x01 and len(params) >= 2:        # driver output control
+            self.gates = (params[0] | (params[1] << 8)) + 1
+        elif command == 0x11 and len(params) == 1:      # data entry mode
+            self.entry_mode = params[0]
+        elif command == 0x44 and len(params) >= 2:      # RAM X window, in bytes
+            self.window[0], self.window[1] = params[0] & 0x3F, params[1] & 0x3F
+        elif command == 0x45 and len(params) >= 4:      # RAM Y window
+            self.window[2] = (params[0] | (params[1] << 8)) & 0x1FF
+            self.window[3] = (params[2] | (params[3] << 8)) & 0x1FF
+        elif command == 0x4E and len(params) == 1:      # RAM X address counter
+            self.x = params[0] & 0x3F
+        elif command == 0x4F and len(params) >= 2:      # RAM Y address counter
+            self.y = (params[0] | (params[1] << 8)) & 0x1FF
+        elif command == 0x22 and len(params) == 1:      # display update control 2
+            self.update_control = params[0]
+        elif command == 0x10 and len(params) == 1:      # deep sleep
+            if params[0] & 0x03:
+                self.sleeping = True
+                if params[0] & 0x03 == 0x03:
+                    # deep sleep mode 2 does not retain RAM
+                    for plane in self.ram.values():
+                        plane[:] = bytes(len(plane))
+
+    def _write_ram(self, command, byte):
+        x, y = self.x, self.y
+        if 0 <= x < self.RAM_WIDTH // 8 and 0 <= y < self.RAM_HEIGHT:
+            self.ram[command][y * (self.RAM_WIDTH // 8) + x] = byte
+        # advance the address counter inside the window, wrapping from the
+        # end address back to the start address (the window registers already
+        # encode the direction, e.g. Y start 249 / end 0 when decrementing)
+        x_start, x_end, y_start, y_end = self.window
+        x_step = 1 if self.entry_mode & 0x01 else -1
+        y_step = 1 if self.entry_mode & 0x02 else -1
+        if self.entry_mode & 0x04:      # Y direction first
+            if y == y_end:
+                y = y_start
+                x = x_start if x == x_end else x + x_step
+            else:
+                y += y_step
+        else:
+            if x == x_end:
+                x = x_start
+                y = y_start if y == y_end else y + y_step
+            else:
+                x += x_step
+        self.x, self.y = x, y
+
+    def _activate(self):
+        control = self.update_control
+        self.refreshes += 1
+        self._busy_for(self.UPDATE_TIME.get(control, 0.5))
+        if control & 0x04:      # the sequence includes a display update
+            self.frame = self.render()
+            if self.frame_dir:
+                self.frame.save(os.path.join(self.frame_dir, 'frame_%05d.png' % self.refreshes))
+
+    def render(self, plane=0x24, width=None):
+        """The given RAM plane as a '1' image of width x gates pixels"""
+        from PIL import Image
+        if width is None:
+            width = (max(self.window[0], self.window[1]) + 1) * 8
+        stride = self.RAM_WIDTH // 8
+        rows = self.ram[plane][:stride * self.gates]
+        image = Image.frombytes('1', (self.RAM_WIDTH, self.gates), bytes(rows))
+        return image.crop((0, 0, width, self.gates))
+
+    # ------------------------------------------------------------------- I2C
+    def i2c_writebyte(self, reg, value):
+        self.i2c_transactions += 1
+        self.registers[reg & 0xFFFF] = value & 0xFF
+
+    def i2c_write(self, reg):
+        self.i2c_transactions += 1
+        self.i2c_pointer = reg & 0xFFFF
+
+    def i2c_readbyte(self, reg, len):
+        self.i2c_write(reg)
+        rbuf = []
+        for i in range(len):
+            self.i2c_transactions += 1
+            rbuf.append(self.registers[(self.i2c_pointer + i) & 0xFFFF])
+        return rbuf
+
+    def i2c_read_block(self, reg, len):
+        self.i2c_transactions += 1
+        self.i2c_pointer = reg & 0xFFFF
+        return bytes(self.registers[(self.i2c_pointer + i) & 0xFFFF] for i in range(len))
+
+    def module_init(self, speed=None):
+        self.speed_hz = spi_speed(speed)
+        return 0
+
+    def module_exit(self):
+        logger.debug("simulator end")
+        for pin in (EPD_RST_PIN, EPD_DC_PIN, TRST):
+            self.pins[pin] = 0
+
+
+# BUSY handling shared by all drivers
+BUSY_TIMEOUT_MS = 30000
+busy_waits = collections.deque(maxlen=256)   # duration of each wait_busy call, in ms
+
+
+def wait_busy(pin=EPD_BUSY_PIN, timeout_ms=BUSY_TIMEOUT_MS, poll_ms=10):
+    """Block until the BUSY line is low (0: idle, 1: busy).
+
+    Waits for the falling edge when the backend supports it and falls back
+    to polling every poll_ms otherwise. Returns False if the panel is still
+    busy after timeout_ms. The duration of every call is appended to
+    busy_waits.
+    """
+    start = time.monotonic()
+    traced = trace.now() if trace.enabled else None
+    released = True
+    if digital_read(pin) == 1:
+        timeout = None if timeout_ms is None else timeout_ms / 1000.0
+        try:
+            released = implementation.wait_for_low(pin, timeout)
+        except Exception as e:
+            logger.debug("edge wait unavailable (%s), polling BUSY" % e)
+            while digital_read(pin) == 1:
+                if timeout is not None and time.monotonic() - start > timeout:
+                    released = False
+                    break
+                delay_ms(poll_ms)
+    elapsed = (time.monotonic() - start) * 1000.0
+    busy_waits.append(elapsed)
+    if traced is not None:
+        trace.add(trace.BUSY, traced)
+    if released:
+        logger.debug("e-Paper busy release after %.1f ms" % elapsed)
+    else:
+        logger.warning("e-Paper still busy after %.0f ms" % elapsed)
+    return released
+
+
+async def wait_busy_async(pin=EPD_BUSY_PIN, timeout_ms=BUSY_TIMEOUT_MS, poll_ms=10):
+    """wait_busy() for asyncio code: runs the blocking wait in the default executor"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, wait_busy, pin, timeout_ms, poll_ms)
+
+
+# spidev's transfer buffer size (read from the module parameter by
+# module_init); longer writes go out in pieces
+SPI_BUFSIZ = 4096
+
+spi_transfers = collections.deque(maxlen=256)    # (bytes, seconds) of each spi_write chunk
+
+
+def as_buffer(data):
+    """data as a flat byte buffer, without a copy unless it is a list or
+    tuple of ints or a non-contiguous array
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    if isinstance(data, (list, tuple)):
+        return bytes(data)
+    view = memoryview(data)
+    if not view.c_contiguous:
+        return view.tobytes()
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+
+def spi_write(data):
+    """Write data (bytes, bytearray, memoryview, NumPy array or list) in
+    SPI_BUFSIZ pieces sliced from a memoryview, timing each one into
+    spi_transfers.
+    """
+    data = as_buffer(data)
+    size = len(data)
+    if size <= SPI_BUFSIZ:
+        chunks = (data,)
+    else:
+        view = memoryview(data)
+        chunks = [view[i:i + SPI_BUFSIZ] for i in range(0, size, SPI_BUFSIZ)]
+    for chunk in chunks:
+        start = time.perf_counter()
+        spi_writebyte2(chunk)
+        spi_transfers.append((len(chunk), time.perf_counter() - start))
+
+
+def spi_stats():
+    """Totals over the recorded spi_write chunks. bytes_per_second against
+    the clock / 8 shows how much of the bus the transfers actually use.
+    """
+    count = len(spi_transfers)
+    size = sum(n for n, _ in spi_transfers)
+    seconds = sum(t for _, t in spi_transfers)
+    return {'transfers': count, 'bytes': size, 'seconds': seconds,
+            'bytes_per_second': size / seconds if seconds else 0.0,
+            'max_ms': max(t for _, t in spi_transfers) * 1000 if count else 0.0}
+
+
+class Transaction:
+    """A batch of e-Paper commands and data, sent as (DC level, bytes) segments.
+
+    command() and data() append to the batch. Bytes at the same DC level are
+    merged into one segment, so a command with its parameters costs two SPI
+    writes and two DC writes however many bytes it has, and consecutive
+    commands or data blocks share one. send() writes each segment with
+    spi_write(); CS is left to the SPI driver, which asserts it around every
+    write. Used as a context manager, the batch is flushed on
+    exit.
+    """
+
+    def __init__(self, dc_pin=EPD_DC_PIN):
+        self.dc_pin = dc_pin
+        self.segments = []
+
+    def _append(self, level, data):
+        data = as_buffer(data)
+        if self.segments and self.segments[-1][0] == level:
+            self.segments[-1][1].extend(data)
         else:
-            GPIO_TRST.off()
+            self.segments.append((level, bytearray(data)))
+
+    def command(self, command, data=b''):
+        self._append(0, (command,))
+        if len(data):
+            self._append(1, data)
+        return self
+
+    def data(self, data):
+        if isinstance(data, int):
+            data = (data,)
+        self._append(1, data)
+        return self
+
+    def extend(self, other):
+        for level, data in other.segments:
+            self._append(level, data)
+        return self
+
+    def send(self):
+        write_dc = pin_handle(self.dc_pin).write
+        with trace.span(trace.SPI):
+            for level, payload in self.segments:
+                write_dc(level)
+                spi_write(payload)
+
+    def flush(self):
+        self.send()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+
+def _replay():
+    from . import touchlog
+    return touchlog.Replay(os.environ['EPD_TOUCH_REPLAY'],
+                           speed=float(os.environ.get('EPD_TOUCH_REPLAY_SPEED', '1.0')) or None)
+
+
+BACKENDS = {
+    'rpi': RaspberryPi,
+    'sim': Simulator,
+    'replay': _replay,      # touch log playback on the simulator
+}
+
+# Functions every backend provides, exported at module level
+FUNCTIONS = ('digital_write', 'pin_handle', 'digital_read', 'delay_ms', 'spi_writebyte',
+             'spi_writebyte2', 'i2c_writebyte', 'i2c_write', 'i2c_readbyte',
+             'i2c_read_block', 'on_low', 'module_init')
 
-def digital_read(pin):
-    if pin == EPD_BUSY_PIN:
-        return GPIO_BUSY_PIN.value
-    elif pin == INT:
-        return GPIO_INT.value
+# Nothing touches the hardware at import. Until open() runs, the module
+# functions are stand-ins that open the default backend on first use and
+# then forward to it; open() replaces them with the backend's own methods.
+implementation = None
 
-def delay_ms(delaytime):
-    time.sleep(delaytime / 1000.0)
 
-def spi_writebyte(data):
-    spi.writebytes(data)
+def _opening(func):
+    def call(*args, **kwargs):
+        open()
+        return getattr(implementation, func)(*args, **kwargs)
+    call.__name__ = func
+    return call
 
-def spi_writebyte2(data):
-    spi.writebytes2(data)
 
-def i2c_writebyte(reg, value):
-    bus.write_word_data(address, (reg>>8) & 0xff, (reg & 0xff) | ((value & 0xff) << 8))
+def _unbind():
+    for func in FUNCTIONS:
+        setattr(sys.modules[__name__], func, _opening(func))
 
-def i2c_write(reg):
-    bus.write_byte_data(address, (reg>>8) & 0xff, reg & 0xff)
 
-def i2c_readbyte(reg, len):
-    i2c_write(reg)
-    rbuf = []
-    for i in range(len):
-        rbuf.append(int(bus.read_byte(address)))
-    return rbuf
+def use_backend(backend):
+    """Select the hardware backend by name ('rpi', 'sim') or instance"""
+    global implementation
+    if isinstance(backend, str):
+        backend = BACKENDS[backend]()
+    implementation = backend
+    for func in FUNCTIONS:
+        setattr(sys.modules[__name__], func, getattr(implementation, func))
+    return implementation
+
+
+def open(backend=None):
+    """Acquire SPI, I2C and the GPIO lines and return the backend.
+
+    backend is a BACKENDS name or instance; by default EPD_BACKEND ('rpi'
+    if unset) is used. The simulator only runs when asked for with
+    EPD_BACKEND=sim: without the hardware libraries 'rpi' raises
+    ImportError. An open module is returned as it is unless another
+    backend is asked for, which closes it first. With EPD_TOUCH_LOG set,
+    the touch reports read are recorded to that file (see
+    touchlog.Recorder).
+    """
+    if implementation is not None:
+        if backend is None or backend is implementation:
+            return implementation
+        # release the SPI, I2C and GPIO handles of the backend replaced
+        close()
+    if backend is None:
+        backend = os.environ.get('EPD_BACKEND', 'rpi')
+    try:
+        opened = use_backend(backend)
+    except ImportError as e:
+        raise ImportError("%s; set EPD_BACKEND=sim to run on the e-Paper simulator" % e) from e
+    touch_log = os.environ.get('EPD_TOUCH_LOG')
+    if touch_log:
+        from . import touchlog
+        opened = use_backend(touchlog.Recorder(opened, touch_log))
+    return opened
+
+
+def close():
+    """Release the hardware. The next call into the module opens it again."""
+    global implementation
+    if implementation is not None:
+        implementation.module_exit()
+    implementation = None
+    _unbind()
+
+
+def is_open():
+    return implementation is not None
 
-def module_init():
-   
-    spi.max_speed_hz = 10000000
-    spi.mode = 0b00
-    
-    return 0
 
 def module_exit():
-    logging.debug("spi end")
-    spi.close()
-    bus.close()
-        
-    logging.debug("close 5V, Module enters 0 power consumption ...")
-    GPIO_RST_PIN.off()
-    GPIO_DC_PIN.off()
-    # GPIO_CS_PIN.off()
-    GPIO_TRST.off()
-
-    GPIO_RST_PIN.close()
-    GPIO_DC_PIN.close()
-    # GPIO_CS_PIN.close()
-    GPIO_TRST.close()
-
-    GPIO_BUSY_PIN.close()
-    GPIO_INT.close()
+    close()
+
+
+class session:
+    """with epdconfig.session() as backend: ... opens the hardware for the
+    block and closes it afterwards, also on errors
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+
+    def __enter__(self):
+        return open(self.backend)
+
+    def __exit__(self, exc_type, exc, tb):
+        close()
+
+
+_unbind()
 
 
 ### END OF FILE ###
@@ -0,0 +1,154 @@
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class FrameHistory:
+    """Sits between an app and an EPD driver and decides how each frame goes out.
+
+    show() compares the packed buffer with the previous one and
+      - skips the refresh entirely if nothing changed,
+      - sends a partial refresh if at most partial_threshold of the bytes
+        changed and the driver supports partial refresh,
+      - sends a full refresh otherwise.
+    The counters skipped / partial / full record what happened.
+    """
+
+    def __init__(self, epd, partial_threshold=0.25):
+        self.epd = epd
+        self.partial_threshold = partial_threshold
+        self.last = None
+        self.skipped = 0
+        self.partial = 0
+        self.full = 0
+
+        # Full refreshes write both RAM planes where the driver can, so the
+        # partial refreshes that follow start from a clean base image
+        self._full = (getattr(epd, 'display_Base', None) or getattr(epd, 'displayPartBaseImage', None)
+                      or epd.display)
+        self._partial = (getattr(epd, 'display_region', None) or getattr(epd, 'displayPartial', None)
+                         or getattr(epd, 'display_Partial', None))
+
+    def changed_fraction(self, buf):
+        """Fraction of bytes in buf that differ from the last frame shown"""
+        if self.last is None or len(buf) != len(self.last):
+            return 1.0
+        new = np.frombuffer(buf, dtype=np.uint8)
+        old = np.frombuffer(self.last, dtype=np.uint8)
+        return np.count_nonzero(new != old) / float(len(new))
+
+    def show(self, buf):
+        """Send buf (from epd.getbuffer) if it differs from the last frame.
+
+        Returns whatever the driver call returned (a Future for partial
+        refreshes), or None when the frame was skipped.
+        """
+        buf = bytes(buf)
+        if buf == self.last:
+            self.skipped += 1
+            return None
+        partial = self._partial is not None and self.last is not None and self.use_partial(buf)
+        self.last = buf
+        if partial:
+            self.partial += 1
+            return self.send_partial(buf)
+        self.full += 1
+        return self.send_full(buf)
+
+    def use_partial(self, buf):
+        return self.changed_fraction(buf) <= self.partial_threshold
+
+    def send_partial(self, buf):
+        return self._partial(buf)
+
+    def send_full(self, buf):
+        return self._full(buf)
+
+    def reset(self):
+        """Forget the last frame, e.g. after the panel was cleared or re-initialized"""
+        self.last = None
+
+    def stats(self):
+        return {'skipped': self.skipped, 'partial': self.partial, 'full': self.full}
+
+
+class RefreshScheduler(FrameHistory):
+    """FrameHistory that also decides when partial refreshes have left enough
+    ghosting behind to need a full base refresh.
+
+    A base refresh (init for full update, base image, back to partial mode)
+    is issued when any budget since the last one runs out:
+        max_partials       : number of partial refreshes
+        max_changed_pixels : pixels flipped by partial refreshes, in total
+                             (default: every pixel of the panel twice)
+        max_seconds        : seconds of wall time since the last base refresh
+    Budgets set to None are not checked. show_base() does a base refresh
+    right away, e.g. when the user asks for one.
+    """
+
+    def __init__(self, epd, max_partials=50, max_changed_pixels=None, max_seconds=3600,
+                 partial_threshold=0.25, clock=time.monotonic):
+        FrameHistory.__init__(self, epd, partial_threshold)
+        if max_changed_pixels is None:
+            max_changed_pixels = 2 * epd.width * epd.height
+        self.max_partials = max_partials
+        self.max_changed_pixels = max_changed_pixels
+        self.max_seconds = max_seconds
+        self.clock = clock
+
+        self.partials_since_base = 0
+        self.changed_pixels = 0
+        self.base_time = clock()
+        self._pending_pixels = 0
+
+    def changed_bits(self, buf):
+        new = np.frombuffer(buf, dtype=np.uint8)
+        old = np.frombuffer(self.last, dtype=np.uint8)
+        return int(np.unpackbits(new ^ old).sum())
+
+    def budget_exhausted(self):
+        if self.max_partials is not None and self.partials_since_base >= self.max_partials:
+            return 'partials'
+        if self.max_changed_pixels is not None and self.changed_pixels >= self.max_changed_pixels:
+            return 'changed pixels'
+        if self.max_seconds is not None and self.clock() - self.base_time >= self.max_seconds:
+            return 'time'
+        return None
+
+    def use_partial(self, buf):
+        if not FrameHistory.use_partial(self, buf):
+            return False
+        reason = self.budget_exhausted()
+        if reason is not None:
+            logger.debug("base refresh: %s budget used up" % reason)
+            return False
+        self._pending_pixels = self.changed_bits(buf)
+        return True
+
+    def send_partial(self, buf):
+        self.partials_since_base += 1
+        self.changed_pixels += self._pending_pixels
+        return FrameHistory.send_partial(self, buf)
+
+    def show_base(self, buf):
+        """Base refresh of buf now, whatever is left of the budgets"""
+        buf = bytes(buf)
+        self.last = buf
+        self.full += 1
+        return self.send_full(buf)
+
+    def send_full(self, buf):
+        epd = self.epd
+        if hasattr(epd, 'displayPartBaseImage'):
+            epd.init(epd.FULL_UPDATE)
+            result = epd.displayPartBaseImage(buf)
+            epd.init(epd.PART_UPDATE)
+        else:
+            epd.init()
+            result = epd.display_Base(buf)
+        self.partials_since_base = 0
+        self.changed_pixels = 0
+        self.base_time = self.clock()
+        return result
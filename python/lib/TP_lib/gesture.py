@@ -0,0 +1,220 @@
+import math
+
+TAP = 'tap'
+DOUBLE_TAP = 'double_tap'
+LONG_PRESS = 'long_press'
+SWIPE = 'swipe'
+PINCH = 'pinch'
+
+
+class Gesture:
+    """A recognized gesture. x, y is where it happened (for a swipe or
+    pinch: where it started), t when it was recognized. Swipes carry
+    direction ('left', 'right', 'up', 'down' in controller coordinates),
+    dx, dy and velocity in px/s; pinches carry scale, the ratio of the
+    final to the initial finger distance.
+    """
+    __slots__ = ('kind', 't', 'x', 'y', 'dx', 'dy', 'velocity', 'direction', 'scale')
+
+    def __init__(self, kind, t, x, y, dx=0, dy=0, velocity=0.0, direction=None, scale=1.0):
+        self.kind = kind
+        self.t = t
+        self.x = x
+        self.y = y
+        self.dx = dx
+        self.dy = dy
+        self.velocity = velocity
+        self.direction = direction
+        self.scale = scale
+
+    def __repr__(self):
+        if self.kind == SWIPE:
+            return "Gesture(swipe %s at %d,%d, %.0f px/s)" % (self.direction, self.x, self.y, self.velocity)
+        if self.kind == PINCH:
+            return "Gesture(pinch x%.2f at %d,%d)" % (self.scale, self.x, self.y)
+        return "Gesture(%s at %d,%d)" % (self.kind, self.x, self.y)
+
+
+class _Pointer:
+    __slots__ = ('t0', 'x0', 'y0', 't', 'x', 'y', 'moved')
+
+    def __init__(self, t, x, y):
+        self.t0 = self.t = t
+        self.x0 = self.x = x
+        self.y0 = self.y = y
+        self.moved = False
+
+
+class GestureRecognizer:
+    """Turns a stream of touch samples into gestures, one sample at a time.
+
+        recognizer = gesture.GestureRecognizer()
+        for g in recognizer.feed(t, [(track_id, x, y), ...]):
+            ...
+        for g in recognizer.tick(now):      # between samples, for long presses
+            ...
+
+    A sample lists every finger on the panel; a finger missing from the
+    next sample has been lifted, and an empty sample lifts them all (the
+    controllers report at most 5 fingers, so each sample is O(1)). A tap
+    is reported as soon as the finger lifts; a second tap close by within
+    double_tap seconds is reported as double_tap as well. A finger held
+    still for long_press seconds is a long press, reported by feed() or
+    tick(). A finger that moved more than swipe_distance px at
+    swipe_velocity px/s or faster is a swipe. Two fingers are a pinch,
+    reported when the first one lifts if the distance between them
+    changed by more than pinch_threshold.
+
+    With release_timeout set, tick() also lifts fingers that have not
+    been reported for that long, for sources that never send an empty
+    report (touch.TouchService with releases=True does send them).
+    """
+
+    def __init__(self, slop=8, long_press=0.6, double_tap=0.35, double_tap_slop=20,
+                 swipe_distance=24, swipe_velocity=80, pinch_threshold=0.15, release_timeout=None):
+        self.slop = slop
+        self.long_press = long_press
+        self.double_tap = double_tap
+        self.double_tap_slop = double_tap_slop
+        self.swipe_distance = swipe_distance
+        self.swipe_velocity = swipe_velocity
+        self.pinch_threshold = pinch_threshold
+        self.release_timeout = release_timeout
+
+        self.pointers = {}
+        self.last_sample = None
+        self._gesture_down = False      # fingers are down for the current gesture
+        self._multi = False             # a second finger joined the current gesture
+        self._pinch_start = None        # (distance, x, y) when the second finger landed
+        self._pinch_distance = None
+        self._long_fired = False
+        self._last_tap = None           # (t, x, y) of the last tap, for double taps
+
+    def feed(self, t, points):
+        """Process one sample: points is a sequence of (track_id, x, y).
+        Returns the gestures it completed (usually none).
+        """
+        gestures = []
+        self.last_sample = t
+        pointers = self.pointers
+        if len(points) < len(pointers) or any(p[0] not in pointers for p in points):
+            # lifts first, so a finger that is replaced counts as up + down
+            present = set(p[0] for p in points)
+            for track_id in [i for i in pointers if i not in present]:
+                self._up(track_id, t, gestures)
+        for track_id, x, y in points:
+            pointer = pointers.get(track_id)
+            if pointer is None:
+                self._down(track_id, t, x, y)
+                continue
+            pointer.t, pointer.x, pointer.y = t, x, y
+            if not pointer.moved and (abs(x - pointer.x0) > self.slop or abs(y - pointer.y0) > self.slop):
+                pointer.moved = True
+        if len(pointers) == 2 and self._pinch_start is not None:
+            a, b = pointers.values()
+            self._pinch_distance = math.hypot(a.x - b.x, a.y - b.y)
+        self._check_long_press(t, gestures)
+        return gestures
+
+    def feed_event(self, event):
+        """feed() with a touch.TouchEvent"""
+        return self.feed(event.time, [(i, p[0], p[1]) for i, p in zip(event.ids, event.points)])
+
+    def tick(self, t):
+        """Gestures that complete by time passing alone"""
+        gestures = []
+        if (self.release_timeout is not None and self.pointers and self.last_sample is not None
+                and t - self.last_sample >= self.release_timeout):
+            for track_id in list(self.pointers):
+                self._up(track_id, self.last_sample, gestures)
+        self._check_long_press(t, gestures)
+        return gestures
+
+    def reset(self):
+        self.pointers.clear()
+        self._gesture_down = self._multi = self._long_fired = False
+        self._pinch_start = self._pinch_distance = self._last_tap = None
+
+    def _down(self, track_id, t, x, y):
+        pointers = self.pointers
+        pointers[track_id] = _Pointer(t, x, y)
+        if not self._gesture_down:
+            self._gesture_down = True
+            self._multi = self._long_fired = False
+            self._pinch_start = self._pinch_distance = None
+        elif len(pointers) == 2 and not self._multi:
+            self._multi = True
+            a, b = pointers.values()
+            distance = math.hypot(a.x - b.x, a.y - b.y)
+            self._pinch_start = (distance, (a.x + b.x) // 2, (a.y + b.y) // 2)
+            self._pinch_distance = distance
+
+    def _up(self, track_id, t, gestures):
+        pointer = self.pointers.pop(track_id)
+        if self._multi:
+            if self._pinch_start is not None:
+                start, x, y = self._pinch_start
+                self._pinch_start = None
+                if start > 0:
+                    scale = self._pinch_distance / start
+                    if abs(scale - 1) > self.pinch_threshold:
+                        gestures.append(Gesture(PINCH, t, x, y, scale=scale))
+        elif not self._long_fired:
+            self._single_up(pointer, t, gestures)
+        if not self.pointers:
+            self._gesture_down = False
+
+    def _single_up(self, pointer, t, gestures):
+        if not pointer.moved:
+            if t - pointer.t0 >= self.long_press:
+                return
+            gestures.append(Gesture(TAP, t, pointer.x0, pointer.y0))
+            last = self._last_tap
+            if (last is not None and pointer.t0 - last[0] <= self.double_tap
+                    and abs(pointer.x0 - last[1]) <= self.double_tap_slop
+                    and abs(pointer.y0 - last[2]) <= self.double_tap_slop):
+                gestures.append(Gesture(DOUBLE_TAP, t, pointer.x0, pointer.y0))
+                self._last_tap = None
+            else:
+                self._last_tap = (t, pointer.x0, pointer.y0)
+            return
+        dx, dy = pointer.x - pointer.x0, pointer.y - pointer.y0
+        distance = math.hypot(dx, dy)
+        duration = max(pointer.t - pointer.t0, 1e-3)
+        velocity = distance / duration
+        if distance >= self.swipe_distance and velocity >= self.swipe_velocity:
+            if abs(dx) >= abs(dy):
+                direction = 'right' if dx > 0 else 'left'
+            else:
+                direction = 'down' if dy > 0 else 'up'
+            gestures.append(Gesture(SWIPE, t, pointer.x0, pointer.y0, dx, dy, velocity, direction))
+
+    def _check_long_press(self, t, gestures):
+        if self._long_fired or self._multi or len(self.pointers) != 1:
+            return
+        for pointer in self.pointers.values():
+            if not pointer.moved and t - pointer.t0 >= self.long_press:
+                self._long_fired = True
+                gestures.append(Gesture(LONG_PRESS, t, pointer.x0, pointer.y0))
+
+
+def replay(trace, recognizer=None, tick=0.05):
+    """Run a recorded trace, a sequence of (t, [(track_id, x, y), ...]),
+    through a recognizer and return every gesture. The recognizer is
+    ticked every tick seconds between samples and once after the last.
+    """
+    if recognizer is None:
+        recognizer = GestureRecognizer()
+    gestures = []
+    last = None
+    for t, points in trace:
+        if last is not None and tick:
+            now = last + tick
+            while now < t:
+                gestures.extend(recognizer.tick(now))
+                now += tick
+        gestures.extend(recognizer.feed(t, points))
+        last = t
+    if last is not None:
+        gestures.extend(recognizer.tick(last + max(recognizer.long_press, recognizer.release_timeout or 0)))
+    return gestures
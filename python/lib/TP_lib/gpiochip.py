@@ -0,0 +1,153 @@
+import os
+import glob
+import fcntl
+import struct
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Linux GPIO character device, uAPI v1 (linux/gpio.h)
+GPIOHANDLES_MAX = 64
+
+GPIOHANDLE_REQUEST_INPUT = 1 << 0
+GPIOHANDLE_REQUEST_OUTPUT = 1 << 1
+
+# struct gpiochip_info { char name[32]; char label[32]; __u32 lines; }
+CHIPINFO_SIZE = 68
+# struct gpiohandle_request { __u32 lineoffsets[64]; __u32 flags;
+#     __u8 default_values[64]; char consumer_label[32]; __u32 lines; int fd; }
+HANDLE_REQUEST_SIZE = 364
+HANDLE_REQUEST_FLAGS = 256
+HANDLE_REQUEST_DEFAULTS = 260
+HANDLE_REQUEST_LABEL = 324
+HANDLE_REQUEST_LINES = 356
+HANDLE_REQUEST_FD = 360
+# struct gpiohandle_data { __u8 values[64]; }
+HANDLE_DATA_SIZE = 64
+
+
+def _IOR(nr, size):
+    return (2 << 30) | (size << 16) | (0xB4 << 8) | nr
+
+
+def _IOWR(nr, size):
+    return (3 << 30) | (size << 16) | (0xB4 << 8) | nr
+
+
+GPIO_GET_CHIPINFO_IOCTL = _IOR(0x01, CHIPINFO_SIZE)
+GPIO_GET_LINEHANDLE_IOCTL = _IOWR(0x03, HANDLE_REQUEST_SIZE)
+GPIOHANDLE_GET_LINE_VALUES_IOCTL = _IOWR(0x08, HANDLE_DATA_SIZE)
+GPIOHANDLE_SET_LINE_VALUES_IOCTL = _IOWR(0x09, HANDLE_DATA_SIZE)
+
+# Labels of the chips that carry the 40-pin header (Pi 1-4, Pi 5)
+HEADER_LABELS = ('pinctrl-bcm2835', 'pinctrl-bcm2711', 'pinctrl-rp1')
+
+
+def chip_label(path, ioctl=fcntl.ioctl):
+    fd = os.open(path, os.O_RDWR)
+    try:
+        info = bytearray(CHIPINFO_SIZE)
+        ioctl(fd, GPIO_GET_CHIPINFO_IOCTL, info, True)
+    finally:
+        os.close(fd)
+    return bytes(info[32:64]).split(b'\0', 1)[0].decode('ascii', 'replace')
+
+
+def find_chip():
+    """Path of the gpiochip with the header pins, EPD_GPIOCHIP if set"""
+    path = os.environ.get('EPD_GPIOCHIP')
+    if path:
+        return path
+    chips = sorted(glob.glob('/dev/gpiochip*'), key=lambda p: int(p[len('/dev/gpiochip'):] or 0))
+    for path in chips:
+        try:
+            if chip_label(path) in HEADER_LABELS:
+                return path
+        except OSError:
+            continue
+    if chips:
+        return chips[0]
+    raise OSError("no /dev/gpiochip device")
+
+
+def _closed(value):
+    raise ValueError("write to a closed GPIO line")
+
+
+class OutputLine:
+    """One requested output line. write() is a single ioctl on the line
+    handle with a prebuilt value buffer. It reads the handle from the line
+    on every call, so a write kept from before close() cannot reach a
+    descriptor the OS has since handed to another file.
+    """
+    __slots__ = ('offset', 'fd', 'write', '_ioctl', '_high', '_low')
+
+    def __init__(self, offset, fd, ioctl):
+        self.offset = offset
+        self.fd = fd
+        self._ioctl = ioctl
+        self._high = bytes([1]) + bytes(HANDLE_DATA_SIZE - 1)
+        self._low = bytes(HANDLE_DATA_SIZE)
+        request, high, low = GPIOHANDLE_SET_LINE_VALUES_IOCTL, self._high, self._low
+        line = self
+
+        def write(value):
+            ioctl(line.fd, request, high if value else low)
+        self.write = write
+
+    def on(self):
+        self.write(1)
+
+    def off(self):
+        self.write(0)
+
+    def read(self):
+        if self.fd is None:
+            raise ValueError("read from a closed GPIO line")
+        data = bytearray(HANDLE_DATA_SIZE)
+        self._ioctl(self.fd, GPIOHANDLE_GET_LINE_VALUES_IOCTL, data, True)
+        return data[0]
+
+    def close(self):
+        if self.fd is not None:
+            self.write = _closed
+            fd, self.fd = self.fd, None
+            os.close(fd)
+
+
+class GpioChip:
+    """A /dev/gpiochip device that hands out OutputLine handles.
+
+    ioctl defaults to fcntl.ioctl; passing another function with the same
+    signature runs the class against a fake chip.
+    """
+
+    def __init__(self, path=None, consumer='TP_lib', ioctl=fcntl.ioctl):
+        self.path = path or find_chip()
+        self.consumer = consumer
+        self.ioctl = ioctl
+        self.fd = os.open(self.path, os.O_RDWR)
+        self.lines = []
+
+    def output(self, offset, value=0):
+        request = bytearray(HANDLE_REQUEST_SIZE)
+        struct.pack_into('I', request, 0, offset)
+        struct.pack_into('I', request, HANDLE_REQUEST_FLAGS, GPIOHANDLE_REQUEST_OUTPUT)
+        request[HANDLE_REQUEST_DEFAULTS] = 1 if value else 0
+        label = self.consumer.encode('ascii')[:31]
+        request[HANDLE_REQUEST_LABEL:HANDLE_REQUEST_LABEL + len(label)] = label
+        struct.pack_into('I', request, HANDLE_REQUEST_LINES, 1)
+        self.ioctl(self.fd, GPIO_GET_LINEHANDLE_IOCTL, request, True)
+        fd = struct.unpack_from('i', request, HANDLE_REQUEST_FD)[0]
+        line = OutputLine(offset, fd, self.ioctl)
+        self.lines.append(line)
+        logger.debug("%s line %d requested as output" % (self.path, offset))
+        return line
+
+    def close(self):
+        for line in self.lines:
+            line.close()
+        self.lines = []
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -1,15 +1,37 @@
+import struct
 import logging
 from . import epdconfig as config
+from . import points
+
+logger = logging.getLogger(__name__)
+
+# Touch report: status byte (0x80 ready, low nibble point count) followed
+# by up to 5 points of 8 bytes (track id, x, y, size little endian, reserved)
+GT_REPORT_REG = 0x814E
+GT_POINT = struct.Struct('<BHHHx')
+GT_POINT_SIZE = GT_POINT.size
+GT_MAX_POINTS = 5
+
+class GT_Point:
+    __slots__ = ('id', 'x', 'y', 's')
+
+    def __init__(self):
+        self.id = self.x = self.y = self.s = 0
+
+    def __repr__(self):
+        return "GT_Point(id=%d, x=%d, y=%d, s=%d)" % (self.id, self.x, self.y, self.s)
 
 class GT_Development:
     def __init__(self):
         self.Touch = 0
         self.TouchpointFlag = 0
         self.TouchCount = 0
-        self.Touchkeytrackid = [0, 1, 2, 3, 4]
-        self.X = [0, 1, 2, 3, 4]
-        self.Y = [0, 1, 2, 3, 4]
-        self.S = [0, 1, 2, 3, 4]
+        # Decoded in place by every scan; the first TouchCount are valid
+        self.Points = [GT_Point() for i in range(GT_MAX_POINTS)]
+        self.Touchkeytrackid = points.PointField(self.Points, 'id')
+        self.X = points.PointField(self.Points, 'x')
+        self.Y = points.PointField(self.Points, 'y')
+        self.S = points.PointField(self.Points, 's')
     
 class GT1151:
     def __init__(self):
@@ -38,47 +60,60 @@ class GT1151:
 
     def GT_Read(self, Reg, len):
         return config.i2c_readbyte(Reg, len)
+
+    def GT_ReadBlock(self, Reg, len):
+        return config.i2c_read_block(Reg, len)
          
     def GT_ReadVersion(self):
         buf = self.GT_Read(0x8140, 4)
-        print(buf)
+        logger.debug("GT1151 version %s" % buf)
 
     def GT_Init(self):
         self.GT_Reset()
         self.GT_ReadVersion()
 
+    def GT_Decode(self, GT_Dev, buf, offset, first, last):
+        # Points first..last-1 from buf at offset, into the preallocated
+        # point slots; nothing is copied or sliced
+        unpack_from = GT_POINT.unpack_from
+        points = GT_Dev.Points
+        for i in range(first, last):
+            point = points[i]
+            point.id, point.x, point.y, point.s = unpack_from(buf, offset)
+            offset += GT_POINT_SIZE
+
     def GT_Scan(self, GT_Dev, GT_Old):
-        buf = []
         mask = 0x00
         
         if(GT_Dev.Touch == 1):
             GT_Dev.Touch = 0
-            buf = self.GT_Read(0x814E, 1)
+            # Status and the first point in one transaction, which is the
+            # whole report for a single touch
+            buf = self.GT_ReadBlock(GT_REPORT_REG, 1 + GT_POINT_SIZE)
             
             if(buf[0]&0x80 == 0x00):
-                self.GT_Write(0x814E, mask)
+                self.GT_Write(GT_REPORT_REG, mask)
                 config.delay_ms(10)
                 
             else:
                 GT_Dev.TouchpointFlag = buf[0]&0x80
                 GT_Dev.TouchCount = buf[0]&0x0f
                 
-                if(GT_Dev.TouchCount > 5 or GT_Dev.TouchCount < 1):
-                    self.GT_Write(0x814E, mask)
+                if(GT_Dev.TouchCount > GT_MAX_POINTS or GT_Dev.TouchCount < 1):
+                    self.GT_Write(GT_REPORT_REG, mask)
                     return
                     
-                buf = self.GT_Read(0x814F, GT_Dev.TouchCount*8)
-                self.GT_Write(0x814E, mask)
+                if(GT_Dev.TouchCount > 1):
+                    rest = self.GT_ReadBlock(GT_REPORT_REG + 1 + GT_POINT_SIZE, (GT_Dev.TouchCount - 1)*GT_POINT_SIZE)
+                self.GT_Write(GT_REPORT_REG, mask)
                 
                 GT_Old.X[0] = GT_Dev.X[0];
                 GT_Old.Y[0] = GT_Dev.Y[0];
                 GT_Old.S[0] = GT_Dev.S[0];
                 
-                for i in range(0, GT_Dev.TouchCount, 1):
-                    GT_Dev.Touchkeytrackid[i] = buf[0 + 8*i] 
-                    GT_Dev.X[i] = (buf[2 + 8*i] << 8) + buf[1 + 8*i]
-                    GT_Dev.Y[i] = (buf[4 + 8*i] << 8) + buf[3 + 8*i]
-                    GT_Dev.S[i] = (buf[6 + 8*i] << 8) + buf[5 + 8*i]
+                self.GT_Decode(GT_Dev, buf, 1, 0, 1)
+                if(GT_Dev.TouchCount > 1):
+                    self.GT_Decode(GT_Dev, rest, 0, 1, GT_Dev.TouchCount)
 
-                print(GT_Dev.X[0], GT_Dev.Y[0], GT_Dev.S[0])
+                logger.debug("touch %d %d %d", GT_Dev.X[0], GT_Dev.Y[0], GT_Dev.S[0])
                 
\ No newline at end of file
@@ -1,5 +1,28 @@
+import struct
 import logging
 from . import epdconfig as config
+from . import points
+
+logger = logging.getLogger(__name__)
+
+# Touch report: point count followed by up to 5 points of 7 bytes
+# (id, x, y little endian, pressure, event id)
+ICNT_REPORT_REG = 0x1001
+ICNT_POINT = struct.Struct('<BHHBB')
+ICNT_POINT_SIZE = ICNT_POINT.size
+ICNT_MAX_POINTS = 5
+# The controller reports mirrored coordinates
+ICNT_X_MAX = 295
+ICNT_Y_MAX = 127
+
+class ICNT_Point:
+    __slots__ = ('id', 'x', 'y', 'p', 'event')
+
+    def __init__(self):
+        self.id = self.x = self.y = self.p = self.event = 0
+
+    def __repr__(self):
+        return "ICNT_Point(id=%d, x=%d, y=%d, p=%d)" % (self.id, self.x, self.y, self.p)
 
 class ICNT_Development:
     def __init__(self):
@@ -7,10 +30,12 @@ class ICNT_Development:
         self.TouchGestureid = 0
         self.TouchCount = 0
         
-        self.TouchEvenid = [0, 1, 2, 3, 4]
-        self.X = [0, 1, 2, 3, 4]
-        self.Y = [0, 1, 2, 3, 4]
-        self.P = [0, 1, 2, 3, 4]
+        # Decoded in place by every scan; the first TouchCount are valid
+        self.Points = [ICNT_Point() for i in range(ICNT_MAX_POINTS)]
+        self.TouchEvenid = points.PointField(self.Points, 'event')
+        self.X = points.PointField(self.Points, 'x')
+        self.Y = points.PointField(self.Points, 'y')
+        self.P = points.PointField(self.Points, 'p')
     
 class INCT86:
     def __init__(self):
@@ -39,51 +64,66 @@ class INCT86:
 
     def ICNT_Read(self, Reg, len):
         return config.i2c_readbyte(Reg, len)
+
+    def ICNT_ReadBlock(self, Reg, len):
+        return config.i2c_read_block(Reg, len)
         
     def ICNT_ReadVersion(self):
         buf = self.ICNT_Read(0x000a, 4)
-        print(buf)
+        logger.debug("ICNT86 version %s" % buf)
 
     def ICNT_Init(self):
         self.ICNT_Reset()
         self.ICNT_ReadVersion()
 
+    def ICNT_Decode(self, ICNT_Dev, buf, offset, first, last):
+        # Points first..last-1 from buf at offset, into the preallocated
+        # point slots; nothing is copied or sliced
+        unpack_from = ICNT_POINT.unpack_from
+        points = ICNT_Dev.Points
+        for i in range(first, last):
+            point = points[i]
+            point.id, x, y, point.p, point.event = unpack_from(buf, offset)
+            point.x = ICNT_X_MAX - x
+            point.y = ICNT_Y_MAX - y
+            offset += ICNT_POINT_SIZE
+
     def ICNT_Scan(self, ICNT_Dev, ICNT_Old):
-        buf = []
         mask = 0x00
         
         if(ICNT_Dev.Touch == 1):
             # ICNT_Dev.Touch = 0
-            buf = self.ICNT_Read(0x1001, 1)
+            # Count and the first point in one transaction, which is the
+            # whole report for a single touch
+            buf = self.ICNT_ReadBlock(ICNT_REPORT_REG, 1 + ICNT_POINT_SIZE)
             
             if(buf[0] == 0x00):
-                self.ICNT_Write(0x1001, mask)
+                self.ICNT_Write(ICNT_REPORT_REG, mask)
                 config.delay_ms(1)
                 # print("buffers status is 0")
                 return
             else:
                 ICNT_Dev.TouchCount = buf[0]
                 
-                if(ICNT_Dev.TouchCount > 5 or ICNT_Dev.TouchCount < 1):
-                    self.ICNT_Write(0x1001, mask)
+                if(ICNT_Dev.TouchCount > ICNT_MAX_POINTS or ICNT_Dev.TouchCount < 1):
+                    self.ICNT_Write(ICNT_REPORT_REG, mask)
                     ICNT_Dev.TouchCount = 0
                     # print("TouchCount number is wrong")
                     return
                     
-                buf = self.ICNT_Read(0x1002, ICNT_Dev.TouchCount*7)
-                self.ICNT_Write(0x1001, mask)
+                if(ICNT_Dev.TouchCount > 1):
+                    rest = self.ICNT_ReadBlock(ICNT_REPORT_REG + 1 + ICNT_POINT_SIZE, (ICNT_Dev.TouchCount - 1)*ICNT_POINT_SIZE)
+                self.ICNT_Write(ICNT_REPORT_REG, mask)
                 
                 ICNT_Old.X[0] = ICNT_Dev.X[0];
                 ICNT_Old.Y[0] = ICNT_Dev.Y[0];
                 ICNT_Old.P[0] = ICNT_Dev.P[0];
                 
-                for i in range(0, ICNT_Dev.TouchCount, 1):
-                    ICNT_Dev.TouchEvenid[i] = buf[6 + 7*i] 
-                    ICNT_Dev.X[i] = 295 - ((buf[2 + 7*i] << 8) + buf[1 + 7*i])
-                    ICNT_Dev.Y[i] = 127 - ((buf[4 + 7*i] << 8) + buf[3 + 7*i])
-                    ICNT_Dev.P[i] = buf[5 + 7*i]
+                self.ICNT_Decode(ICNT_Dev, buf, 1, 0, 1)
+                if(ICNT_Dev.TouchCount > 1):
+                    self.ICNT_Decode(ICNT_Dev, rest, 0, 1, ICNT_Dev.TouchCount)
 
-                print(ICNT_Dev.X[0], ICNT_Dev.Y[0], ICNT_Dev.P[0])
+                logger.debug("touch %d %d %d", ICNT_Dev.X[0], ICNT_Dev.Y[0], ICNT_Dev.P[0])
                 return
         return
                 
\ No newline at end of file
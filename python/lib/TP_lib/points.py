@@ -0,0 +1,44 @@
+class PointField:
+    """List-style view of one field of the decoded touch points: X[i] is
+    Points[i].x. Indexing, slicing, iteration, len() and repr() work as
+    on the lists the drivers used to keep, without copying per report.
+    """
+    __slots__ = ('points', 'name')
+
+    def __init__(self, points, name):
+        self.points = points
+        self.name = name
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [getattr(point, self.name) for point in self.points[i]]
+        return getattr(self.points[i], self.name)
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            points = self.points[i]
+            value = list(value)
+            if len(value) != len(points):
+                raise ValueError("cannot resize a point field")
+            for point, v in zip(points, value):
+                setattr(point, self.name, v)
+            return
+        setattr(self.points[i], self.name, value)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __iter__(self):
+        name = self.name
+        return (getattr(point, name) for point in self.points)
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
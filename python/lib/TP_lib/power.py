@@ -0,0 +1,121 @@
+import time
+import logging
+import threading
+from . import display
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_DRAWS = display.PARTIAL_DRAWS
+
+
+class PowerManager(display.Display):
+    """Keeps a panel in deep sleep between draws.
+
+        epd = power.PowerManager(epd2in13_V4.EPD(), idle_timeout=10)
+        epd.init(epd.FULL_UPDATE)
+        epd.display(buf)        # sleeps 10 s after the last draw
+        ...
+        epd.display(buf)        # wakes the panel first
+
+    A display.Display session that also puts the panel to sleep on its
+    own: init*() calls are remembered and draws wake the panel the same
+    way. The hardware is opened on first use and left open by close().
+
+    Idle panels go to sleep idle_timeout seconds after the last draw,
+    queued behind the refresh in flight. With idle_timeout=None nothing
+    sleeps on its own; check() applies the timeout by hand (timer=False
+    disables the background timer but keeps the timeout).
+
+    Counters: draws, wakes, partial_wakes, sleeps, and awake_seconds
+    (time the controller spent out of deep sleep).
+    """
+
+    def __init__(self, epd, idle_timeout=10.0, timer=True, clock=time.monotonic):
+        display.Display.__init__(self, epd)
+        self.idle_timeout = idle_timeout
+        self.timer = timer
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._timer = None
+        self.last_draw = clock()
+
+        self.draws = 0
+        self.wakes = 0
+        self.partial_wakes = 0
+        self.sleeps = 0
+        self.awake_seconds = 0.0
+        self._awake_since = None
+
+    def _initialize(self, name, args):
+        with self._lock:
+            return display.Display._initialize(self, name, args)
+
+    def _woke(self, how):
+        if self.sleeping:
+            self._awake_since = self.clock()
+        if how != 'init':
+            self.wakes += 1
+            if how == 'partial':
+                self.partial_wakes += 1
+        display.Display._woke(self, how)
+
+    def _draw(self, name, draw, args, kwargs):
+        with self._lock:
+            self.draws += 1
+            result = display.Display._draw(self, name, draw, args, kwargs)
+            self.last_draw = self.clock()
+            self._arm()
+            return result
+
+    def wake(self, wait=True, partial=False):
+        with self._lock:
+            return display.Display.wake(self, wait, partial)
+
+    def sleep(self, wait=False):
+        """Deep sleep now, queued behind the refresh in flight unless wait"""
+        with self._lock:
+            self._cancel()
+            if self.sleeping:
+                return self.epd.refresh.completed()
+            self.sleeps += 1
+            self.awake_seconds += self.clock() - self._awake_since
+            self._awake_since = None
+            logger.debug("panel to deep sleep")
+            return display.Display.sleep(self, wait)
+
+    def check(self):
+        """Sleep if the panel has been idle for idle_timeout. Returns True
+        if it was put to sleep.
+        """
+        with self._lock:
+            if (not self.sleeping and self.idle_timeout is not None
+                    and self.clock() - self.last_draw >= self.idle_timeout):
+                self.sleep()
+                return True
+            return False
+
+    def _arm(self):
+        self._cancel()
+        if self.timer and self.idle_timeout is not None:
+            self._timer = threading.Timer(self.idle_timeout, self.check)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def stats(self):
+        with self._lock:
+            awake = self.awake_seconds
+            if self._awake_since is not None:
+                awake += self.clock() - self._awake_since
+            return {'draws': self.draws, 'wakes': self.wakes, 'partial_wakes': self.partial_wakes,
+                    'sleeps': self.sleeps, 'awake_seconds': awake}
+
+    def close(self):
+        """Cancel the idle timer and put the panel to sleep"""
+        with self._lock:
+            self._cancel()
+            display.Display.close(self)
@@ -9,7 +9,19 @@ fontdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../pic')
 # Search lib folder for display driver modules
 sys.path.append('lib')
 from . import epd2in9_V2
-epd = epd2in9_V2.EPD_2IN9_V2()
+from . import display
+from . import frames
+from . import scene
+# The driver is created on first use; importing this module touches no hardware
+epd = None
+
+
+def get_epd():
+    global epd
+    if epd is None:
+        epd = epd2in9_V2.EPD_2IN9_V2()
+    return epd
+
 
 from datetime import datetime
 import time
@@ -195,45 +207,57 @@ def update_data():
     for thread in threads:
         thread.join()
 
-def create_display_image():
-    """Create the display image with all the data"""
-    # Create a new image with white background
-    image = Image.new('1', (epd.height, epd.width), 255)
-    draw = ImageDraw.Draw(image)
-    
-    # Draw header
-    draw.rectangle((0, 0, 295, 30), fill=black)
-    draw.text((10, 5), 'REAL-TIME DATA DISPLAY', font=font20_Roboto_Bold, fill=white)
-    
-    # Draw time and date
-    draw.text((10, 35), f"Time: {current_data['time']}", font=font16, fill=black)
-    draw.text((10, 55), f"Date: {current_data['date']}", font=font16, fill=black)
-    
-    # Draw crypto price
-    draw.text((10, 80), f"Bitcoin: {current_data['crypto_price']}", font=font16, fill=black)
-    
-    # Draw stock price
-    draw.text((10, 100), f"AAPL Stock: {current_data['stock_price']}", font=font16, fill=black)
-    
-    # Draw weather
-    draw.text((10, 120), f"Weather: {current_data['weather_temp']} - {current_data['weather_desc']}", font=font16, fill=black)
-    
-    # Draw IP location
-    draw.text((10, 140), f"Location: {current_data['ip_info']}", font=font16, fill=black)
+# The screen is built once; each update only redraws the lines that changed
+screen = None
+lines = {}
+
+
+def create_scene():
+    """Create the retained screen layout"""
+    epd = get_epd()
+    layout = scene.Scene((epd.height, epd.width))
     
-    # Draw joke
-    draw.text((10, 160), f"Joke: {current_data['joke']}", font=font12, fill=black)
+    # Header
+    layout.add(scene.Rect(bbox=(0, 0, 295, 30), fill=black))
+    layout.add(scene.Text(xy=(10, 5), text='REAL-TIME DATA DISPLAY', font=font20_Roboto_Bold, fill=white))
     
-    # Draw quote
-    draw.text((10, 180), f"Quote: {current_data['quote']}", font=font12, fill=black)
+    # Time and date, crypto and stock price, weather, IP location, joke,
+    # quote and last update time
+    for name, xy, font in (('time', (10, 35), font16),
+                           ('date', (10, 55), font16),
+                           ('crypto_price', (10, 80), font16),
+                           ('stock_price', (10, 100), font16),
+                           ('weather', (10, 120), font16),
+                           ('ip_info', (10, 140), font16),
+                           ('joke', (10, 160), font12),
+                           ('quote', (10, 180), font12),
+                           ('last_update', (10, 200), font12)):
+        lines[name] = layout.add(scene.Text(xy=xy, text='', font=font, fill=black))
+    return layout
+
+def create_display_image():
+    """Create the display image with all the data"""
+    global screen
+    if screen is None:
+        screen = create_scene()
     
-    # Draw last update time
-    draw.text((10, 200), f"Last Update: {current_data['last_update']}", font=font12, fill=black)
+    lines['time'].set(text=f"Time: {current_data['time']}")
+    lines['date'].set(text=f"Date: {current_data['date']}")
+    lines['crypto_price'].set(text=f"Bitcoin: {current_data['crypto_price']}")
+    lines['stock_price'].set(text=f"AAPL Stock: {current_data['stock_price']}")
+    lines['weather'].set(text=f"Weather: {current_data['weather_temp']} - {current_data['weather_desc']}")
+    lines['ip_info'].set(text=f"Location: {current_data['ip_info']}")
+    lines['joke'].set(text=f"Joke: {current_data['joke']}")
+    lines['quote'].set(text=f"Quote: {current_data['quote']}")
+    lines['last_update'].set(text=f"Last Update: {current_data['last_update']}")
     
-    return image
+    # Re-rasterize only the lines whose text changed
+    screen.render()
+    return screen.image
 
 def display_error(error_source):
     """Display an error message"""
+    epd = get_epd()
     print(f'Error in the {error_source} request.')
     error_image = Image.new('1', (epd.height, epd.width), 255)
     draw = ImageDraw.Draw(error_image)
@@ -253,20 +277,27 @@ def display_error(error_source):
 
 def run_real_time_display():
     """Main function to run the real-time display"""
+    epd = get_epd()
     print("Starting Real-Time Display...")
     
-    # Initialize the display
-    epd.init()
+    # Initialize the display; closing the session puts it to sleep and releases the pins
+    session = display.Display(epd).open()
     epd.Clear()
     
+    # Only the windows that changed go out, with a partial refresh when few
+    # did and a base refresh once the partial refreshes have left too much
+    # ghosting
+    history = frames.RefreshScheduler(epd)
+    
     try:
         while True:
             print("Updating data...")
             update_data()
             
-            # Create and display the image
+            # Create and display the image; an unchanged screen is not even packed
             image = create_display_image()
-            epd.display(epd.getbuffer(image))
+            if screen.rendered:
+                history.show(epd.getbuffer(image))
             
             print(f"Display updated at {current_data['last_update']}")
             
@@ -279,7 +310,7 @@ def run_real_time_display():
         print(f"Error: {e}")
         display_error('SYSTEM')
     finally:
-        epd.module_exit()
+        session.close()
 
 if __name__ == "__main__":
     run_real_time_display() 
\ No newline at end of file
@@ -0,0 +1,74 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from . import epdconfig
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshInFlight(RuntimeError):
+    """A new frame was sent while the panel was still refreshing"""
+
+
+class RefreshTracker:
+    """Tracks the panel refresh that runs after MASTER_ACTIVATION.
+
+    start() returns a concurrent.futures.Future that resolves once BUSY
+    drops (True) or the wait times out (False). begin() is called before a
+    driver touches the panel again: with policy 'queue' it waits for the
+    refresh in flight, with policy 'reject' it raises RefreshInFlight.
+    """
+    QUEUE = 'queue'
+    REJECT = 'reject'
+
+    def __init__(self, busy_pin, policy=QUEUE):
+        self.busy_pin = busy_pin
+        self.policy = policy
+        self.pending = None
+        self._executor = None
+        self._local = threading.local()
+
+    def busy(self):
+        return self.pending is not None and not self.pending.done()
+
+    def begin(self):
+        if not self.busy() or getattr(self._local, 'queued', False):
+            return
+        if self.policy == self.REJECT:
+            raise RefreshInFlight("e-Paper refresh still in progress")
+        logger.debug("waiting for the refresh in flight")
+        self.pending.result()
+
+    def _submit(self, func, *args):
+        if self._executor is None:
+            # one worker: refreshes complete in the order they were started
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='epd-busy')
+        self.pending = self._executor.submit(func, *args)
+        return self.pending
+
+    def start(self):
+        return self._submit(epdconfig.wait_busy, self.busy_pin)
+
+    def then(self, func, *args):
+        """Run func(*args) after the refresh in flight (and anything queued
+        before it). Driver calls made meanwhile wait for it in begin().
+        Returns a Future with func's result.
+        """
+        def queued():
+            self._local.queued = True
+            try:
+                return func(*args)
+            finally:
+                self._local.queued = False
+        return self._submit(queued)
+
+    def completed(self):
+        # A resolved Future, for calls that had nothing to refresh
+        future = Future()
+        future.set_result(True)
+        return future
+
+    def wait(self, timeout=None):
+        if self.pending is not None:
+            return self.pending.result(timeout)
+        return True
@@ -0,0 +1,146 @@
+class Frame:
+    """The coordinates of a screen drawn rotated on the panel.
+
+    width, height is the size of the screen as drawn, rotate the quarter
+    turns the drivers' getbuffer() apply to it: 90 is the landscape
+    layout (a width x height image on a panel height pixels wide), the
+    point (x, y) of which is touched at (y, width - 1 - x).
+    """
+
+    def __init__(self, width, height, rotate=0):
+        if rotate not in (0, 90, 180, 270):
+            raise ValueError("rotate must be 0, 90, 180 or 270, not %r" % rotate)
+        self.width = width
+        self.height = height
+        self.rotate = rotate
+
+    def to_touch(self, x, y):
+        rotate = self.rotate
+        if rotate == 0:
+            return x, y
+        if rotate == 90:
+            return y, self.width - 1 - x
+        if rotate == 180:
+            return self.width - 1 - x, self.height - 1 - y
+        return self.height - 1 - y, x
+
+    def from_touch(self, x, y):
+        rotate = self.rotate
+        if rotate == 0:
+            return x, y
+        if rotate == 90:
+            return self.width - 1 - y, x
+        if rotate == 180:
+            return self.width - 1 - x, self.height - 1 - y
+        return y, self.height - 1 - x
+
+    def bbox_to_touch(self, bbox):
+        x0, y0, x1, y1 = bbox
+        ax, ay = self.to_touch(x0, y0)
+        bx, by = self.to_touch(x1 - 1, y1 - 1)
+        return min(ax, bx), min(ay, by), max(ax, bx) + 1, max(ay, by) + 1
+
+
+class Region:
+    """A named touch target. bbox is (x0, y0, x1, y1) in its frame,
+    x0 <= x < x1 and y0 <= y < y1; touch_bbox the same in touch
+    controller coordinates.
+    """
+    __slots__ = ('name', 'bbox', 'handler', 'frame', 'touch_bbox')
+
+    def __init__(self, name, bbox, handler=None, frame=None):
+        self.name = name
+        self.bbox = tuple(bbox)
+        self.handler = handler
+        self.frame = frame
+        self.touch_bbox = frame.bbox_to_touch(self.bbox) if frame is not None else self.bbox
+
+    def __repr__(self):
+        return "Region(%r, %r)" % (self.name, self.bbox)
+
+
+class RegionMap:
+    """The touch regions of one page or screen.
+
+        menu = regions.RegionMap(epd.width, epd.height, [
+            ('photo', (30, 57, 92, 95)),
+            ('draw', (30, 154, 92, 193)),
+        ])
+        menu.name_at(x, y)          # 'photo', 'draw' or None
+
+    width, height is the touch area. Regions are indexed in a grid of
+    cell x cell pixel buckets, so a lookup only looks at the few regions
+    overlapping the touched cell, however many the page has. Where
+    regions overlap, the one added first wins, like the first branch of
+    an if/elif chain.
+
+    frame (a Frame) is the default coordinate frame of the regions
+    added; hit() and dispatch() take touch controller coordinates.
+    """
+
+    def __init__(self, width, height, regions=(), frame=None, cell=16):
+        self.width = width
+        self.height = height
+        self.frame = frame
+        self.cell = cell
+        self.cols = -(-width // cell)
+        self.rows = -(-height // cell)
+        self.buckets = [[] for i in range(self.cols * self.rows)]
+        self.regions = []
+        for region in regions:
+            self.add(*region)
+
+    def _cells(self, region):
+        x0, y0, x1, y1 = region.touch_bbox
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.width), min(y1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return []
+        cell, cols = self.cell, self.cols
+        return [row * cols + col
+                for row in range(y0 // cell, (y1 - 1) // cell + 1)
+                for col in range(x0 // cell, (x1 - 1) // cell + 1)]
+
+    def add(self, name, bbox, handler=None, frame=None):
+        """Add a region; handler(region, x, y) is called by dispatch()
+        with the touch in the region's frame.
+        """
+        region = Region(name, bbox, handler, frame or self.frame)
+        self.regions.append(region)
+        for index in self._cells(region):
+            self.buckets[index].append(region)
+        return region
+
+    def remove(self, name):
+        keep = []
+        for region in self.regions:
+            if region.name != name:
+                keep.append(region)
+                continue
+            for index in self._cells(region):
+                self.buckets[index].remove(region)
+        self.regions = keep
+
+    def hit(self, x, y):
+        """The region at touch point x, y, or None"""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        cell = self.cell
+        for region in self.buckets[(y // cell) * self.cols + x // cell]:
+            x0, y0, x1, y1 = region.touch_bbox
+            if x0 <= x < x1 and y0 <= y < y1:
+                return region
+        return None
+
+    def name_at(self, x, y, default=None):
+        region = self.hit(x, y)
+        return region.name if region is not None else default
+
+    def dispatch(self, x, y):
+        """Call the handler of the region at x, y. Returns the region."""
+        region = self.hit(x, y)
+        if region is not None and region.handler is not None:
+            if region.frame is not None:
+                x, y = region.frame.from_touch(x, y)
+            region.handler(region, x, y)
+        return region
@@ -0,0 +1,230 @@
+import hashlib
+from PIL import Image as PILImage, ImageDraw
+
+
+# for measuring text without an image of its own
+_measure = ImageDraw.Draw(PILImage.new('1', (1, 1)))
+
+
+def _union(a, b):
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class Widget:
+    """Something drawn at a fixed place in a Scene.
+
+    bounds() is the box (x0, y0, x1, y1), x1 and y1 exclusive, the widget
+    paints; key() everything its pixels depend on. Attributes are changed
+    with set(), which marks the old and new bounds dirty when the key
+    changed and does nothing otherwise.
+    """
+    FIELDS = ()
+
+    def __init__(self, **attrs):
+        self.scene = None
+        for name in self.FIELDS:
+            setattr(self, name, attrs.pop(name, getattr(type(self), name, None)))
+        if attrs:
+            raise TypeError("%s has no attribute %s" % (type(self).__name__, ', '.join(attrs)))
+        self._bounds = self.bounds()
+        self._key = self.key()
+
+    def key(self):
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def bounds(self):
+        raise NotImplementedError
+
+    def paint(self, image, draw, dx, dy):
+        """Paint into image (draw is an ImageDraw of it), moved by dx, dy"""
+        raise NotImplementedError
+
+    def set(self, **attrs):
+        for name, value in attrs.items():
+            if name not in self.FIELDS:
+                raise TypeError("%s has no attribute %s" % (type(self).__name__, name))
+            setattr(self, name, value)
+        key = self.key()
+        if key == self._key:
+            return False
+        old = self._bounds
+        self._key = key
+        self._bounds = self.bounds()
+        if self.scene is not None:
+            self.scene.invalidate(old)
+            self.scene.invalidate(self._bounds)
+        return True
+
+
+class Rect(Widget):
+    """draw.rectangle() of bbox (x0, y0, x1, y1), both corners inclusive"""
+    FIELDS = ('bbox', 'fill', 'outline', 'width')
+    width = 1
+
+    def bounds(self):
+        x0, y0, x1, y1 = self.bbox
+        return x0, y0, x1 + 1, y1 + 1
+
+    def paint(self, image, draw, dx, dy):
+        x0, y0, x1, y1 = self.bbox
+        draw.rectangle((x0 + dx, y0 + dy, x1 + dx, y1 + dy), fill=self.fill, outline=self.outline, width=self.width)
+
+
+class Ellipse(Rect):
+    """draw.ellipse() in bbox"""
+
+    def paint(self, image, draw, dx, dy):
+        x0, y0, x1, y1 = self.bbox
+        draw.ellipse((x0 + dx, y0 + dy, x1 + dx, y1 + dy), fill=self.fill, outline=self.outline, width=self.width)
+
+
+class Text(Widget):
+    """draw.text() of text at xy. Bounds come from the font's glyph boxes,
+    so a changing clock only dirties the digits' box.
+    """
+    FIELDS = ('xy', 'text', 'font', 'fill', 'anchor')
+    fill = 0
+
+    def key(self):
+        # fonts compare by identity; keep one font object per size around
+        return (self.xy, self.text, id(self.font), self.fill, self.anchor)
+
+    def bounds(self):
+        if not self.text:
+            x, y = self.xy
+            return x, y, x, y
+        return _measure.textbbox(self.xy, self.text, font=self.font, anchor=self.anchor)
+
+    def paint(self, image, draw, dx, dy):
+        x, y = self.xy
+        draw.text((x + dx, y + dy), self.text, font=self.font, fill=self.fill, anchor=self.anchor)
+
+
+class Bitmap(Widget):
+    """A PIL image pasted at xy. Its pixels are hashed once per set(image=...)."""
+    FIELDS = ('xy', 'image')
+
+    def key(self):
+        image = self.image
+        if getattr(self, '_hashed', None) is not image:
+            self._hashed = image
+            self._digest = hashlib.sha1(image.tobytes()).digest() + repr((image.mode, image.size)).encode()
+        return (self.xy, self._digest)
+
+    def bounds(self):
+        x, y = self.xy
+        return x, y, x + self.image.size[0], y + self.image.size[1]
+
+    def paint(self, image, draw, dx, dy):
+        x, y = self.xy
+        bitmap = self.image
+        if bitmap.mode != image.mode:
+            bitmap = bitmap.convert(image.mode)
+        image.paste(bitmap, (x + dx, y + dy))
+
+
+class Icon(Bitmap):
+    """A Bitmap loaded from an image file; each file is read once"""
+    FIELDS = ('xy', 'path')
+    _cache = {}
+
+    def key(self):
+        return (self.xy, self.path)
+
+    @property
+    def image(self):
+        image = Icon._cache.get(self.path)
+        if image is None:
+            image = PILImage.open(self.path)
+            image.load()
+            Icon._cache[self.path] = image
+        return image
+
+
+class Scene:
+    """Retained widgets on an image that render() keeps up to date by
+    re-rasterizing only the regions whose widgets changed.
+
+        screen = scene.Scene((epd.height, epd.width))
+        clock = screen.add(scene.Text(xy=(10, 50), text='', font=font40))
+        ...
+        clock.set(text=time.strftime('%H:%M:%S'))
+        if screen.render():                 # the boxes redrawn, [] if none
+            epd.display_region(epd.getbuffer(screen.image))
+
+    Widgets paint in the order they were added. A dirty box is cleared to
+    background and every widget overlapping it is drawn again clipped to
+    the box, so the result is the same as drawing the whole scene.
+    Overlapping dirty boxes are merged before drawing.
+    """
+
+    def __init__(self, size, mode='1', background=255):
+        self.size = size
+        self.mode = mode
+        self.background = background
+        self.image = PILImage.new(mode, size, background)
+        self.widgets = []
+        self.dirty = [(0, 0, size[0], size[1])]
+        self.rendered = []          # boxes redrawn by the last render()
+        self.redrawn = 0            # widget draws since creation
+
+    def add(self, widget):
+        if widget.scene is not None:
+            raise ValueError("widget is already in a scene")
+        widget.scene = self
+        self.widgets.append(widget)
+        self.invalidate(widget._bounds)
+        return widget
+
+    def remove(self, widget):
+        self.widgets.remove(widget)
+        widget.scene = None
+        self.invalidate(widget._bounds)
+
+    def invalidate(self, box=None):
+        """Mark box (all of the image by default) for redrawing"""
+        width, height = self.size
+        if box is None:
+            box = (0, 0, width, height)
+        box = (max(box[0], 0), max(box[1], 0), min(box[2], width), min(box[3], height))
+        if box[0] >= box[2] or box[1] >= box[3]:
+            return
+        # merge with every box it touches, until none do
+        merged = True
+        while merged:
+            merged = False
+            for other in self.dirty:
+                if _overlaps(box, other) or box == other:
+                    self.dirty.remove(other)
+                    box = _union(box, other)
+                    merged = True
+                    break
+        self.dirty.append(box)
+
+    def render(self):
+        """Redraw the dirty regions into image. Returns the boxes redrawn."""
+        boxes, self.dirty = self.dirty, []
+        for box in boxes:
+            x0, y0, x1, y1 = box
+            tile = PILImage.new(self.mode, (x1 - x0, y1 - y0), self.background)
+            draw = ImageDraw.Draw(tile)
+            for widget in self.widgets:
+                if _overlaps(widget._bounds, box):
+                    widget.paint(tile, draw, -x0, -y0)
+                    self.redrawn += 1
+            self.image.paste(tile, (x0, y0))
+        self.rendered = boxes
+        return boxes
+
+    def bbox(self):
+        """Union of the boxes redrawn by the last render(), or None"""
+        if not self.rendered:
+            return None
+        box = self.rendered[0]
+        for other in self.rendered[1:]:
+            box = _union(box, other)
+        return box
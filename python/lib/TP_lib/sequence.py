@@ -0,0 +1,88 @@
+import time
+import logging
+import collections
+from . import epdconfig
+
+logger = logging.getLogger(__name__)
+
+BUSY = None     # step command that waits for BUSY instead of sending anything
+
+# sequence name -> durations (ms) of the most recent sends
+timings = {}
+
+
+class Sequence:
+    """A fixed list of controller commands, compiled once and replayed.
+
+    steps is a list of (command, payload) pairs; payload is anything bytes()
+    accepts and may be empty. (BUSY, b'') waits for the panel. The steps
+    between two BUSY waits are compiled into one epdconfig.Transaction, so
+    a run of commands costs one SPI write per DC level change instead of
+    one per byte. send() records how long it took in timings[name].
+    """
+
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = tuple((command, bytes(payload)) for command, payload in steps)
+        self.batches = []       # epdconfig.Transaction objects and BUSY marks
+        batch = None
+        for command, payload in self.steps:
+            if command is BUSY:
+                self.batches.append(BUSY)
+                batch = None
+                continue
+            if batch is None:
+                batch = epdconfig.Transaction()
+                self.batches.append(batch)
+            batch.command(command, payload)
+
+    def __add__(self, other):
+        return Sequence(self.name, self.steps + other.steps)
+
+    def transfers(self):
+        """Number of SPI writes one send() costs (below SPI_BUFSIZ per segment)"""
+        return sum(len(batch.segments) for batch in self.batches if batch is not BUSY)
+
+    def send(self, epd):
+        start = time.perf_counter()
+        for batch in self.batches:
+            if batch is BUSY:
+                epd.ReadBusy()
+            else:
+                batch.send()
+        elapsed = (time.perf_counter() - start) * 1000
+        if self.name not in timings:
+            timings[self.name] = collections.deque(maxlen=64)
+        timings[self.name].append(elapsed)
+
+
+def window(x_start, y_start, x_end, y_end):
+    # x point must be the multiple of 8 or the last 3 bits will be ignored
+    return [(0x44, [(x_start >> 3) & 0xFF, (x_end >> 3) & 0xFF]),
+            (0x45, [y_start & 0xFF, (y_start >> 8) & 0xFF, y_end & 0xFF, (y_end >> 8) & 0xFF])]
+
+
+def cursor(x, y):
+    return [(0x4E, [x & 0xFF]),
+            (0x4F, [y & 0xFF, (y >> 8) & 0xFF])]
+
+
+def lut(table):
+    """Steps for a 159-byte SSD1680 waveform table: LUT, EOPT and voltages"""
+    return [(0x32, table[:153]),
+            (BUSY, b''),
+            (0x3f, table[153:154]),
+            (0x03, table[154:155]),      # gate voltage
+            (0x04, table[155:158]),      # source voltage VSH, VSH2, VSL
+            (0x2c, table[158:159])]      # VCOM
+
+
+def summary():
+    """{name: {'count', 'mean_ms', 'max_ms'}} over the recorded sends"""
+    result = {}
+    for name, durations in timings.items():
+        if durations:
+            result[name] = {'count': len(durations),
+                            'mean_ms': sum(durations) / len(durations),
+                            'max_ms': max(durations)}
+    return result
@@ -13,11 +13,23 @@ fontdir = os.path.join(current_dir, '../../pic')
 
 # Import the display driver
 from TP_lib import epd2in9_V2
-epd = epd2in9_V2.EPD_2IN9_V2()
+from TP_lib import frames
+from TP_lib import display
+from TP_lib import scene
+# The driver is created on first use; importing this module touches no hardware
+epd = None
+
+
+def get_epd():
+    global epd
+    if epd is None:
+        epd = epd2in9_V2.EPD_2IN9_V2()
+    return epd
+
 
 from datetime import datetime
 import time
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageFont
 import requests
 import json
 import psutil
@@ -120,52 +132,73 @@ def update_data():
     for thread in threads:
         thread.join()
 
+# The screen is built once; each update only redraws the lines that changed
+screen = None
+lines = {}
+
+
+def create_scene():
+    """Create the retained screen layout"""
+    epd = get_epd()
+    layout = scene.Scene((epd.height, epd.width))
+    
+    # Header
+    layout.add(scene.Rect(bbox=(0, 0, 295, 40), fill=black))
+    layout.add(scene.Text(xy=(10, 8), text='REAL-TIME MONITOR', font=font24, fill=white))
+    
+    # Time (large and prominent), Bitcoin price, weather, system info and
+    # update indicator
+    for name, xy, font in (('time', (10, 50), font40),
+                           ('bitcoin_price', (10, 100), font24),
+                           ('weather_temp', (10, 130), font24),
+                           ('cpu_usage', (10, 160), font20),
+                           ('memory_usage', (10, 180), font20),
+                           ('uptime', (10, 200), font20),
+                           ('updated', (10, 220), font16)):
+        lines[name] = layout.add(scene.Text(xy=xy, text='', font=font, fill=black))
+    return layout
+
 def create_display():
     """Create the display image"""
-    # Create image with white background
-    image = Image.new('1', (epd.height, epd.width), 255)
-    draw = ImageDraw.Draw(image)
-    
-    # Draw header
-    draw.rectangle((0, 0, 295, 40), fill=black)
-    draw.text((10, 8), 'REAL-TIME MONITOR', font=font24, fill=white)
-    
-    # Draw time (large and prominent)
-    draw.text((10, 50), f"TIME: {data['time']}", font=font40, fill=black)
-    
-    # Draw Bitcoin price
-    draw.text((10, 100), f"Bitcoin: {data['bitcoin_price']}", font=font24, fill=black)
-    
-    # Draw weather
-    draw.text((10, 130), f"Weather: {data['weather_temp']}", font=font24, fill=black)
-    
-    # Draw system info
-    draw.text((10, 160), f"CPU: {data['cpu_usage']}", font=font20, fill=black)
-    draw.text((10, 180), f"RAM: {data['memory_usage']}", font=font20, fill=black)
-    draw.text((10, 200), f"Uptime: {data['uptime']}", font=font20, fill=black)
-    
-    # Draw update indicator
-    draw.text((10, 220), f"Updated: {datetime.now().strftime('%H:%M:%S')}", font=font16, fill=black)
-    
-    return image
+    global screen
+    if screen is None:
+        screen = create_scene()
+    
+    lines['time'].set(text=f"TIME: {data['time']}")
+    lines['bitcoin_price'].set(text=f"Bitcoin: {data['bitcoin_price']}")
+    lines['weather_temp'].set(text=f"Weather: {data['weather_temp']}")
+    lines['cpu_usage'].set(text=f"CPU: {data['cpu_usage']}")
+    lines['memory_usage'].set(text=f"RAM: {data['memory_usage']}")
+    lines['uptime'].set(text=f"Uptime: {data['uptime']}")
+    lines['updated'].set(text=f"Updated: {datetime.now().strftime('%H:%M:%S')}")
+    
+    # Re-rasterize only the lines whose text changed
+    screen.render()
+    return screen.image
 
 def run_display():
     """Main function to run the display"""
+    epd = get_epd()
     print("Starting Simple Real-Time Display...")
     print("Press Ctrl+C to stop")
     
-    # Initialize display
-    epd.init()
+    # Initialize display; closing the session puts it to sleep and releases the pins
+    session = display.Display(epd).open()
     epd.Clear()
     
+    # Skips identical frames, uses partial refresh for small changes and
+    # a base refresh once the partial refreshes have left too much ghosting
+    history = frames.RefreshScheduler(epd)
+    
     try:
         while True:
             # Update data
             update_data()
             
-            # Create and display image
+            # Create and display image; an unchanged screen is not even packed
             image = create_display()
-            epd.display(epd.getbuffer(image))
+            if screen.rendered:
+                history.show(epd.getbuffer(image))
             
             print(f"Updated at {data['time']} - BTC: {data['bitcoin_price']} - Weather: {data['weather_temp']}")
             
@@ -177,7 +210,8 @@ def run_display():
     except Exception as e:
         print(f"Error: {e}")
     finally:
-        epd.module_exit()
+        print(f"Frames skipped: {history.skipped}, partial: {history.partial}, full: {history.full}")
+        session.close()
 
 if __name__ == "__main__":
     run_display() 
\ No newline at end of file
@@ -0,0 +1,207 @@
+import time
+import queue
+import logging
+import threading
+from . import epdconfig
+from . import gt1151
+from . import icnt86
+from . import trace
+
+logger = logging.getLogger(__name__)
+
+
+class TouchEvent:
+    """One touch report: points is a list of (x, y, size) in controller
+    coordinates, ids their track ids, time the perf_counter() of the INT
+    edge that announced it. x, y and s are those of the first point.
+    A release report (all fingers lifted) has no points.
+    """
+    __slots__ = ('time', 'points', 'ids')
+
+    def __init__(self, time, points, ids=()):
+        self.time = time
+        self.points = points
+        self.ids = ids
+
+    @property
+    def count(self):
+        return len(self.points)
+
+    @property
+    def x(self):
+        return self.points[0][0]
+
+    @property
+    def y(self):
+        return self.points[0][1]
+
+    @property
+    def s(self):
+        return self.points[0][2]
+
+    def __repr__(self):
+        return "TouchEvent(%r)" % (self.points,)
+
+
+class TouchService:
+    """Reads the touch controller when its INT line goes low and delivers
+    the reports, instead of a thread polling INT in a loop.
+
+    controller is a gt1151.GT1151 or icnt86.INCT86. After start(), each
+    falling edge on INT wakes a worker thread that reads the controller
+    once over I2C; between edges nothing runs. Reports go to callback(event)
+    (called on the worker thread) if given, and into a bounded queue read
+    with get() or events(). When the queue is full the oldest report is
+    dropped. Reports identical to the previous one (a finger held still)
+    are skipped unless dedupe is False. Release reports are only
+    delivered with releases=True, e.g. for a gesture.GestureRecognizer.
+    """
+
+    def __init__(self, controller, callback=None, maxsize=64, dedupe=True, releases=False):
+        self.controller = controller
+        self.callback = callback
+        self.dedupe = dedupe
+        self.releases = releases
+        self.queue = queue.Queue(maxsize)
+        if isinstance(controller, gt1151.GT1151):
+            self.dev, self.old = gt1151.GT_Development(), gt1151.GT_Development()
+            self._read = self._read_gt1151
+        elif isinstance(controller, icnt86.INCT86):
+            self.dev, self.old = icnt86.ICNT_Development(), icnt86.ICNT_Development()
+            self._read = self._read_icnt86
+        else:
+            raise TypeError("unsupported touch controller %r" % controller)
+
+        self.irqs = 0
+        self.reads = 0
+        self.delivered = 0
+        self.dropped = 0
+
+        self._wakeup = threading.Event()
+        self._edge_time = 0.0
+        self._last = None
+        self._running = False
+        self._thread = None
+
+    def _read_gt1151(self):
+        dev = self.dev
+        dev.Touch = 1
+        dev.TouchpointFlag = 0
+        self.controller.GT_Scan(dev, self.old)
+        if not dev.TouchpointFlag or dev.TouchCount > gt1151.GT_MAX_POINTS:
+            return None
+        dev.TouchpointFlag = 0
+        points = dev.Points[:dev.TouchCount]
+        return [(p.x, p.y, p.s) for p in points], tuple(p.id for p in points)
+
+    def _read_icnt86(self):
+        dev = self.dev
+        dev.Touch = 1
+        dev.TouchCount = 0
+        self.controller.ICNT_Scan(dev, self.old)
+        # a zero count is the report sent when the last finger lifts
+        points = dev.Points[:dev.TouchCount]
+        return [(p.x, p.y, p.p) for p in points], tuple(p.id for p in points)
+
+    def _irq(self, *args):
+        # INT falling edge, on the GPIO library's thread: just hand over
+        self._edge_time = time.perf_counter()
+        self.irqs += 1
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._running:
+                break
+            edge_time = self._edge_time
+            woke = trace.now() if trace.enabled else None
+            if woke is not None:
+                trace.add(trace.IRQ, edge_time, woke)
+            try:
+                report = self._read()
+            except Exception as e:
+                logger.warning("touch read failed: %s" % e)
+                continue
+            if woke is not None:
+                trace.add(trace.I2C_READ, woke)
+            self.reads += 1
+            if report is None:
+                continue
+            points, ids = report
+            if self.dedupe and points == self._last:
+                continue
+            self._last = points
+            if points or self.releases:
+                with trace.span(trace.DISPATCH):
+                    self._deliver(TouchEvent(edge_time, points, ids))
+
+    def _taken(self, event):
+        # the app has the touch now; the next refresh should show it
+        if event is not None and event.points:
+            trace.touch(event.time)
+        return event
+
+    def _deliver(self, event):
+        if self.callback is not None:
+            self.callback(self._taken(event))
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                break
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+        self.delivered += 1
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='touch', daemon=True)
+        self._thread.start()
+        epdconfig.on_low(self.controller.INT, self._irq)
+        if epdconfig.digital_read(self.controller.INT) == 0:
+            # a report was already pending before the callback was in place
+            self._irq()
+        return self
+
+    def stop(self):
+        if not self._running:
+            return
+        epdconfig.on_low(self.controller.INT, None)
+        self._running = False
+        self._wakeup.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+
+    def get(self, timeout=None):
+        """The next report, or None after timeout seconds"""
+        try:
+            event = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return event if self.callback is not None else self._taken(event)
+
+    def events(self):
+        """All reports waiting in the queue, without blocking"""
+        events = []
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                return events
+            events.append(event if self.callback is not None else self._taken(event))
+
+    def stats(self):
+        return {'irqs': self.irqs, 'reads': self.reads, 'delivered': self.delivered, 'dropped': self.dropped}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,266 @@
+import time
+import struct
+import logging
+import threading
+from . import epdconfig
+from . import gt1151
+from . import icnt86
+
+logger = logging.getLogger(__name__)
+
+# Log file: a header, then one record per touch report read from the
+# controller, the raw register bytes as they came over I2C
+MAGIC = b'TPLG'
+VERSION = 1
+HEADER = struct.Struct('<4sB')
+# microseconds since the previous report, report register, byte count
+RECORD = struct.Struct('<IHB')
+MAX_DELTA_US = 0xFFFFFFFF
+
+# Report register and longest report of each controller
+REPORTS = {
+    gt1151.GT_REPORT_REG: 1 + gt1151.GT_MAX_POINTS * gt1151.GT_POINT_SIZE,
+    icnt86.ICNT_REPORT_REG: 1 + icnt86.ICNT_MAX_POINTS * icnt86.ICNT_POINT_SIZE,
+}
+
+
+def _open(file, mode):
+    if hasattr(file, 'read') or hasattr(file, 'write'):
+        return file, False
+    return open(file, mode), True
+
+
+class LogWriter:
+    """Writes reports, (t, reg, data) with t in seconds, to a log file"""
+
+    def __init__(self, file):
+        self.file, self.owned = _open(file, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.last_us = 0
+
+    def write(self, t, reg, data):
+        t_us = int(round(t * 1e6))
+        delta = min(max(t_us - self.last_us, 0), MAX_DELTA_US)
+        self.last_us += delta
+        self.file.write(RECORD.pack(delta, reg, len(data)))
+        self.file.write(data)
+
+    def close(self):
+        self.file.flush()
+        if self.owned:
+            self.file.close()
+
+
+def write_log(file, reports):
+    writer = LogWriter(file)
+    for t, reg, data in reports:
+        writer.write(t, reg, data)
+    writer.close()
+
+
+def read_log(file):
+    """The reports of a log as a list of (t, reg, data)"""
+    f, owned = _open(file, 'rb')
+    try:
+        raw = f.read()
+    finally:
+        if owned:
+            f.close()
+    magic, version = HEADER.unpack_from(raw, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a version %d touch log" % VERSION)
+    reports = []
+    offset = HEADER.size
+    t_us = 0
+    while offset < len(raw):
+        delta, reg, length = RECORD.unpack_from(raw, offset)
+        offset += RECORD.size
+        t_us += delta
+        reports.append((t_us / 1e6, reg, bytes(raw[offset:offset + length])))
+        offset += length
+    return reports
+
+
+class Recorder:
+    """Backend wrapper that logs every touch report read over I2C.
+
+        recorder = touchlog.Recorder(epdconfig.open(), 'session.tplog')
+        epdconfig.use_backend(recorder)
+        ...
+        epdconfig.close()               # or recorder.close()
+
+    EPD_TOUCH_LOG=session.tplog does the same for any program. The reads
+    of one report (status and first point, then the other points) are
+    merged into one record, written when the controller is acked, with
+    its time.monotonic() time since the recording started. Everything is
+    passed through to the wrapped backend.
+    """
+
+    def __init__(self, backend, file, clock=time.monotonic):
+        self.backend = backend
+        self.writer = LogWriter(file)
+        self.clock = clock
+        self.start = clock()
+        self.reports = 0
+        self._lock = threading.Lock()
+        self._report = None         # [t, reg, bytearray] being read
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def _base(self, reg):
+        for base, size in REPORTS.items():
+            if base <= reg < base + size:
+                return base
+        return None
+
+    def _record(self, reg, data):
+        base = self._base(reg)
+        if base is None:
+            return
+        with self._lock:
+            if reg == base:
+                self._flush()
+                self._report = [self.clock() - self.start, base, bytearray()]
+            elif self._report is None or self._report[1] != base:
+                return
+            buf = self._report[2]
+            offset = reg - base
+            if len(buf) < offset + len(data):
+                buf.extend(bytes(offset + len(data) - len(buf)))
+            buf[offset:offset + len(data)] = data
+
+    def _flush(self):
+        if self._report is not None:
+            t, reg, data = self._report
+            self._report = None
+            self.writer.write(t, reg, bytes(data))
+            self.reports += 1
+
+    def i2c_read_block(self, reg, len):
+        data = self.backend.i2c_read_block(reg, len)
+        self._record(reg, data)
+        return data
+
+    def i2c_readbyte(self, reg, len):
+        data = self.backend.i2c_readbyte(reg, len)
+        self._record(reg, bytes(data))
+        return data
+
+    def i2c_writebyte(self, reg, value):
+        self.backend.i2c_writebyte(reg, value)
+        if reg in REPORTS:
+            with self._lock:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+
+    def module_exit(self):
+        self.close()
+        self.backend.module_exit()
+
+
+class Replay(epdconfig.Simulator):
+    """Simulator that plays a touch log back through the touch controller.
+
+        epdconfig.use_backend(touchlog.Replay('session.tplog', speed=10))
+
+    Each report is put in the controller registers and INT is pulled low
+    until the scan acks it, so GT_Scan, ICNT_Scan and touch.TouchService
+    see it exactly as it was recorded. With speed set, reports come at
+    their recorded times divided by speed; with speed=None each report
+    waits for the previous one to be acked, which replays a session
+    deterministically as fast as the program reads it. step() feeds one
+    report by hand. Playback starts with start(), or by itself when a
+    touch.TouchService registers for INT.
+
+    EPD_BACKEND=replay plays EPD_TOUCH_REPLAY at EPD_TOUCH_REPLAY_SPEED.
+    """
+
+    def __init__(self, reports, speed=1.0, ack_timeout=1.0, time_scale=None):
+        super().__init__(time_scale)
+        if isinstance(reports, str) or hasattr(reports, 'read'):
+            reports = read_log(reports)
+        self.reports = list(reports)
+        self.speed = speed
+        self.ack_timeout = ack_timeout
+        self.position = 0
+        self.pending = None         # report register waiting for its ack
+        self.overruns = 0           # reports replaced before they were acked
+        self.lateness = 0.0         # worst delay behind the schedule, seconds
+        self._acked = threading.Event()
+        self._acked.set()
+        self._thread = None
+        self._stop = False
+
+    def step(self):
+        """Feed the next report; False once the log is played"""
+        if self.position >= len(self.reports):
+            return False
+        t, reg, data = self.reports[self.position]
+        self.position += 1
+        if self.pending is not None:
+            self.overruns += 1
+            self.set_pin(epdconfig.INT, 1)
+        self.registers[reg:reg + len(data)] = data
+        self.pending = reg
+        self._acked.clear()
+        self.set_pin(epdconfig.INT, 0)
+        return True
+
+    def i2c_writebyte(self, reg, value):
+        super().i2c_writebyte(reg, value)
+        if reg == self.pending:
+            self.pending = None
+            self.set_pin(epdconfig.INT, 1)
+            self._acked.set()
+
+    def run(self):
+        """Play the rest of the log on this thread"""
+        start = time.monotonic()
+        offset = self.reports[self.position][0] if self.position < len(self.reports) else 0.0
+        while not self._stop and self.position < len(self.reports):
+            if self.speed:
+                due = start + (self.reports[self.position][0] - offset) / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.lateness = max(self.lateness, -delay)
+            elif not self._acked.wait(self.ack_timeout):
+                logger.warning("touch report %d was not read" % (self.position - 1))
+            self.step()
+        if not self.speed:
+            self._acked.wait(self.ack_timeout)
+
+    def start(self):
+        if self._thread is None:
+            self._stop = False
+            self._thread = threading.Thread(target=self.run, name='touch replay', daemon=True)
+            self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        """Wait for the playback to finish. Returns True if it did."""
+        if self._thread is None:
+            return self.position >= len(self.reports)
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def on_low(self, pin, callback):
+        super().on_low(pin, callback)
+        if pin == epdconfig.INT and callback is not None:
+            self.start()
+
+    def stats(self):
+        return {'reports': len(self.reports), 'played': self.position,
+                'overruns': self.overruns, 'lateness': self.lateness}
+
+    def module_exit(self):
+        self._stop = True
+        super().module_exit()
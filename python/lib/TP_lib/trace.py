@@ -0,0 +1,179 @@
+import os
+import json
+import functools
+import math
+import time
+import atexit
+import threading
+import collections
+
+# Stages of a touch on its way to the panel
+IRQ = 'irq'                         # INT edge to the touch worker waking up
+I2C_READ = 'i2c_read'               # reading and decoding the report
+DISPATCH = 'dispatch'               # handing the event to callback and queue
+RENDER = 'render'                   # the app drawing its frame
+GETBUFFER = 'getbuffer'             # packing the image for the panel
+SPI = 'spi'                         # sending a command batch or frame
+BUSY = 'busy'                       # waiting for the panel to drop BUSY
+TOUCH_TO_PIXEL = 'touch_to_pixel'   # INT edge to the end of the refresh showing it
+
+STAGES = (IRQ, I2C_READ, DISPATCH, RENDER, GETBUFFER, SPI, BUSY, TOUCH_TO_PIXEL)
+
+# Off by default: every probe is then a single flag test
+enabled = False
+spans = collections.deque(maxlen=100000)    # (stage, start, end, thread id)
+now = time.perf_counter
+
+_lock = threading.Lock()
+_touches = []                       # INT edge times not on the panel yet
+
+
+def enable(capacity=None):
+    """Start recording spans, keeping the last capacity of them"""
+    global enabled, spans
+    if capacity is not None and capacity != spans.maxlen:
+        spans = collections.deque(spans, maxlen=capacity)
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    spans.clear()
+    with _lock:
+        del _touches[:]
+
+
+def add(stage, start, end=None):
+    """Record a span of stage from start to end (now), perf_counter() times"""
+    if enabled:
+        spans.append((stage, start, now() if end is None else end, threading.get_ident()))
+
+
+class span:
+    """with trace.span(trace.RENDER): ... records the block as one span"""
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = now() if enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            add(self.stage, self.start)
+
+
+def traced(stage):
+    """Decorator recording every call of a function as a span of stage"""
+    def decorate(func):
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = now()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add(stage, start)
+        return call
+    return decorate
+
+
+def touch(edge_time):
+    """A touch delivered to the app; the next refresh should show it"""
+    if enabled:
+        with _lock:
+            _touches.append(edge_time)
+
+
+def take_touches():
+    """The touches a refresh starting now will show"""
+    if not _touches:
+        return ()
+    with _lock:
+        touches = tuple(_touches)
+        del _touches[:]
+    return touches
+
+
+def shown(touches, end=None):
+    """The refresh showing touches (from take_touches()) is done"""
+    if touches:
+        end = now() if end is None else end
+        for edge_time in touches:
+            add(TOUCH_TO_PIXEL, edge_time, end)
+
+
+def percentile(values, p):
+    """p-th percentile of sorted values, nearest rank"""
+    if not values:
+        return 0.0
+    return values[min(len(values), max(1, int(math.ceil(p / 100.0 * len(values))))) - 1]
+
+
+def durations(stage):
+    """Sorted durations of the recorded spans of stage, in ms"""
+    return sorted((end - start) * 1000.0 for s, start, end, tid in list(spans) if s == stage)
+
+
+def stats():
+    """{stage: {'count', 'mean', 'p50', 'p95', 'p99', 'max'}} in ms, for the
+    stages with spans
+    """
+    by_stage = collections.defaultdict(list)
+    for stage, start, end, tid in list(spans):
+        by_stage[stage].append((end - start) * 1000.0)
+    result = {}
+    for stage, values in by_stage.items():
+        values.sort()
+        result[stage] = {'count': len(values), 'mean': sum(values) / len(values),
+                         'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                         'p99': percentile(values, 99), 'max': values[-1]}
+    return result
+
+
+def report():
+    """stats() as a table, one line per stage in pipeline order"""
+    table = stats()
+    order = [stage for stage in STAGES if stage in table] + sorted(set(table) - set(STAGES))
+    lines = ["%-15s %6s %9s %9s %9s %9s" % ('stage (ms)', 'count', 'p50', 'p95', 'p99', 'max')]
+    for stage in order:
+        s = table[stage]
+        lines.append("%-15s %6d %9.3f %9.3f %9.3f %9.3f"
+                     % (stage, s['count'], s['p50'], s['p95'], s['p99'], s['max']))
+    return '\n'.join(lines)
+
+
+def chrome_trace(file=None):
+    """The spans as Chrome trace events (chrome://tracing, Perfetto). With
+    file (a path or text file), the JSON is also written there.
+    """
+    recorded = list(spans)
+    origin = min(start for stage, start, end, tid in recorded) if recorded else 0.0
+    names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': names.get(tid, str(tid))}}
+              for tid in sorted(set(r[3] for r in recorded))]
+    for stage, start, end, tid in recorded:
+        events.append({'name': stage, 'cat': 'epd', 'ph': 'X', 'pid': 1, 'tid': tid,
+                       'ts': (start - origin) * 1e6, 'dur': (end - start) * 1e6})
+    trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    if file is not None:
+        if hasattr(file, 'write'):
+            json.dump(trace, file)
+        else:
+            with open(file, 'w') as f:
+                json.dump(trace, f)
+    return trace
+
+
+# EPD_TRACE=trace.json traces the whole program and writes the Chrome
+# trace when it exits
+if os.environ.get('EPD_TRACE'):
+    enable()
+    atexit.register(chrome_trace, os.environ['EPD_TRACE'])
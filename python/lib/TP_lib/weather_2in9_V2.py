@@ -10,7 +10,19 @@ fontdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../pic')
 # Search lib folder for display driver modules
 sys.path.append('lib')
 from . import epd2in9_V2
-epd = epd2in9_V2.EPD_2IN9_V2()
+from . import power
+# The driver is created on first use; importing this module touches no hardware.
+# Updates are minutes apart, so the panel sleeps IDLE_TIMEOUT seconds after each one.
+IDLE_TIMEOUT = 10
+epd = None
+
+
+def get_epd():
+    global epd
+    if epd is None:
+        epd = power.PowerManager(epd2in9_V2.EPD_2IN9_V2(), idle_timeout=IDLE_TIMEOUT)
+    return epd
+
 
 from datetime import datetime
 import time
@@ -23,6 +35,7 @@ import csv
 
 # define funciton for writing image and sleeping for 5 min.
 def write_to_screen(image, sleep_seconds):
+    epd = get_epd()
     print('Writing to screen.')
     # Write to screen
     h_image = Image.new('1', (epd.height, epd.width), 255)
@@ -37,6 +50,7 @@ def write_to_screen(image, sleep_seconds):
 
 # define function for displaying error
 def display_error(error_source):
+    epd = get_epd()
     # Display an error
     print('Error in the', error_source, 'request.')
     # Initialize drawing
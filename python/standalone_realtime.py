@@ -21,7 +21,18 @@ sys.path.insert(0, lib_dir)
 
 # Import the display driver
 from TP_lib import epd2in9_V2
-epd = epd2in9_V2.EPD_2IN9_V2()
+from TP_lib import frames
+from TP_lib import display
+# The driver is created on first use; importing this module touches no hardware
+epd = None
+
+
+def get_epd():
+    global epd
+    if epd is None:
+        epd = epd2in9_V2.EPD_2IN9_V2()
+    return epd
+
 
 # Set up paths
 picdir = os.path.join(current_dir, 'pic/2in9')
@@ -133,6 +144,7 @@ def update_data():
 
 def create_display():
     """Create the display image"""
+    epd = get_epd()
     # Create image with white background
     image = Image.new('1', (epd.height, epd.width), 255)
     draw = ImageDraw.Draw(image)
@@ -162,13 +174,17 @@ def create_display():
 
 def run_display():
     """Main function to run the display"""
+    epd = get_epd()
     print("Starting Standalone Real-Time Display...")
     print("Press Ctrl+C to stop")
     
-    # Initialize display
-    epd.init()
+    # Initialize display; closing the session puts it to sleep and releases the pins
+    session = display.Display(epd).open()
     epd.Clear()
     
+    # Skips identical frames and uses partial refresh for small changes
+    history = frames.FrameHistory(epd)
+    
     try:
         while True:
             # Update data
@@ -176,7 +192,7 @@ def run_display():
             
             # Create and display image
             image = create_display()
-            epd.display(epd.getbuffer(image))
+            history.show(epd.getbuffer(image))
             
             print(f"Updated at {data['time']} - BTC: {data['bitcoin_price']} - Weather: {data['weather_temp']}")
             
@@ -190,7 +206,8 @@ def run_display():
         import traceback
         traceback.print_exc()
     finally:
-        epd.module_exit()
+        print(f"Frames skipped: {history.skipped}, partial: {history.partial}, full: {history.full}")
+        session.close()
 
 if __name__ == "__main__":
     run_display() 
\ No newline at end of file
@@ -60,6 +60,7 @@ except Exception as e:
     traceback.print_exc()
 finally:
     try:
-        epd.module_exit()
+        epd.sleep()
+        epd.Dev_exit()
     except:
         pass 
\ No newline at end of file